@@ -4,11 +4,25 @@ maxrf4u Copyright (c) 2026 Frank Ligterink with changes by Lars Maxfield
 """
 
 import os
+import copy
+import json
+import math
+import mmap
+import hashlib
 import platform
 import subprocess
+import tempfile
+import threading
+import time
 import re
+import fnmatch
+import struct
+import zlib
+from contextlib import contextmanager, suppress
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Literal
+from typing import Literal, Callable, Hashable, Iterable, Iterator, Sequence, TypeVar
 from decimal import Decimal
 
 import numpy as np
@@ -18,6 +32,42 @@ import png
 WriteMode = Literal['w', 'x']
 """'w' truncate first; 'x' failing if the file already exists."""
 
+PngBackend = Literal['pypng', 'zlib']
+"""'pypng' to encode PNGs with `pypng`; 'zlib' to encode them with `encode_png`."""
+
+TILE_BYTES: int = 4 * 1024 ** 2
+"""Target size in bytes of one spatial tile of full spectra when copying by tile."""
+
+CHUNK_BYTES: int = 64 * 1024 ** 2
+"""Target size in bytes of one band of full rows when streaming a memory map."""
+
+ROW_BLOCK_BYTES: int = 4 * 1024 ** 2
+"""Target size in bytes of one block of rows of an image normalized for a PNG."""
+
+PEAK_HALF_WINDOW: int = 10
+"""Half the width in channels of the window integrated around the peak of a preview."""
+
+HISTOGRAM_BINS: int = 4096
+"""Amount of bins of the histogram of a map from which to take percentiles."""
+
+STRETCH_PERCENTILES: tuple[float, float] = (0.5, 99.5)
+"""Default percentiles of a map to stretch to the full range of an image."""
+
+QUICK_PROBE_PIXELS: int = 64 ** 2
+"""Approximate amount of pixels of the first, coarsest quick preview."""
+
+QUICK_PREVIEW_SECONDS: float = 2.0
+"""Default time budget in seconds of the quick preview shown after the first."""
+
+STATISTICS_SUFFIX: str = ".statistics.npz"
+"""Suffix of the cache file of the statistics of a RAW."""
+
+STATISTICS_CACHE_BYTES: int = 1024 ** 3
+"""Default size limit of a central cache folder of statistics."""
+
+JOURNAL_SUFFIX: str = ".journal"
+"""Suffix appended to a file being transformed in place for its journal."""
+
 
 def open_system_default(image: Path) -> None:
     """Open a file with the system's default application for that file's extension.
@@ -39,6 +89,109 @@ def open_system_default(image: Path) -> None:
             raise NotImplementedError(f"System '{system}' not supported.")
 
 
+@dataclass(frozen=True)
+class Transform:
+    """Spatial transform as one of the eight elements of the dihedral group D4.
+
+    Canonical form: first mirror left-right if `mirror`, then rotate counterclockwise by
+    `turns`×90 degrees (as `np.rot90`). Any chain of rotations, flips and transposes
+    collapses into one such element, so it can be applied in a single pass.
+
+    Compose with `@` like functions, where `b @ a` applies `a` first, then `b`:
+    ```
+    Transform.rotation(1) @ Transform.flip_horizontal() == Transform.transpose()
+    ```
+    """
+    turns: int = 0
+    mirror: bool = False
+
+    def __post_init__(self) -> None:
+        """Normalize turns to 0, 1, 2 or 3."""
+        object.__setattr__(self, "turns", self.turns % 4)
+
+    @classmethod
+    def rotation(cls, n: int = 1) -> "Transform":
+        """Rotate counterclockwise by n×90 degrees."""
+        return cls(turns=n)
+
+    @classmethod
+    def flip_horizontal(cls) -> "Transform":
+        """Mirror left-right, as `np.fliplr`."""
+        return cls(mirror=True)
+
+    @classmethod
+    def flip_vertical(cls) -> "Transform":
+        """Mirror top-bottom, as `np.flipud`."""
+        return cls(turns=2, mirror=True)
+
+    @classmethod
+    def transpose(cls) -> "Transform":
+        """Swap rows and columns, as `np.transpose` of the spatial axes."""
+        return cls(turns=1, mirror=True)
+
+    @classmethod
+    def chain(cls, *transforms: "Transform") -> "Transform":
+        """Collapse transforms applied one after the other into one."""
+        result = cls()
+        for transform in transforms:
+            result = transform @ result
+        return result
+
+    @classmethod
+    def from_name(cls, name: str) -> "Transform":
+        """Get a transform by its `name`."""
+        for (turns, mirror), transform_name in _TRANSFORM_NAMES.items():
+            if transform_name == name:
+                return cls(turns=turns, mirror=mirror)
+        raise ValueError(f"Unknown transform name: {name}.")
+
+    def __matmul__(self, other: "Transform") -> "Transform":
+        """Compose as `self` after `other`.
+
+        A mirror reverses the direction of any rotation before it.
+        """
+        turns = self.turns + (-other.turns if self.mirror else other.turns)
+        return Transform(turns=turns, mirror=self.mirror != other.mirror)
+
+    @property
+    def inverse(self) -> "Transform":
+        """The transform which undoes this one."""
+        if self.mirror:
+            return self  # Every mirrored element is its own inverse.
+        return Transform(turns=-self.turns)
+
+    @property
+    def swaps_axes(self) -> bool:
+        """Whether height and width switch, i.e. odd turns."""
+        return bool(self.turns % 2)
+
+    @property
+    def name(self) -> str:
+        """Short name for use in filenames, e.g. 'rot90' or 'fliph'."""
+        return _TRANSFORM_NAMES[(self.turns, self.mirror)]
+
+    def apply(self, array: np.ndarray, axes: tuple[int, int] = (0, 1)) -> np.ndarray:
+        """Get a transformed view (not a copy) of an array over the spatial `axes`."""
+        if self.mirror:
+            array = np.flip(array, axis=axes[1])
+        return np.rot90(array, k=self.turns, axes=axes)
+
+
+_TRANSFORM_NAMES: dict[tuple[int, bool], str] = {
+    (0, False): "rot0",
+    (1, False): "rot90",
+    (2, False): "rot180",
+    (3, False): "rot270",
+    (0, True): "fliph",
+    (1, True): "transpose",
+    (2, True): "flipv",
+    (3, True): "antitranspose",
+}
+
+# The four rotations, e.g. to preview or copy all orientations in one pass.
+ALL_ROTATIONS: tuple[Transform, ...] = tuple(Transform.rotation(n) for n in range(4))
+
+
 def make_raw_preview(
     raw_filepath: Path,
     rpl_filepath: Path,
@@ -47,27 +200,55 @@ def make_raw_preview(
     save: bool = True,
     verbose: bool = False,
     overwrite: bool = False,
+    transform: Transform = Transform(),
+    chunk_bytes: int = CHUNK_BYTES,
+    workers: int = 1,
+    cache: bool = False,
+    cache_dir: Path | None = None,
+    stretch: tuple[float, float] | None = None,
+    statistics: "PreviewStatistics | None" = None,
 ) -> Path | None:
-    """Create single-channel 8-bit PNG of raw file to preview scan orientation."""
-    if output_dir is not None and not output_dir.exists():
-        raise FileNotFoundError(f"Folder does not exist at {output_dir}.")
+    """Create single-channel 8-bit PNG of raw file to preview scan orientation.
 
-    # read data cube shape and dtype from .rpl file
-    dtype, shape = parse_rpl_keys(read_rpl(rpl_filepath, verbose=verbose))
+    The map is the average of the window of channels around the highest peak of the
+    max-spectrum. The cube is streamed once in bands of rows of about `chunk_bytes` (see
+    `PreviewStatistics`), after which only the channel windows of bands which missed
+    the final peak are read again. With `workers` > 1, bands are reduced by threads
+    and combined in order, so the preview does not depend on `workers`.
 
-    # create numpy memory map
-    raw_mm = np.memmap(raw_filepath, dtype=dtype, mode='r', shape=shape)
+    With `cache`, the statistics are loaded from and saved to a cache file next to the
+    RAW, or in `cache_dir` if given (see `raw_statistics`), so a repeated preview does
+    not read the cube at all.
+
+    With `stretch` percentiles (e.g. `STRETCH_PERCENTILES`), the map is stretched from
+    its low to its high percentile instead of from 0 to its maximum, so that a few hot
+    pixels do not darken the preview. The percentiles are taken from a histogram built
+    in the same pass.
+
+    With a `transform` other than the identity, the preview is of the transformed
+    orientation, as if of a transformed copy, and `_<transform name>` is appended.
 
-    # create max-spectrum
-    raw_flat = raw_mm.reshape([-1, shape[2]])
-    raw_max = np.max(raw_flat, axis=0)
+    With `statistics` already accumulated (e.g. while writing the RAW, see
+    `transform_raw_rpl_with_preview`), the cube is not streamed again.
+    """
+    if output_dir is not None and not output_dir.exists():
+        raise FileNotFoundError(f"Folder does not exist at {output_dir}.")
+
+    if verbose:
+        # print the keys of the .rpl file
+        read_rpl(rpl_filepath, verbose=verbose)
 
-    # locate highest peak
-    max_peak_idx = np.argmax(raw_max)
+    # get map of the sum around the peak, from the cache or in one pass by band
+    windows, maps, limits = raw_peak_maps(
+        raw_filepath, rpl_filepath, 1, chunk_bytes, workers, cache, cache_dir, stretch,
+        statistics,
+    )
 
-    # integrate max peak slice
-    max_peak_map = np.average(raw_mm[:, :, max_peak_idx - 10:max_peak_idx + 10], axis=2)
-    raw_preview = 255 * max_peak_map // np.amax(max_peak_map)
+    # scale and transform the (small) map instead of the cube, by block of rows
+    length = windows[0].stop - windows[0].start
+    height, width = transform.apply(maps[0]).shape
+    if transform != Transform():
+        raw_filepath = raw_filepath.with_stem(f"{raw_filepath.stem}_{transform.name}")
 
     suffix: str = '.preview.png'
 
@@ -84,7 +265,12 @@ def make_raw_preview(
 
     if save:
         print(f'Saving: {preview_filepath}...')
-        png.from_array(raw_preview.astype(np.uint8), mode='L;8').save(preview_filepath)
+        write_png_blocks(
+            preview_rows(maps[0], transform, limits[0], length),
+            preview_filepath,
+            width,
+            height,
+        )
 
     if show:
         print(f'Showing file: {preview_filepath}')
@@ -93,61 +279,2108 @@ def make_raw_preview(
     return preview_filepath
 
 
+def make_raw_composite(
+    raw_filepath: Path,
+    rpl_filepath: Path,
+    peaks: int = 3,
+    rgb: bool = True,
+    output_dir: Path | None = None,
+    show: bool = False,
+    overwrite: bool = False,
+    transform: Transform = Transform(),
+    chunk_bytes: int = CHUNK_BYTES,
+    workers: int = 1,
+    cache: bool = False,
+    cache_dir: Path | None = None,
+    stretch: tuple[float, float] | None = None,
+) -> list[Path]:
+    """Create a false-color preview of the highest distinct peaks of a raw file.
+
+    Like `make_raw_preview`, but for the windows around the `peaks` highest distinct
+    peaks of the max-spectrum, all integrated in the same pass (see `raw_peak_maps`),
+    so it costs about as much as a single-peak preview.
+
+    With `rgb`, the maps of the (at most three) highest peaks are saved as the red,
+    green and blue of one 8-bit PNG, `<raw_filename>.composite.png`. Else each map is
+    saved as a grayscale PNG, `<raw_filename>_ch<start>-<stop>.preview.png`. Each map
+    is stretched to its own `stretch` percentiles, if given.
+
+    Returns:
+        Paths of the saved PNGs.
+    """
+    if output_dir is not None and not output_dir.exists():
+        raise FileNotFoundError(f"Folder does not exist at {output_dir}.")
+    if rgb and not 1 <= peaks <= 3:
+        raise ValueError(f"An RGB composite is of 1 to 3 peaks, not {peaks}.")
+
+    windows, maps, limits = raw_peak_maps(
+        raw_filepath, rpl_filepath, peaks, chunk_bytes, workers, cache, cache_dir,
+        stretch,
+    )
+    images = [
+        preview_image(peak_map, transform, map_limits, window.stop - window.start)
+        for window, peak_map, map_limits in zip(windows, maps, limits)
+    ]
+    if transform != Transform():
+        raw_filepath = raw_filepath.with_stem(f"{raw_filepath.stem}_{transform.name}")
+    folder = raw_filepath.parent if output_dir is None else output_dir
+
+    if rgb:
+        # fewer distinct peaks than asked leave their colors black
+        shape = images[0].shape if images else (0, 0)
+        composite = np.zeros((*shape, 3), dtype=np.uint8)
+        for color, image in enumerate(images):
+            composite[:, :, color] = image
+        filepaths = [folder / raw_filepath.with_suffix('.composite.png').name]
+        arrays = [composite.reshape(shape[0], -1)]
+        mode = 'RGB;8'
+    else:
+        filepaths = [
+            folder / f"{raw_filepath.stem}_ch{window.start}-{window.stop}.preview.png"
+            for window in windows
+        ]
+        arrays = images
+        mode = 'L;8'
+
+    existing = [filepath for filepath in filepaths if filepath.exists()]
+    if not overwrite and existing:
+        raise FileExistsError(
+            "Preview image already exists:\n\n"
+            f"{'\n'.join(str(filepath) for filepath in existing)}"
+        )
+
+    for filepath, array in zip(filepaths, arrays):
+        print(f'Saving: {filepath}...')
+        png.from_array(array, mode=mode).save(filepath)
+
+    if show:
+        for filepath in filepaths:
+            print(f'Showing file: {filepath}')
+            open_system_default(filepath)
+
+    return filepaths
+
+
+def make_raw_contact_sheet(
+    raw_filepath: Path,
+    rpl_filepath: Path,
+    transforms: Sequence[Transform] = ALL_ROTATIONS,
+    output_dir: Path | None = None,
+    show: bool = False,
+    overwrite: bool = False,
+    chunk_bytes: int = CHUNK_BYTES,
+    workers: int = 1,
+    cache: bool = False,
+    cache_dir: Path | None = None,
+    stretch: tuple[float, float] | None = None,
+) -> Path:
+    """Create one PNG of the previews of a raw file in several orientations.
+
+    Like `make_raw_preview`, but the map is transformed by each of `transforms`, from
+    left to right, so that all orientations can be compared at once. The cube is
+    streamed once for all of them (see `raw_peak_maps`), as the transforms apply to
+    the (small) map only. Each preview is centered in a square cell of the longest
+    edge, and cells are separated by a white gap.
+
+    Returns:
+        Path of the saved PNG, `<raw_filename>.orientations.png`.
+    """
+    if output_dir is not None and not output_dir.exists():
+        raise FileNotFoundError(f"Folder does not exist at {output_dir}.")
+    if not transforms:
+        raise ValueError("No transforms to preview.")
+
+    windows, maps, limits = raw_peak_maps(
+        raw_filepath, rpl_filepath, 1, chunk_bytes, workers, cache, cache_dir, stretch,
+    )
+    length = windows[0].stop - windows[0].start
+    images = [
+        preview_image(maps[0], transform, limits[0], length) for transform in transforms
+    ]
+
+    edge = max(maps[0].shape)
+    gap = max(1, edge // 32)
+    sheet = np.full(
+        (edge, len(images) * (edge + gap) - gap), 255, dtype=np.uint8
+    )
+    for n, image in enumerate(images):
+        top = (edge - image.shape[0]) // 2
+        left = n * (edge + gap) + (edge - image.shape[1]) // 2
+        sheet[top:top + image.shape[0], left:left + image.shape[1]] = image
+
+    folder = raw_filepath.parent if output_dir is None else output_dir
+    sheet_filepath = folder / raw_filepath.with_suffix('.orientations.png').name
+    if not overwrite and sheet_filepath.exists():
+        raise FileExistsError(f"Preview image already exists:\n\n{sheet_filepath}")
+
+    print(f'Saving: {sheet_filepath}...')
+    write_png(sheet, sheet_filepath)
+
+    if show:
+        print(f'Showing file: {sheet_filepath}')
+        open_system_default(sheet_filepath)
+
+    return sheet_filepath
+
+
+def quick_raw_previews(
+    raw_filepath: Path,
+    rpl_filepath: Path,
+    seconds: float = QUICK_PREVIEW_SECONDS,
+    transform: Transform = Transform(),
+    chunk_bytes: int = CHUNK_BYTES,
+    workers: int = 1,
+    cache: bool = False,
+    cache_dir: Path | None = None,
+    stretch: tuple[float, float] | None = None,
+) -> Iterator[tuple[int, np.ndarray]]:
+    """Yield previews of a RAW which progressively refine to the exact preview.
+
+    The first preview is of every s-th pixel of every s-th row, with a stride s such
+    that about `QUICK_PROBE_PIXELS` pixels are read. Each next preview at least halves
+    the stride, and goes finer still if the rate at which the previous one was read
+    allows a preview of about `seconds`. So a preview takes at most about `seconds`
+    only if that rate allows half the stride: otherwise (e.g. a slow disk or a large
+    cube) it reads four times the pixels of the previous one, however long that takes.
+    The exact preview of `make_raw_preview` is yielded last. Each preview is scaled up
+    to the full shape of the (transformed) RAW by repeating the sampled pixels. With
+    valid cached statistics (see `raw_statistics`), only the exact preview is yielded.
+    See `make_raw_preview` for `stretch`.
+
+    All channels of the sampled pixels are read: the spectrum of a pixel is contiguous
+    in a RAW, so skipping channels would not save reading any bytes.
+
+    Stop iterating (or `close` the generator) to stop refining.
+
+    Yields:
+        Stride of the pixels sampled (1 when exact) and the 8-bit preview image.
+    """
+    dtype, shape = parse_rpl_keys(read_rpl(rpl_filepath))
+    pixels = shape[0] * shape[1]
+
+    stride = max(1, math.isqrt(pixels // QUICK_PROBE_PIXELS))
+    if cache and load_statistics(raw_filepath, rpl_filepath, cache_dir) is not None:
+        stride = 1
+    raw_mm = np.memmap(raw_filepath, dtype=dtype, mode='r', shape=shape)
+    while stride > 1:
+        start = time.perf_counter()
+        peak_map = subsampled_peak_map(raw_mm, stride, chunk_bytes, workers)
+        elapsed = time.perf_counter() - start
+        limits = None if stretch is None else stretch_limits(peak_map, stretch)
+        yield stride, preview_image(peak_map, transform, limits)
+
+        # pixels per second so far sets the stride of the next preview
+        budget_pixels = peak_map.size / (stride ** 2) / max(elapsed, 1e-6) * seconds
+        budget_stride = math.ceil(math.sqrt(pixels / max(budget_pixels, 1)))
+        stride = min(stride // 2, budget_stride)
+
+    windows, maps, limits = raw_peak_maps(
+        raw_filepath, rpl_filepath, 1, chunk_bytes, workers, cache, cache_dir, stretch
+    )
+    length = windows[0].stop - windows[0].start
+    yield 1, preview_image(maps[0], transform, limits[0], length)
+
+
+def subsampled_peak_map(
+    raw: np.ndarray,
+    stride: int,
+    chunk_bytes: int = CHUNK_BYTES,
+    workers: int = 1,
+) -> np.ndarray:
+    """Get the peak map of every `stride`-th pixel of a RAW, repeated to full shape.
+
+    The peak is that of the max-spectrum of the sampled pixels only.
+    """
+    sample = raw[::stride, ::stride]
+    statistics = PreviewStatistics(sample.shape, sample.dtype)
+    bands = row_bands(sample.shape, sample.itemsize, chunk_bytes)
+    for partial in map_ordered(
+        lambda rows: statistics.reduce(rows, sample[rows]), bands, workers
+    ):
+        statistics.combine(partial)
+    window = peak_window(statistics.peak, sample.shape[2])
+    peak_map = statistics.window_map(sample, window, workers)
+    peak_map = peak_map / (window.stop - window.start)
+    peak_map = np.repeat(np.repeat(peak_map, stride, axis=0), stride, axis=1)
+    return peak_map[:raw.shape[0], :raw.shape[1]]
+
+
+def raw_peak_maps(
+    raw_filepath: Path,
+    rpl_filepath: Path,
+    peaks: int = 1,
+    chunk_bytes: int = CHUNK_BYTES,
+    workers: int = 1,
+    cache: bool = False,
+    cache_dir: Path | None = None,
+    stretch: tuple[float, float] | None = None,
+    statistics: "PreviewStatistics | None" = None,
+) -> tuple[list[slice], list[np.ndarray], list[tuple[float, float] | None]]:
+    """Get the maps of the average of the windows around the highest distinct peaks.
+
+    The windows of all peaks are integrated in the same pass as the statistics (see
+    `PreviewStatistics`), so this costs about as much for any amount of peaks.
+
+    Args:
+        raw_filepath: Path of the RAW.
+        rpl_filepath: Path of the RPL of the RAW.
+        peaks: Amount of highest distinct peaks.
+        chunk_bytes: Approximate size in bytes of a band of rows read at once.
+        workers: Amount of threads reducing bands in parallel.
+        cache: Whether to use and update the cached statistics (see `raw_statistics`).
+        cache_dir: Central cache folder, else the cache file is next to the RAW.
+        stretch: Low and high percentiles of each map to get as its limits, from its
+            histogram built in the same pass.
+        statistics: Statistics already accumulated (see `raw_statistics`).
+
+    Returns:
+        Windows of channels of the peaks, highest first, their maps of sums (divide by
+        the length of the window for the average) and, with `stretch`, the averages at
+        its percentiles.
+    """
+    dtype, shape = parse_rpl_keys(read_rpl(rpl_filepath))
+    raw_mm = np.memmap(raw_filepath, dtype=dtype, mode='r', shape=shape)
+    statistics = raw_statistics(
+        raw_filepath, rpl_filepath, chunk_bytes, workers, cache, cache_dir,
+        peaks=peaks, statistics=statistics,
+    )
+    # integrate max peak slices, re-reading only bands integrated around other peaks
+    windows = statistics.peak_windows(peaks)
+    maps = statistics.window_maps(raw_mm, windows, chunk_bytes, workers)
+    limits: list[tuple[float, float] | None] = []
+    for window, window_map in zip(windows, maps):
+        if stretch is None:
+            limits.append(None)
+            continue
+        low, high = stretch_limits(window_map, stretch, statistics.histogram(window))
+        length = window.stop - window.start
+        limits.append((low / length, high / length))
+    return windows, maps, limits
+
+
+def preview_image(
+    peak_map: np.ndarray,
+    transform: Transform = Transform(),
+    limits: tuple[float, float] | None = None,
+    length: int = 1,
+) -> np.ndarray:
+    """Scale a peak map to an 8-bit image and transform it. See `preview_rows`."""
+    return np.vstack(list(preview_rows(peak_map, transform, limits, length)))
+
+
+def preview_rows(
+    peak_map: np.ndarray,
+    transform: Transform = Transform(),
+    limits: tuple[float, float] | None = None,
+    length: int = 1,
+    block_bytes: int = ROW_BLOCK_BYTES,
+) -> Iterator[np.ndarray]:
+    """Scale a peak map to an 8-bit image and transform it, by block of rows.
+
+    Without `limits`, the map is scaled from 0 to its maximum. With `limits`, it is
+    stretched from the low to the high limit, clipping values beyond them. The map is
+    transformed as a view and only a block of rows is scaled at a time, so no copy of
+    the whole map is made.
+
+    Args:
+        peak_map: Map, e.g. of the sums over a window of channels.
+        transform: Transform of the image.
+        limits: Low and high limit of the average to stretch from and to.
+        length: Length of the window, to average sums by.
+        block_bytes: Target size in bytes of a block of rows of the map.
+
+    Yields:
+        Blocks of rows of shape (rows, width) of the 8-bit image.
+    """
+    view = transform.apply(peak_map)
+    stretched = limits is not None and limits[1] > limits[0]
+    maximum = np.amax(peak_map) / length
+    for rows in row_blocks(view.shape, 8, block_bytes):
+        block = view[rows] / length
+        if stretched:
+            low, high = limits  # type: ignore
+            yield (255 * np.clip((block - low) / (high - low), 0, 1)).astype(np.uint8)
+        else:
+            yield (255 * block // maximum).astype(np.uint8)
+
+
+def row_blocks(
+    shape: tuple[int, ...],
+    itemsize: int,
+    block_bytes: int = ROW_BLOCK_BYTES,
+) -> list[slice]:
+    """Split the rows of an image of shape (height, width) into blocks of a size."""
+    rows = max(1, block_bytes // max(1, shape[1] * itemsize))
+    return [slice(start, start + rows) for start in range(0, shape[0], rows)]
+
+
+def extract_raw_maps(
+    raw_filepath: Path,
+    rpl_filepath: Path,
+    windows: dict[str, tuple[int, int]],
+    output_dir: Path | None = None,
+    overwrite: bool = False,
+    chunk_bytes: int = CHUNK_BYTES,
+    workers: int = 1,
+    cache: bool = False,
+    cache_dir: Path | None = None,
+    stretch: tuple[float, float] | None = None,
+) -> tuple[list[str], list[Path]]:
+    """Integrate windows of channels of a RAW into maps and save them as 16-bit PNGs.
+
+    All windows are integrated in the same single pass over the cube, so it is read
+    once however many windows there are. The maps are saved like the images extracted
+    from a DMS, as `<raw_filename>_<name without spaces>.png`.
+
+    Args:
+        raw_filepath: Path of the RAW.
+        rpl_filepath: Path of the RPL of the RAW.
+        windows: Windows of channels [start, stop) by name, e.g. of element lines. See
+            `channel_window` to convert a window of energies.
+        output_dir: Folder to save the maps in, else that of the RAW.
+        overwrite: Whether to overwrite existing maps. If not, none are saved if any
+            already exist.
+        chunk_bytes: Approximate size in bytes of a band of rows read at once.
+        workers: Amount of threads integrating bands in parallel.
+        cache: Whether to use and update the cached statistics (see `raw_statistics`).
+        cache_dir: Central cache folder, else the cache file is next to the RAW.
+        stretch: Low and high percentiles of each map to normalize, taken from its
+            histogram built in the same pass, else its minimum and maximum.
+
+    Returns:
+        Names of the windows and paths of the saved maps.
+    """
+    if output_dir is not None and not output_dir.exists():
+        raise FileNotFoundError(f"Folder does not exist at {output_dir}.")
+    _, shape = parse_rpl_keys(read_rpl(rpl_filepath))
+    for name, (start, stop) in windows.items():
+        if not 0 <= start < stop <= shape[2]:
+            raise ValueError(
+                f"Window {name} [{start}, {stop}) is not within the channels "
+                f"[0, {shape[2]}) of the RAW."
+            )
+
+    # "All or nothing": Check if all available. If not, raise which ones.
+    names = list(windows)
+    folder = raw_filepath.parent if output_dir is None else output_dir
+    paths = [
+        folder / f"{raw_filepath.stem}_{''.join(name.split())}.png" for name in names
+    ]
+    existing: list[Path] = [path for path in paths if path.is_file()]
+    if existing and not overwrite:
+        raise FileExistsError(
+            "No maps saved. One or more already exist:\n\n"
+            f"{'\n'.join(str(path) for path in existing)}"
+        )
+
+    slices = [slice(start, stop) for start, stop in windows.values()]
+    statistics = raw_statistics(
+        raw_filepath, rpl_filepath, chunk_bytes, workers, cache, cache_dir, slices
+    )
+    for window, path in zip(slices, paths):
+        window_map = statistics.window_sums[(window.start, window.stop)]
+        limits = None
+        if stretch is not None:
+            limits = stretch_limits(window_map, stretch, statistics.histogram(window))
+        save_dms_image(window_map, path, 16, limits=limits)
+    return names, paths
+
+
+def channel_window(
+    low: float,
+    high: float,
+    gain: float = 1.0,
+    offset: float = 0.0,
+) -> tuple[int, int]:
+    """Get the window of channels [start, stop) covering a window of energies.
+
+    Args:
+        low: Lowest energy of the window.
+        high: Highest energy of the window.
+        gain: Energy per channel of the linear calibration, e.g. in keV.
+        offset: Energy of channel 0 of the linear calibration.
+    """
+    start = math.floor((low - offset) / gain)
+    stop = math.floor((high - offset) / gain) + 1
+    return max(start, 0), stop
+
+
+class Histogram:
+    """Histogram of fixed bins, built incrementally, from which to take percentiles.
+
+    The bins are of equal `width` from `low`. When values beyond the last bin are added,
+    the width doubles (merging pairs of bins) until they fit, so the histogram of e.g. a
+    map of counts can be built band by band without knowing the maximum in advance.
+    Values below `low` and non-finite values are ignored.
+
+    Args:
+        bins: Amount of bins, even.
+        low: Lower edge of the first bin.
+        width: Initial width of a bin. The default fits integers exactly.
+    """
+    def __init__(
+        self,
+        bins: int = HISTOGRAM_BINS,
+        low: float = 0.0,
+        width: float = 1.0,
+    ) -> None:
+        self.low = low
+        self.width = width
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    @classmethod
+    def of_range(
+        cls,
+        low: float,
+        high: float,
+        bins: int = HISTOGRAM_BINS,
+    ) -> "Histogram":
+        """Create a histogram whose bins span [low, high] exactly, e.g. of an image."""
+        width = (high - low) / (bins - 1) if high > low else 1.0
+        return cls(bins, low, width)
+
+    def add(self, values: np.ndarray) -> None:
+        """Add values (of any shape) to the histogram."""
+        values = np.asarray(values).ravel()
+        if values.dtype.kind == 'f':
+            values = values[np.isfinite(values)]
+        if not values.size:
+            return
+        offsets = values.astype(np.float64) - self.low
+        offsets = offsets[offsets >= 0]
+        if not offsets.size:
+            return
+        self.grow(float(offsets.max()))
+        indices = (offsets / self.width).astype(np.intp)
+        self.counts += np.bincount(indices, minlength=self.counts.size)
+
+    def grow(self, offset: float) -> None:
+        """Double the width of the bins until an offset from `low` fits."""
+        while offset >= self.counts.size * self.width:
+            self.counts = merge_bin_pairs(self.counts)
+            self.width *= 2
+
+    def merge(self, other: "Histogram") -> None:
+        """Add the counts of another histogram of the same bins and `low`.
+
+        The widths of both must be the same up to a power of two, e.g. if built from the
+        same initial width.
+        """
+        other_counts, other_width = other.counts, other.width
+        while other_width < self.width:
+            other_counts = merge_bin_pairs(other_counts)
+            other_width *= 2
+        while self.width < other_width:
+            self.counts = merge_bin_pairs(self.counts)
+            self.width *= 2
+        self.counts += other_counts
+
+    def locate(self, q: float) -> tuple[int, int, int]:
+        """Locate the bin with the value below which `q` percent of the values are.
+
+        Returns:
+            Index of the bin, count of values before it and count in it.
+        """
+        cumulative = np.cumsum(self.counts)
+        target = q / 100 * int(cumulative[-1])
+        i = min(int(np.searchsorted(cumulative, target)), self.counts.size - 1)
+        return i, int(cumulative[i] - self.counts[i]), int(self.counts[i])
+
+
+def histogram(values: np.ndarray) -> Histogram:
+    """Get the histogram of integer values, e.g. of a band of a map of counts."""
+    values_histogram = Histogram()
+    values_histogram.add(values)
+    return values_histogram
+
+
+def merge_bin_pairs(counts: np.ndarray) -> np.ndarray:
+    """Merge each pair of bins of counts into the first half, leaving the rest empty."""
+    merged = np.zeros_like(counts)
+    merged[:counts.size // 2] = counts.reshape(-1, 2).sum(axis=1)
+    return merged
+
+
+def image_histogram(
+    image: np.ndarray,
+    block_bytes: int = ROW_BLOCK_BYTES,
+) -> Histogram:
+    """Get the histogram of an image over its finite range, by block of rows.
+
+    The finite range is reduced by band of rows (see `image_ranges`), then each block of
+    rows is added to a histogram of that range, so no full-size temporary (e.g. a mask
+    of finite values) is made. An image without finite values gets an empty histogram.
+    """
+    low, high = image_ranges(image[np.newaxis], chunk_bytes=block_bytes)[0]
+    if not low <= high:
+        return Histogram()
+    finite_histogram = Histogram.of_range(float(low), float(high))
+    for rows in row_blocks(image.shape, image.itemsize, block_bytes):
+        finite_histogram.add(image[rows])
+    return finite_histogram
+
+
+def stretch_limits(
+    image: np.ndarray,
+    percentiles: tuple[float, float] = STRETCH_PERCENTILES,
+    histogram: Histogram | None = None,
+    refinements: int | None = None,
+    rows: int = 256,
+) -> tuple[float, float]:
+    """Get the values of an image (e.g. a map) at a low and a high percentile.
+
+    The percentiles are located in a histogram of the image, by default built by block
+    of rows over its finite range (see `image_histogram`), or else the given one (e.g.
+    built in the pass which made a map). As a single hot pixel can make the bins wide,
+    the bin of each percentile is then refined into as many bins, by block of rows,
+    again and again until it is as narrow as the resolution of the image (one integer,
+    or the spacing of floats of its dtype there) or stops narrowing, or at most
+    `refinements` times. Each refinement narrows the bin by the amount of bins, so only
+    a few are needed even for a hot pixel many orders of magnitude out. No sorting is
+    needed.
+
+    Returns:
+        Values at the low and high percentile, interpolated within their finest bin.
+    """
+    if histogram is None:
+        histogram = image_histogram(image)
+    if not histogram.counts.any():
+        return histogram.low, histogram.low
+
+    bins = histogram.counts.size
+    total = int(histogram.counts.sum())
+    located = [histogram.locate(q) for q in percentiles]
+    # (low edge, width, count before, count in) of the bin of each percentile
+    edges = [
+        (histogram.low + i * histogram.width, histogram.width, before, count)
+        for i, before, count in located
+    ]
+
+    def resolved(low: float, width: float) -> bool:
+        # Would not narrow any more in float64, as its bins would not be distinct
+        if width / bins < 4 * np.spacing(max(abs(low), abs(low + width))):
+            return True
+        if image.dtype.kind in 'iu':
+            return width <= 1
+        high = image.dtype.type(max(abs(low), abs(low + width)))
+        return width <= float(np.spacing(high))
+
+    refined_times = 0
+    while not all(resolved(low, width) for low, width, _, _ in edges):
+        if refinements is not None and refined_times >= refinements:
+            break
+        refined_times += 1
+        unresolved = [
+            j for j, (low, width, _, _) in enumerate(edges)
+            if not resolved(low, width)
+        ]
+        counts = {j: np.zeros(bins, dtype=np.int64) for j in unresolved}
+        for start in range(0, image.shape[0], rows):
+            # In float64, as refined bins can be finer than float32 resolves
+            block = image[start:start + rows].astype(np.float64)
+            for j, bin_counts in counts.items():
+                low, width, _, _ = edges[j]
+                bin_counts += np.histogram(block, bins, range=(low, low + width))[0]
+        for j, bin_counts in counts.items():
+            low, width, before, _ = edges[j]
+            cumulative = before + np.cumsum(bin_counts)
+            i = min(
+                int(np.searchsorted(cumulative, percentiles[j] / 100 * total)),
+                bins - 1,
+            )
+            edges[j] = (
+                low + i * width / bins,
+                width / bins,
+                int(cumulative[i] - bin_counts[i]),
+                int(bin_counts[i]),
+            )
+
+    limits = []
+    for q, (low, width, before, count) in zip(percentiles, edges):
+        fraction = (q / 100 * total - before) / count if count else 0.0
+        limit = low + min(max(fraction, 0.0), 1.0) * width
+        # At the resolution of the image, its bin holds a single value of the image
+        if image.dtype.kind in 'iu':
+            if width <= 1 and math.ceil(low) <= low + width:
+                limit = float(math.ceil(low))
+        else:
+            limit = float(image.dtype.type(limit))
+        limits.append(limit)
+    return limits[0], limits[1]
+
+
+class PreviewStatistics:
+    """Fused statistics of a RAW for a preview, accumulated band by band of rows.
+
+    One pass over the bands accumulates the max-spectrum, the sum-spectrum and the map
+    of total counts per pixel. While each band is in memory, it is also integrated over
+    the windows of channels around the `peaks` highest distinct peaks of the
+    max-spectrum so far. Those peaks rarely change after the first bands, so usually
+    no band must be integrated again by `window_maps` once the final peaks are known.
+
+    Bands can be reduced in parallel with `reduce` and then combined in band order with
+    `combine`, so the result does not depend on the amount of threads.
+
+    Any given `windows` of channels (e.g. of elements) are integrated in the same pass.
+    Complete maps of window sums are kept in `window_sums` by (start, stop) channel,
+    e.g. to be cached with `save_statistics`, and their histograms, built in the same
+    pass for contrast stretching, in `histograms`.
+
+    Args:
+        shape: Shape (height, width, depth) of the RAW.
+        dtype: Data type of the RAW.
+        windows: Windows of channels to integrate in the same pass.
+        peaks: Amount of highest distinct peaks to integrate speculatively.
+    """
+    def __init__(
+        self,
+        shape: tuple[int, int, int],
+        dtype: str | np.dtype,
+        windows: Iterable[slice] = (),
+        peaks: int = 1,
+    ) -> None:
+        self.shape = shape
+        self.max_spectrum = np.zeros(shape[2], dtype=dtype)
+        self.sum_spectrum = np.zeros(shape[2], dtype=np.uint64)
+        self.total_counts = np.zeros(shape[:2], dtype=np.uint64)
+        self.windows = unique_windows(windows)
+        self.peaks = peaks
+        self.window_sums: dict[tuple[int, int], np.ndarray] = {
+            (window.start, window.stop): np.zeros(shape[:2], dtype=np.uint64)
+            for window in self.windows
+        }
+        self.histograms: dict[tuple[int, int], Histogram] = {
+            (window.start, window.stop): Histogram() for window in self.windows
+        }
+        self.band_window_sums: dict[
+            tuple[int, int], dict[tuple[int, int], tuple[np.ndarray, Histogram]]
+        ] = {}
+
+    def reduce(self, rows: slice, band: np.ndarray) -> tuple:
+        """Reduce a band of rows of shape (rows, width, depth) to partial statistics.
+
+        Safe to call from several threads at once. The peaks so far are read without a
+        lock, which only affects which bands `window_maps` must integrate again.
+        """
+        band_max = band.max(axis=(0, 1))
+        # Sum in 32 bits where it cannot overflow: it is notably faster than in 64.
+        pixels = band.shape[0] * band.shape[1]
+        if pixels * np.iinfo(band.dtype).max < 2 ** 32:
+            band_sum = band.sum(axis=(0, 1), dtype=np.uint32)
+        else:
+            band_sum = band.sum(axis=(0, 1), dtype=np.uint64)
+        if band.shape[2] * np.iinfo(band.dtype).max < 2 ** 32:
+            band_total = band.sum(axis=2, dtype=np.uint32)
+        else:
+            band_total = band.sum(axis=2, dtype=np.uint64)
+        peaks = top_peaks(np.maximum(self.max_spectrum, band_max), self.peaks)
+        peak_windows = [peak_window(peak, self.shape[2]) for peak in peaks]
+        band_peak_sums = {
+            (window.start, window.stop): (band_window_sum, histogram(band_window_sum))
+            for window, band_window_sum in zip(
+                peak_windows, integrate_windows(band, peak_windows)
+            )
+        }
+        band_windows_sums = [
+            (band_window_sum, histogram(band_window_sum))
+            for band_window_sum in integrate_windows(band, self.windows)
+        ]
+        return (
+            rows, band_max, band_sum, band_total, band_peak_sums, band_windows_sums,
+        )
+
+    def combine(self, partial: tuple) -> None:
+        """Combine the partial statistics of a band from `reduce`."""
+        (
+            rows, band_max, band_sum, band_total, band_peak_sums, band_windows_sums,
+        ) = partial
+        np.maximum(self.max_spectrum, band_max, out=self.max_spectrum)
+        self.sum_spectrum += band_sum
+        self.total_counts[rows] = band_total
+        self.band_window_sums[(rows.start, rows.stop)] = band_peak_sums
+        for window, (band_windows_sum, band_histogram) in zip(
+            self.windows, band_windows_sums
+        ):
+            self.window_sums[(window.start, window.stop)][rows] = band_windows_sum
+            self.histograms[(window.start, window.stop)].merge(band_histogram)
+
+    def update(self, rows: slice, band: np.ndarray) -> None:
+        """Accumulate a band of rows of shape (rows, width, depth)."""
+        self.combine(self.reduce(rows, band))
+
+    @property
+    def peak(self) -> int:
+        """Channel of the highest peak of the max-spectrum."""
+        return int(np.argmax(self.max_spectrum))
+
+    def peak_windows(self, peaks: int = 1) -> list[slice]:
+        """Windows of channels around the highest distinct peaks of the max-spectrum."""
+        return [
+            peak_window(peak, self.shape[2])
+            for peak in top_peaks(self.max_spectrum, peaks)
+        ]
+
+    def window_map(
+        self,
+        raw: np.ndarray,
+        window: slice | None = None,
+        workers: int = 1,
+    ) -> np.ndarray:
+        """Get the map of the sums over a window of channels, by default of the peak.
+
+        See `window_maps`.
+        """
+        if window is None:
+            window = peak_window(self.peak, self.shape[2])
+        return self.window_maps(raw, [window], workers=workers)[0]
+
+    def window_maps(
+        self,
+        raw: np.ndarray,
+        windows: Iterable[slice],
+        chunk_bytes: int = CHUNK_BYTES,
+        workers: int = 1,
+    ) -> list[np.ndarray]:
+        """Get the maps of the sums over windows of channels, in at most a single pass.
+
+        The maps are also kept in `window_sums`, and taken from there if already known.
+        Missing maps are assembled from the sums by band of the speculative peak
+        windows, and only the bands missing any of them are read again, integrating
+        all missing windows together, so the RAW is read at most once however many
+        windows there are.
+
+        Args:
+            raw: The RAW (e.g. its memory map).
+            windows: Windows of channels.
+            chunk_bytes: Approximate size in bytes of a band of rows read at once, if
+                there are no sums by band (e.g. if loaded from a cache).
+            workers: Amount of threads integrating bands in parallel.
+        """
+        windows = list(windows)
+        missing = [
+            window for window in unique_windows(windows)
+            if (window.start, window.stop) not in self.window_sums
+        ]
+        if missing:
+            keys = [(window.start, window.stop) for window in missing]
+            maps = [np.empty(self.shape[:2], dtype=np.uint64) for _ in missing]
+            histograms = [Histogram() for _ in missing]
+            if self.band_window_sums:
+                bands = [slice(start, stop) for start, stop in self.band_window_sums]
+            else:
+                # e.g. loaded from a cache, without any sums by band
+                bands = row_bands(self.shape, raw.itemsize, chunk_bytes)
+
+            missed: list[slice] = []
+            for rows in bands:
+                band_sums = self.band_window_sums.get((rows.start, rows.stop), {})
+                if all(key in band_sums for key in keys):
+                    for key, window_map, window_histogram in zip(
+                        keys, maps, histograms
+                    ):
+                        window_map[rows], band_histogram = band_sums[key]
+                        window_histogram.merge(band_histogram)
+                else:
+                    missed.append(rows)
+
+            for rows, band_sums in map_ordered(
+                lambda rows: (rows, integrate_windows(raw[rows], missing)),
+                missed,
+                workers,
+            ):
+                for window_map, window_histogram, band_sum in zip(
+                    maps, histograms, band_sums
+                ):
+                    window_map[rows] = band_sum
+                    window_histogram.add(band_sum)
+            for key, window_map, window_histogram in zip(keys, maps, histograms):
+                self.window_sums[key] = window_map
+                self.histograms[key] = window_histogram
+        return [self.window_sums[(window.start, window.stop)] for window in windows]
+
+    def histogram(self, window: slice) -> Histogram:
+        """Get the histogram of the map of a window from `window_maps`.
+
+        If not built in the pass which made the map (e.g. if loaded from a cache), it is
+        built from the map, by block of rows.
+        """
+        key = (window.start, window.stop)
+        if key not in self.histograms:
+            window_histogram = Histogram()
+            window_map = self.window_sums[key]
+            for rows in row_bands(window_map.shape + (1,), window_map.itemsize):
+                window_histogram.add(window_map[rows])
+            self.histograms[key] = window_histogram
+        return self.histograms[key]
+
+
+def top_peaks(
+    spectrum: np.ndarray,
+    peaks: int,
+    half: int = PEAK_HALF_WINDOW,
+) -> list[int]:
+    """Get the channels of the highest distinct peaks of a spectrum, highest first.
+
+    Peaks are distinct if their windows of `half` channels to each side do not overlap,
+    so a lower channel next to a higher peak is not counted as another peak.
+    """
+    found: list[int] = []
+    if peaks < 1:
+        return found
+    # stable, so that the first of equal channels is taken as np.argmax does
+    for channel in np.argsort(-spectrum.astype(np.int64), kind='stable'):
+        if all(abs(int(channel) - peak) >= 2 * half for peak in found):
+            found.append(int(channel))
+            if len(found) == peaks:
+                break
+    return found
+
+
+def unique_windows(windows: Iterable[slice]) -> list[slice]:
+    """Get the distinct windows of channels, in order of first occurrence."""
+    keys = dict.fromkeys((window.start, window.stop) for window in windows)
+    return [slice(start, stop) for start, stop in keys]
+
+
+def integrate_windows(band: np.ndarray, windows: list[slice]) -> list[np.ndarray]:
+    """Sum a band of rows of shape (rows, width, depth) over each window of channels."""
+    return [band[:, :, window].sum(axis=2, dtype=np.uint64) for window in windows]
+
+
+def raw_statistics(
+    raw_filepath: Path,
+    rpl_filepath: Path,
+    chunk_bytes: int = CHUNK_BYTES,
+    workers: int = 1,
+    cache: bool = False,
+    cache_dir: Path | None = None,
+    windows: Iterable[slice] = (),
+    peaks: int = 1,
+    statistics: PreviewStatistics | None = None,
+) -> PreviewStatistics:
+    """Get the statistics of a RAW, from its cache file if valid, else by one pass.
+
+    Args:
+        raw_filepath: Path of the RAW.
+        rpl_filepath: Path of the RPL of the RAW.
+        chunk_bytes: Approximate size in bytes of a band of rows read at once.
+        workers: Amount of threads reducing bands in parallel.
+        cache: Whether to load the statistics from the cache file, and save them to it
+            if computed. See `statistics_cache_filepath`.
+        cache_dir: Central cache folder, else the cache file is next to the RAW.
+        windows: Windows of channels to integrate as well, in the same pass. If the
+            statistics are cached, only windows not yet in the cache are integrated,
+            together in a single pass.
+        peaks: Amount of highest distinct peaks whose windows to integrate as well.
+        statistics: Statistics already accumulated, e.g. while writing the RAW (see
+            `transform_raw_rpl`), to use instead of the cache or a pass. They are
+            saved to the cache file with `cache`.
+
+    Returns:
+        The statistics, including maps of the `windows` in `window_sums`. With `cache`,
+        they include the maps of the windows of the `peaks`.
+    """
+    windows = list(windows)
+    # Before anything is read, so that statistics of a RAW changed meanwhile (e.g.
+    # transformed in place) are not cached as valid for the changed RAW
+    key = statistics_key(raw_filepath, rpl_filepath)
+    dtype, shape = parse_rpl_keys(read_rpl(rpl_filepath))
+    raw_mm = np.memmap(raw_filepath, dtype=dtype, mode='r', shape=shape)
+
+    if statistics is not None:
+        windows += statistics.peak_windows(peaks)
+        statistics.window_maps(raw_mm, windows, chunk_bytes, workers)
+        if cache:
+            save_statistics(statistics, raw_filepath, rpl_filepath, key, cache_dir)
+        return statistics
+
+    if cache:
+        statistics = load_statistics(raw_filepath, rpl_filepath, cache_dir)
+        if statistics is not None:
+            known = len(statistics.window_sums)
+            windows += statistics.peak_windows(peaks)
+            statistics.window_maps(raw_mm, windows, chunk_bytes, workers)
+            if len(statistics.window_sums) > known:
+                save_statistics(statistics, raw_filepath, rpl_filepath, key, cache_dir)
+            return statistics
+
+    statistics = PreviewStatistics(shape, dtype, windows, peaks)
+    bands = row_bands(shape, raw_mm.itemsize, chunk_bytes)
+    for partial in map_ordered(
+        lambda rows: statistics.reduce(rows, raw_mm[rows]), bands, workers
+    ):
+        statistics.combine(partial)
+
+    if cache:
+        windows = statistics.peak_windows(peaks)
+        statistics.window_maps(raw_mm, windows, chunk_bytes, workers)
+        save_statistics(statistics, raw_filepath, rpl_filepath, key, cache_dir)
+    return statistics
+
+
+def statistics_cache_filepath(
+    raw_filepath: Path,
+    cache_dir: Path | None = None,
+) -> Path:
+    """Get the path of the cache file of the statistics of a RAW.
+
+    The cache file is next to the RAW (e.g. `scan.statistics.npz` for `scan.raw`), or,
+    in a central `cache_dir`, named by a hash of the absolute path of the RAW.
+    """
+    if cache_dir is None:
+        return raw_filepath.with_suffix(STATISTICS_SUFFIX)
+    digest = hashlib.sha256(str(raw_filepath.resolve()).encode()).hexdigest()[:16]
+    return cache_dir / f"{raw_filepath.stem}_{digest}{STATISTICS_SUFFIX}"
+
+
+def statistics_key(raw_filepath: Path, rpl_filepath: Path) -> str:
+    """Get the key for which cached statistics of a RAW are valid.
+
+    The key changes with the size and modification time of the RAW and with the
+    contents of its RPL, so a cache file of an overwritten RAW is not used.
+    """
+    stat = raw_filepath.stat()
+    return json.dumps({
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "rpl": hashlib.sha256(rpl_filepath.read_bytes()).hexdigest(),
+    })
+
+
+def load_statistics(
+    raw_filepath: Path,
+    rpl_filepath: Path,
+    cache_dir: Path | None = None,
+) -> PreviewStatistics | None:
+    """Load the cached statistics of a RAW.
+
+    Returns:
+        The statistics, or None if there is no cache file, or if it is unreadable or
+        of another version of the RAW or RPL.
+    """
+    cache_filepath = statistics_cache_filepath(raw_filepath, cache_dir)
+    if not cache_filepath.exists():
+        return None
+    try:
+        with np.load(cache_filepath) as npz:
+            if str(npz["key"]) != statistics_key(raw_filepath, rpl_filepath):
+                return None
+            dtype, shape = parse_rpl_keys(read_rpl(rpl_filepath))
+            statistics = PreviewStatistics(shape, dtype)
+            statistics.max_spectrum[:] = npz["max_spectrum"]
+            statistics.sum_spectrum[:] = npz["sum_spectrum"]
+            statistics.total_counts[:] = npz["total_counts"]
+            for name in npz.files:
+                if name.startswith("window_"):
+                    _, start, stop = name.split("_")
+                    statistics.window_sums[(int(start), int(stop))] = npz[name]
+    except (OSError, ValueError, KeyError):
+        return None
+    # mark as recently used for eviction from a central cache folder
+    os.utime(cache_filepath)
+    return statistics
+
+
+def save_statistics(
+    statistics: PreviewStatistics,
+    raw_filepath: Path,
+    rpl_filepath: Path,
+    key: str,
+    cache_dir: Path | None = None,
+    max_cache_bytes: int = STATISTICS_CACHE_BYTES,
+) -> Path | None:
+    """Save the statistics of a RAW to its cache file, compressed and atomically.
+
+    The statistics are saved under the `key` of the RAW taken before it was read (see
+    `statistics_key`). If the key has changed since, the RAW changed while it was read,
+    so the statistics are not saved.
+
+    The statistics are written to a temporary file of a unique name in the same folder,
+    which then replaces the cache file, so that concurrent writers (e.g. a quick
+    preview and a preview of the same RAW) never mix their bytes. The cache is only an
+    optimization, so failing to write it (e.g. in a read-only folder) is not an error.
+
+    In a central `cache_dir`, the least recently used cache files are then evicted
+    until the folder is within `max_cache_bytes` (see `evict_statistics`).
+
+    Returns:
+        Path of the cache file, or None if it could not be or was not written.
+    """
+    cache_filepath = statistics_cache_filepath(raw_filepath, cache_dir)
+    try:
+        changed = statistics_key(raw_filepath, rpl_filepath) != key
+    except OSError:
+        changed = True
+    if changed:
+        print(f"Not caching statistics of {raw_filepath}, changed while read.")
+        return None
+    windows = {
+        f"window_{start}_{stop}": window_sum
+        for (start, stop), window_sum in statistics.window_sums.items()
+    }
+    tmp_filepath: Path | None = None
+    try:
+        if cache_dir is not None:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=cache_filepath.parent,
+            prefix=f"{cache_filepath.name}.",
+            suffix=".tmp",
+            delete=False,
+        ) as file:
+            tmp_filepath = Path(file.name)
+            np.savez_compressed(
+                file,
+                key=np.array(key),
+                max_spectrum=statistics.max_spectrum,
+                sum_spectrum=statistics.sum_spectrum,
+                total_counts=statistics.total_counts,
+                **windows,
+            )
+        os.replace(tmp_filepath, cache_filepath)
+        if cache_dir is not None:
+            evict_statistics(cache_dir, max_cache_bytes, keep=cache_filepath)
+    except OSError as error:
+        print(f"Could not cache statistics to {cache_filepath}: {error}")
+        if tmp_filepath is not None:
+            with suppress(OSError):
+                tmp_filepath.unlink(missing_ok=True)
+        return None
+    return cache_filepath
+
+
+def evict_statistics(
+    cache_dir: Path,
+    max_bytes: int = STATISTICS_CACHE_BYTES,
+    keep: Path | None = None,
+) -> list[Path]:
+    """Delete the least recently used cache files until a folder is within a size.
+
+    Args:
+        cache_dir: Central cache folder.
+        max_bytes: Maximum total size in bytes of the cache files in the folder.
+        keep: Cache file never to delete, e.g. the one just saved.
+
+    Returns:
+        Paths of the deleted cache files.
+    """
+    stats: dict[Path, os.stat_result] = {}
+    for filepath in cache_dir.glob(f"*{STATISTICS_SUFFIX}"):
+        with suppress(FileNotFoundError):  # e.g. evicted meanwhile by another writer
+            stats[filepath] = filepath.stat()
+    cache_filepaths = sorted(stats, key=lambda filepath: stats[filepath].st_mtime_ns)
+    total_bytes = sum(stat.st_size for stat in stats.values())
+    evicted: list[Path] = []
+    for filepath in cache_filepaths:
+        if total_bytes <= max_bytes:
+            break
+        if keep is not None and filepath == keep:
+            continue
+        total_bytes -= stats[filepath].st_size
+        filepath.unlink(missing_ok=True)
+        evicted.append(filepath)
+    return evicted
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def map_ordered(
+    function: Callable[[T], R],
+    items: Iterable[T],
+    workers: int = 1,
+) -> Iterator[R]:
+    """Map a function over items on a pool of threads if `workers` > 1, else serially.
+
+    Results are yielded in the order of the items either way, so reductions over them
+    are deterministic.
+    """
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                for result in executor.map(function, items):
+                    check_cancelled()
+                    yield result
+            finally:
+                executor.shutdown(cancel_futures=True)
+    else:
+        for result in map(function, items):
+            check_cancelled()
+            yield result
+
+
+class Cancelled(Exception):
+    """Raised by `check_cancelled` once an operation is requested to be cancelled."""
+
+
+_cancellation = threading.local()
+
+
+@contextmanager
+def cancellable(cancel: threading.Event) -> Iterator[None]:
+    """Make long operations run within, in this thread, cancellable by an event.
+
+    Once `cancel` is set (e.g. from another thread), the operation raises `Cancelled`
+    at its next check: after each band or tile of `map_ordered`, each image of
+    `save_dms_images` and each step of `transform_in_place`. Partial copies are
+    removed (see `removed_if_cancelled`), and a transform in place can be resumed or
+    rolled back as if interrupted.
+    """
+    previous = getattr(_cancellation, "event", None)
+    _cancellation.event = cancel
+    try:
+        yield
+    finally:
+        _cancellation.event = previous
+
+
+def check_cancelled() -> None:
+    """Raise `Cancelled` if the cancellation of this thread is requested."""
+    cancel: threading.Event | None = getattr(_cancellation, "event", None)
+    if cancel is not None and cancel.is_set():
+        raise Cancelled("Cancelled.")
+
+
+@contextmanager
+def removed_if_cancelled(*filepaths: Path) -> Iterator[None]:
+    """Remove files written within, which are then partial, if cancelled."""
+    try:
+        yield
+    except Cancelled:
+        for filepath in filepaths:
+            with suppress(OSError):  # e.g. still mapped on Windows
+                filepath.unlink(missing_ok=True)
+        raise
+
+
+def peak_window(peak: int, depth: int, half: int = PEAK_HALF_WINDOW) -> slice:
+    """Get the slice of the window of channels around a peak, within [0, depth)."""
+    return slice(max(peak - half, 0), min(peak + half, depth))
+
+
+def row_bands(
+    shape: tuple[int, ...],
+    itemsize: int,
+    chunk_bytes: int = CHUNK_BYTES,
+) -> list[slice]:
+    """Split the rows (first axis) of an array into bands of about `chunk_bytes`."""
+    row_bytes = itemsize * math.prod(shape[1:])
+    rows = max(1, chunk_bytes // row_bytes)
+    return [slice(i, min(i + rows, shape[0])) for i in range(0, shape[0], rows)]
+
+
+def open_raw_rpl(
+    raw_filepath: Path,
+    rpl_filepath: Path,
+    transform: Transform = Transform(),
+) -> np.ndarray:
+    """Open a RAW as a read-only (height, width, depth) array under a transform.
+
+    Nothing is copied or written: the array is a view of the memory map of the RAW
+    with its coordinates transformed, so slicing a window reads only its own pages.
+    """
+    dtype, shape = parse_rpl_keys(read_rpl(rpl_filepath))
+    raw_mm = np.memmap(raw_filepath, dtype=dtype, mode='r', shape=shape)
+    return transform.apply(raw_mm)
+
+
+def open_dms(
+    dms_filepath: Path,
+    transform: Transform = Transform(),
+) -> np.ndarray:
+    """Open DMS images as a read-only (images, height, width) array under a transform.
+
+    Nothing is copied or written: the array is a view of the memory map of the DMS
+    with its coordinates transformed, so slicing a window reads only its own pages.
+    """
+    header_lines = read_dms_header(dms_filepath)
+    header_size = sum([len(line) for line in header_lines])
+    dimensions = parse_dms_header_dimensions(header_lines[1])
+    images = read_dms_images(dms_filepath, header_size, dimensions)
+    return transform.apply(images, axes=(1, 2))
+
+
 def rot90_raw_rpl(
     raw_filepath: Path,
     rpl_filepath: Path,
     output_dir: Path | None = None,
     n: int = 1,
-    mode: WriteMode = 'x'
+    mode: WriteMode = 'x',
+    workers: int = 1,
+) -> tuple[Path, Path]:
+    """Rotate and save a RAW and RPL by n×90 degrees.
+
+    With `workers` > 1, bands of output rows are filled in parallel by threads. The
+    output is identical regardless of `workers`.
+    """
+    return transform_raw_rpl(
+        raw_filepath,
+        rpl_filepath,
+        output_dir,
+        transform=Transform.rotation(n),
+        mode=mode,
+        workers=workers,
+    )
+
+
+def transform_raw_rpl(
+    raw_filepath: Path,
+    rpl_filepath: Path,
+    output_dir: Path | None = None,
+    transform: Transform = Transform.rotation(1),
+    mode: WriteMode = 'x',
+    workers: int = 1,
+    statistics: PreviewStatistics | None = None,
 ) -> tuple[Path, Path]:
-    """Rotate and save a RAW and RPL by n×90 degrees."""
+    """Transform and save a RAW and RPL in a single pass, appending `_<transform name>`.
+
+    With `workers` > 1, bands of output rows are filled in parallel by threads. The
+    output is identical regardless of `workers`.
+
+    With `statistics` (of the transformed shape), each band of output rows is reduced
+    into them while in memory, so a preview of the output needs no further pass over
+    it (see `transform_raw_rpl_with_preview`).
+    """
     if output_dir is not None and not output_dir.exists():
         raise FileNotFoundError(f"Folder does not exist at {output_dir}.")
 
     if output_dir is None:
         output_dir = raw_filepath.parent
 
-    angle = n * 90 % 360
-    append = f"_rot{angle}"
+    append = f"_{transform.name}"
 
-    rot_raw_filepath: Path = (
+    tr_raw_filepath: Path = (
         output_dir / (raw_filepath.stem + append + raw_filepath.suffix)
     )
-    rot_rpl_filepath: Path = (
+    tr_rpl_filepath: Path = (
         output_dir / (rpl_filepath.stem + append + rpl_filepath.suffix)
     )
-    if rot_raw_filepath.exists() and mode != 'w':
-        raise FileExistsError(f'RAW file already exists: {rot_raw_filepath}.')
-    if rot_rpl_filepath.exists() and mode != 'w':
-        raise FileExistsError(f'RPL file already exists: {rot_raw_filepath}.')
+    if tr_raw_filepath.exists() and mode != 'w':
+        raise FileExistsError(f'RAW file already exists: {tr_raw_filepath}.')
+    if tr_rpl_filepath.exists() and mode != 'w':
+        raise FileExistsError(f'RPL file already exists: {tr_rpl_filepath}.')
 
     keys = read_rpl(rpl_filepath)
     dtype, shape = parse_rpl_keys(keys)
     raw_mm = np.memmap(raw_filepath, dtype=dtype, mode='r', shape=shape)
 
-    # Rotate RPL
-    if n % 2:  # Switch height and width if 90, 270, ...
-        height = keys["height"]["value"]
-        keys["height"]["value"] = keys["width"]["value"]
-        keys["width"]["value"] = height
-    write_rpl(keys, rot_rpl_filepath, mode)
-
-    # Rotate RAW
-    rot_raw_mm = np.rot90(raw_mm, k=n)
-    rot_shape = rot_raw_mm.shape
-    out = np.memmap(rot_raw_filepath, dtype=dtype, mode='w+', shape=rot_shape)
-
-    # Go by chunk instead of all at once.
-    # out[:] = rot_raw_mm[:]
-    chunk_size = 1
-    total_rows = rot_shape[0]
-    for i in range(0, total_rows, chunk_size):
-        sl = slice(i, min(i + chunk_size, total_rows))
-        data_chunk = rot_raw_mm[sl]
-        out[sl] = data_chunk
+    tr_raw_mm = transform.apply(raw_mm)
+    tr_shape = tr_raw_mm.shape
+    if statistics is not None and statistics.shape != tr_shape:
+        raise ValueError(f"Statistics of shape {statistics.shape}, not {tr_shape}.")
+
+    with removed_if_cancelled(tr_raw_filepath, tr_rpl_filepath):
+        # Transform RPL
+        if transform.swaps_axes:  # Switch height and width if 90, 270, transpose, ...
+            height = keys["height"]["value"]
+            keys["height"]["value"] = keys["width"]["value"]
+            keys["width"]["value"] = height
+        write_rpl(keys, tr_rpl_filepath, mode)
+
+        # Transform RAW
+        out = np.memmap(tr_raw_filepath, dtype=dtype, mode='w+', shape=tr_shape)
+
+        # Go by tile instead of all at once, and flush only once at the end.
+        if statistics is None:
+            copy_tiled(tr_raw_mm, out, workers=workers)
+        else:
+            copy_tiled(
+                tr_raw_mm, out, workers=workers,
+                reduce=statistics.reduce, combine=statistics.combine,
+            )
         out.flush()
 
-    return rot_raw_filepath, rot_rpl_filepath
+    return tr_raw_filepath, tr_rpl_filepath
+
+
+def transform_raw_rpl_with_preview(
+    raw_filepath: Path,
+    rpl_filepath: Path,
+    output_dir: Path | None = None,
+    transform: Transform = Transform.rotation(1),
+    mode: WriteMode = 'x',
+    workers: int = 1,
+    show: bool = False,
+    cache: bool = False,
+    cache_dir: Path | None = None,
+    stretch: tuple[float, float] | None = None,
+) -> tuple[Path, Path, Path | None]:
+    """Transform and save a RAW and RPL and a preview of the copy, in a single pass.
+
+    The statistics of the preview are accumulated from each band of the copy while it
+    is written (see `transform_raw_rpl`), so the preview takes no further pass over the
+    copy, unless its final peak differs from that of the first bands. With `cache`,
+    the statistics are saved to the cache of the copy. See `make_raw_preview` for
+    `show`, `cache_dir` and `stretch`.
+
+    Returns:
+        Paths of the RAW, the RPL and the preview of the copy.
+    """
+    dtype, shape = parse_rpl_keys(read_rpl(rpl_filepath))
+    height, width, depth = shape
+    tr_shape = (width, height, depth) if transform.swaps_axes else shape
+    statistics = PreviewStatistics(tr_shape, dtype)
+    tr_raw_filepath, tr_rpl_filepath = transform_raw_rpl(
+        raw_filepath, rpl_filepath, output_dir, transform, mode, workers, statistics
+    )
+    preview_filepath = make_raw_preview(
+        tr_raw_filepath,
+        tr_rpl_filepath,
+        output_dir,
+        show=show,
+        overwrite=mode == 'w',
+        workers=workers,
+        cache=cache,
+        cache_dir=cache_dir,
+        stretch=stretch,
+        statistics=statistics,
+    )
+    return tr_raw_filepath, tr_rpl_filepath, preview_filepath
+
+
+def transform_raw_rpl_fan_out(
+    raw_filepath: Path,
+    rpl_filepath: Path,
+    output_dir: Path | None = None,
+    transforms: Sequence[Transform] = ALL_ROTATIONS[1:],
+    mode: WriteMode = 'x',
+    workers: int = 1,
+    previews: bool = False,
+    show: bool = False,
+    cache: bool = False,
+    cache_dir: Path | None = None,
+    stretch: tuple[float, float] | None = None,
+) -> list[tuple[Path, Path, Path | None]]:
+    """Transform and save a RAW and RPL to several orientations in a single read pass.
+
+    Like `transform_raw_rpl` for each of `transforms`, but the RAW is read only once:
+    each square tile (see `tile_edge`) is read into memory once, then written to every
+    copy through a view of it in the orientation of the RAW, so memory is bounded by a
+    tile per worker. The copies are identical to those of `transform_raw_rpl`.
+
+    With `previews`, each band of tiles is also reduced into the statistics of the RAW
+    (see `PreviewStatistics`) right after it is read, through the memory map as in
+    `copy_tiled`, so from the page cache rather than the disk. The preview of each
+    copy is made from them as by `make_raw_preview` with its transform, so of the same
+    name as that of `transform_raw_rpl_with_preview`. See `make_raw_preview` for
+    `show`, `cache`, `cache_dir` and `stretch`; with `cache`, the statistics are saved
+    to the cache of the RAW, as they are of its orientation.
+
+    Returns:
+        Paths of the RAW, the RPL and the preview (or None) of each copy.
+    """
+    if output_dir is not None and not output_dir.exists():
+        raise FileNotFoundError(f"Folder does not exist at {output_dir}.")
+
+    if output_dir is None:
+        output_dir = raw_filepath.parent
+
+    transforms = list(dict.fromkeys(transforms))
+    filepaths = [
+        tuple(
+            output_dir / f"{filepath.stem}_{transform.name}{filepath.suffix}"
+            for filepath in (raw_filepath, rpl_filepath)
+        )
+        for transform in transforms
+    ]
+    existing = [path for paths in filepaths for path in paths if path.exists()]
+    if existing and mode != 'w':
+        raise FileExistsError(
+            f"Files already exist:\n\n{'\n'.join(str(path) for path in existing)}"
+        )
+
+    keys = read_rpl(rpl_filepath)
+    dtype, shape = parse_rpl_keys(keys)
+    raw_mm = np.memmap(raw_filepath, dtype=dtype, mode='r', shape=shape)
+
+    statistics = PreviewStatistics(shape, dtype) if previews else None
+    edge = tile_edge(shape, raw_mm.itemsize)
+    height, width = shape[:2]
+    bands = [slice(i, min(i + edge, height)) for i in range(0, height, edge)]
+    outs: list[np.memmap] = []
+    views: list[np.ndarray] = []
+
+    def fan_out_band(rows: slice) -> tuple | None:
+        for j in range(0, width, edge):
+            cols = slice(j, min(j + edge, width))
+            tile = np.array(raw_mm[rows, cols])
+            for view in views:
+                view[rows, cols] = tile
+        # like `copy_tiled`, reduce the band just read from the memory map
+        return None if statistics is None else statistics.reduce(rows, raw_mm[rows])
+
+    with removed_if_cancelled(*(path for paths in filepaths for path in paths)):
+        for transform, (tr_raw_filepath, tr_rpl_filepath) in zip(transforms, filepaths):
+            tr_keys = copy.deepcopy(keys)
+            if transform.swaps_axes:
+                tr_keys["height"]["value"] = keys["width"]["value"]
+                tr_keys["width"]["value"] = keys["height"]["value"]
+            write_rpl(tr_keys, tr_rpl_filepath, mode)
+            tr_shape = transform.apply(raw_mm).shape
+            out = np.memmap(tr_raw_filepath, dtype=dtype, mode='w+', shape=tr_shape)
+            outs.append(out)
+            # write to the copy in the orientation of the RAW
+            views.append(transform.inverse.apply(out))
+
+        for partial in map_ordered(fan_out_band, bands, workers):
+            if statistics is not None:
+                statistics.combine(partial)  # type: ignore
+        for out in outs:
+            out.flush()
+
+    preview_filepaths: list[Path | None] = [None] * len(transforms)
+    if statistics is not None:
+        # finish (and cache) the statistics once for all previews
+        raw_statistics(
+            raw_filepath, rpl_filepath, workers=workers, cache=cache,
+            cache_dir=cache_dir, statistics=statistics,
+        )
+        preview_filepaths = [
+            make_raw_preview(
+                raw_filepath,
+                rpl_filepath,
+                output_dir,
+                show=show,
+                overwrite=mode == 'w',
+                transform=transform,
+                workers=workers,
+                stretch=stretch,
+                statistics=statistics,
+            )
+            for transform in transforms
+        ]
+
+    return [
+        (tr_raw_filepath, tr_rpl_filepath, preview_filepath)
+        for (tr_raw_filepath, tr_rpl_filepath), preview_filepath
+        in zip(filepaths, preview_filepaths)
+    ]
+
+
+def bin_raw_rpl(
+    raw_filepath: Path,
+    rpl_filepath: Path,
+    output_dir: Path | None = None,
+    spatial: int = 2,
+    spectral: int = 1,
+    mode: WriteMode = 'x',
+    chunk_bytes: int = CHUNK_BYTES,
+) -> tuple[Path, Path]:
+    """Bin and save a RAW and RPL by summing blocks of pixels and channels.
+
+    Each output pixel is the sum of `spatial`×`spatial` input pixels, and each output
+    channel the sum of `spectral` input channels. Rows, columns and channels which do
+    not fill a whole block are dropped. Appends `_bin<spatial>x<spatial>x<spectral>`.
+
+    The source is streamed in bands of rows of about `chunk_bytes`. Sums are taken in
+    the smallest unsigned integer type which cannot overflow, which is also the type of
+    the output (and its RPL `data-length`).
+    """
+    if spatial < 1 or spectral < 1:
+        raise ValueError("Binning factors must be positive.")
+
+    if output_dir is not None and not output_dir.exists():
+        raise FileNotFoundError(f"Folder does not exist at {output_dir}.")
+
+    if output_dir is None:
+        output_dir = raw_filepath.parent
+
+    append = f"_bin{spatial}x{spatial}x{spectral}"
+
+    bin_raw_filepath: Path = (
+        output_dir / (raw_filepath.stem + append + raw_filepath.suffix)
+    )
+    bin_rpl_filepath: Path = (
+        output_dir / (rpl_filepath.stem + append + rpl_filepath.suffix)
+    )
+    if bin_raw_filepath.exists() and mode != 'w':
+        raise FileExistsError(f'RAW file already exists: {bin_raw_filepath}.')
+    if bin_rpl_filepath.exists() and mode != 'w':
+        raise FileExistsError(f'RPL file already exists: {bin_rpl_filepath}.')
+
+    keys = read_rpl(rpl_filepath)
+    dtype, shape = parse_rpl_keys(keys)
+    raw_mm = np.memmap(raw_filepath, dtype=dtype, mode='r', shape=shape)
+
+    height, width, depth = shape
+    bin_shape = (height // spatial, width // spatial, depth // spectral)
+    if 0 in bin_shape:
+        raise ValueError(f"Binning factors too large for shape {shape}.")
+
+    bin_dtype = np.min_scalar_type(np.iinfo(dtype).max * spatial ** 2 * spectral)
+    if bin_dtype.kind != 'u':
+        raise ValueError("Binning factors too large: sums would overflow uint64.")
+
+    # Bin RPL
+    keys["height"]["value"] = str(bin_shape[0])
+    keys["width"]["value"] = str(bin_shape[1])
+    keys["depth"]["value"] = str(bin_shape[2])
+    keys["data-length"]["value"] = str(bin_dtype.itemsize)
+    write_rpl(keys, bin_rpl_filepath, mode)
+
+    # Bin RAW by band of output rows
+    out = np.memmap(bin_raw_filepath, dtype=bin_dtype, mode='w+', shape=bin_shape)
+    row_bytes = spatial * width * depth * raw_mm.itemsize
+    band_rows = max(1, chunk_bytes // row_bytes)
+    for i in range(0, bin_shape[0], band_rows):
+        rows = slice(i, min(i + band_rows, bin_shape[0]))
+        band = raw_mm[
+            rows.start * spatial:rows.stop * spatial,
+            :bin_shape[1] * spatial,
+            :bin_shape[2] * spectral,
+        ]
+        blocks = band.reshape(
+            rows.stop - rows.start, spatial,
+            bin_shape[1], spatial,
+            bin_shape[2], spectral,
+        )
+        out[rows] = blocks.sum(axis=(1, 3, 5), dtype=bin_dtype)
+    out.flush()
+
+    return bin_raw_filepath, bin_rpl_filepath
+
+
+def crop_raw_rpl(
+    raw_filepath: Path,
+    rpl_filepath: Path,
+    top: int,
+    left: int,
+    height: int,
+    width: int,
+    output_dir: Path | None = None,
+    mode: WriteMode = 'x',
+) -> tuple[Path, Path]:
+    """Crop and save a RAW and RPL to a rectangle of pixels.
+
+    Only the bytes of the spectra within the rectangle are copied, one contiguous range
+    per row (or one range altogether for full rows), without going through NumPy.
+    Appends `_crop<width>x<height>+<left>+<top>`.
+    """
+    if output_dir is not None and not output_dir.exists():
+        raise FileNotFoundError(f"Folder does not exist at {output_dir}.")
+
+    if output_dir is None:
+        output_dir = raw_filepath.parent
+
+    append = f"_crop{width}x{height}+{left}+{top}"
+
+    crop_raw_filepath: Path = (
+        output_dir / (raw_filepath.stem + append + raw_filepath.suffix)
+    )
+    crop_rpl_filepath: Path = (
+        output_dir / (rpl_filepath.stem + append + rpl_filepath.suffix)
+    )
+    if crop_raw_filepath.exists() and mode != 'w':
+        raise FileExistsError(f'RAW file already exists: {crop_raw_filepath}.')
+    if crop_rpl_filepath.exists() and mode != 'w':
+        raise FileExistsError(f'RPL file already exists: {crop_rpl_filepath}.')
+
+    keys = read_rpl(rpl_filepath)
+    dtype, shape = parse_rpl_keys(keys)
+    check_crop(shape[:2], top, left, height, width)
+    pixel_bytes = np.dtype(dtype).itemsize * shape[2]
+
+    # Crop RPL
+    keys["height"]["value"] = str(height)
+    keys["width"]["value"] = str(width)
+    write_rpl(keys, crop_rpl_filepath, mode)
+
+    # Crop RAW
+    with (
+        open(raw_filepath, 'rb') as src,
+        open(crop_raw_filepath, f'{mode}b') as dst,
+    ):
+        copy_crop(
+            src.fileno(), dst.fileno(), 0, 0, shape[:2], pixel_bytes,
+            top, left, height, width,
+        )
+
+    return crop_raw_filepath, crop_rpl_filepath
+
+
+def crop_dms(
+    dms_filepath: Path,
+    top: int,
+    left: int,
+    height: int,
+    width: int,
+    output_dir: Path | None = None,
+    mode: WriteMode = 'x',
+) -> Path:
+    """Crop and save a DMS to a rectangle of pixels in all its images.
+
+    Only the bytes within the rectangle are copied, one contiguous range per row of
+    each image, without going through NumPy. Appends
+    `_crop<width>x<height>+<left>+<top>`.
+    """
+    if output_dir is not None and not output_dir.exists():
+        raise FileNotFoundError(f"Folder does not exist at {output_dir}.")
+
+    if output_dir is None:
+        output_dir = dms_filepath.parent
+
+    append = f"_crop{width}x{height}+{left}+{top}"
+
+    crop_dms_filepath: Path = (
+        output_dir / (dms_filepath.stem + append + dms_filepath.suffix)
+    )
+    if crop_dms_filepath.exists() and mode != 'w':
+        raise FileExistsError(f'DMS file already exists: {crop_dms_filepath}.')
+
+    header_lines = read_dms_header(dms_filepath)
+    header_size = sum([len(line) for line in header_lines])
+    dimensions = parse_dms_header_dimensions(header_lines[1])
+    names_lines, _ = read_dms_elemental_names(dms_filepath, header_size, dimensions)
+    check_crop(dimensions[1:], top, left, height, width)
+
+    # Keep the whitespace of the dimensions line, only replace the numbers.
+    width_split, height_split, images_split = (
+        split_dms_header_dimensions(header_lines[1])
+    )
+    crop_header_lines = [
+        header_lines[0],
+        b"".join([
+            re.sub(rb"\d+", str(width).encode('ascii'), width_split, count=1),
+            re.sub(rb"\d+", str(height).encode('ascii'), height_split, count=1),
+            images_split,
+        ]),
+    ]
+    crop_header_size = sum([len(line) for line in crop_header_lines])
+
+    image_bytes = dimensions[1] * dimensions[2] * 4
+    crop_image_bytes = height * width * 4
+    with (
+        open(dms_filepath, 'rb') as src,
+        open(crop_dms_filepath, f'{mode}b') as dst,
+    ):
+        dst.writelines(crop_header_lines)
+        dst.flush()
+        for i in range(dimensions[0]):
+            copy_crop(
+                src.fileno(), dst.fileno(),
+                header_size + i * image_bytes,
+                crop_header_size + i * crop_image_bytes,
+                dimensions[1:], 4,
+                top, left, height, width,
+            )
+        dst.seek(crop_header_size + dimensions[0] * crop_image_bytes)
+        dst.writelines(names_lines)
+
+    return crop_dms_filepath
+
+
+def check_crop(
+    shape: tuple[int, ...],
+    top: int,
+    left: int,
+    height: int,
+    width: int,
+) -> None:
+    """Raise if a crop rectangle is empty or not within a (height, width) shape."""
+    if height < 1 or width < 1:
+        raise ValueError(f"Crop of {width}×{height} is empty.")
+    if top < 0 or left < 0 or top + height > shape[0] or left + width > shape[1]:
+        raise ValueError(
+            f"Crop of {width}×{height} at ({left}, {top}) "
+            f"exceeds {shape[1]}×{shape[0]}."
+        )
+    return None
+
+
+def copy_crop(
+    src: int,
+    dst: int,
+    src_offset: int,
+    dst_offset: int,
+    shape: tuple[int, ...],
+    pixel_bytes: int,
+    top: int,
+    left: int,
+    height: int,
+    width: int,
+) -> None:
+    """Copy a crop rectangle of a row-major (height, width) array of pixels as bytes.
+
+    Args:
+        src: File descriptor to copy from.
+        dst: File descriptor to copy to.
+        src_offset: Position of the array in `src`.
+        dst_offset: Position in `dst` to copy the rectangle to.
+        shape: Shape (height, width) of the array in `src`.
+        pixel_bytes: Size of one pixel, e.g. a full spectrum.
+        top: First row of the rectangle.
+        left: First column of the rectangle.
+        height: Amount of rows of the rectangle.
+        width: Amount of columns of the rectangle.
+    """
+    row_bytes = shape[1] * pixel_bytes
+    crop_row_bytes = width * pixel_bytes
+    if width == shape[1]:  # Full rows are contiguous, so copy as one range.
+        copy_byte_range(
+            src, dst, height * row_bytes,
+            src_offset + top * row_bytes, dst_offset,
+        )
+        return None
+
+    for i in range(height):
+        copy_byte_range(
+            src, dst, crop_row_bytes,
+            src_offset + (top + i) * row_bytes + left * pixel_bytes,
+            dst_offset + i * crop_row_bytes,
+        )
+    return None
+
+
+def copy_byte_range(
+    src: int,
+    dst: int,
+    count: int,
+    src_offset: int,
+    dst_offset: int,
+) -> None:
+    """Copy a range of bytes between file descriptors at explicit offsets.
+
+    Uses `os.copy_file_range` to copy within the kernel (Linux), else `os.pread` and
+    `os.pwrite` (Unix), else seeking, reading and writing (Windows).
+    """
+    while count > 0:
+        copied = 0
+        if hasattr(os, "copy_file_range"):
+            try:
+                copied = os.copy_file_range(src, dst, count, src_offset, dst_offset)
+            except OSError:  # E.g. not supported by the file system; fall back.
+                copied = 0
+        if not copied:
+            if hasattr(os, "pread"):
+                data = os.pread(src, count, src_offset)
+                if data:
+                    copied = os.pwrite(dst, data, dst_offset)
+            else:
+                os.lseek(src, src_offset, os.SEEK_SET)
+                data = os.read(src, count)
+                if data:
+                    os.lseek(dst, dst_offset, os.SEEK_SET)
+                    copied = os.write(dst, data)
+        if not copied:
+            raise EOFError(f"Unexpected end of file while copying at {src_offset}.")
+        count -= copied
+        src_offset += copied
+        dst_offset += copied
+    return None
+
+
+def transform_raw_rpl_in_place(
+    raw_filepath: Path,
+    rpl_filepath: Path,
+    transform: Transform = Transform.rotation(2),
+    chunk_bytes: int = CHUNK_BYTES,
+) -> Path:
+    """Transform a RAW in place, without a copy, by 180° or a flip.
+
+    The RPL is unchanged since the shape is. See `transform_in_place` for the journal,
+    and `resume_in_place` and `rollback_in_place` to recover from an interruption.
+    """
+    dtype, shape = parse_rpl_keys(read_rpl(rpl_filepath))
+    transform_in_place(raw_filepath, dtype, 0, (1, *shape), transform, chunk_bytes)
+    return raw_filepath
+
+
+def transform_dms_in_place(
+    dms_filepath: Path,
+    transform: Transform = Transform.rotation(2),
+    chunk_bytes: int = CHUNK_BYTES,
+) -> Path:
+    """Transform the images of a DMS in place, without a copy, by 180° or a flip.
+
+    The header and names are unchanged since the shape is. See `transform_in_place` for
+    the journal, and `resume_in_place` and `rollback_in_place` to recover from an
+    interruption.
+    """
+    header_lines = read_dms_header(dms_filepath)
+    header_size = sum([len(line) for line in header_lines])
+    dimensions = parse_dms_header_dimensions(header_lines[1])
+    transform_in_place(
+        dms_filepath, 'float32', header_size, (*dimensions, 1), transform, chunk_bytes
+    )
+    return dms_filepath
+
+
+def transform_in_place(
+    filepath: Path,
+    dtype: str,
+    offset: int,
+    shape: tuple[int, int, int, int],
+    transform: Transform,
+    chunk_bytes: int = CHUNK_BYTES,
+) -> None:
+    """Transform planes of an array in a file in place by a self-inverse transform.
+
+    Only transforms which keep the shape can be done in place: 180°, flips and the
+    identity. Each is its own inverse, so it swaps pairs of mirrored chunks of rows.
+
+    Before each step, the original bytes of its chunks are saved atomically to a journal
+    next to the file (`<filepath>.journal`), which is removed when done. If the journal
+    exists, a previous run was interrupted: recover with `resume_in_place` or
+    `rollback_in_place` before anything else.
+
+    Args:
+        filepath: File containing the array.
+        dtype: Data type of the array.
+        offset: Position of the array in the file, e.g. past a header.
+        shape: Shape (planes, height, width, pixel) of the array, where the spatial
+            axes 1 and 2 are transformed separately for each plane. E.g. (1, height,
+            width, depth) for a RAW, and (images, height, width, 1) for a DMS.
+        transform: Transform to apply.
+        chunk_bytes: Target size of one chunk of rows.
+    """
+    if transform.swaps_axes:
+        raise ValueError(
+            f"Transform '{transform.name}' changes the shape, so it cannot be done in "
+            "place. Only 180° and flips can."
+        )
+
+    journal_filepath = in_place_journal_filepath(filepath)
+    if journal_filepath.exists():
+        raise FileExistsError(
+            "A previous transform in place was interrupted. Resume or roll it back "
+            f"first. Journal:\n\n{journal_filepath}"
+        )
+
+    if transform == Transform():
+        return None
+
+    row_bytes = math.prod(shape[2:]) * np.dtype(dtype).itemsize
+    state = {
+        "transform": transform.name,
+        "dtype": dtype,
+        "offset": offset,
+        "shape": list(shape),
+        "rows": max(1, chunk_bytes // row_bytes),
+        "step": 0,
+    }
+    run_in_place(filepath, state)
+    return None
+
+
+def resume_in_place(filepath: Path) -> None:
+    """Resume an interrupted transform in place of a file from its journal."""
+    state, array = restore_in_place(filepath)
+    del array
+    run_in_place(filepath, state)
+    return None
+
+
+def rollback_in_place(filepath: Path) -> None:
+    """Roll back an interrupted transform in place of a file from its journal.
+
+    The steps done so far are undone by applying them again, since the transform is
+    its own inverse.
+    """
+    state, array = restore_in_place(filepath)
+    transform = Transform.from_name(state["transform"])
+    steps = in_place_steps(state["shape"], state["rows"], transform)
+    for step in steps[:state["step"]]:
+        apply_in_place_step(array, step, transform)
+    array.flush()
+    del array
+    in_place_journal_filepath(filepath).unlink()
+    return None
+
+
+def in_place_journal_filepath(filepath: Path) -> Path:
+    """Get the path of the journal of a transform in place of a file."""
+    return filepath.with_name(filepath.name + JOURNAL_SUFFIX)
+
+
+def restore_in_place(filepath: Path) -> tuple[dict, np.memmap]:
+    """Restore the chunks of the interrupted step of a transform in place.
+
+    Returns:
+        Tuple containing the state of the journal and the array as a memory map.
+    """
+    journal_filepath = in_place_journal_filepath(filepath)
+    with open(journal_filepath, 'rb') as file:
+        state = json.loads(file.readline())
+        undo = file.read()
+
+    array = np.memmap(
+        filepath,
+        dtype=state["dtype"],
+        mode='r+',
+        offset=state["offset"],
+        shape=tuple(state["shape"]),
+    )
+    transform = Transform.from_name(state["transform"])
+    steps = in_place_steps(state["shape"], state["rows"], transform)
+    if state["step"] < len(steps):
+        start = 0
+        for region in in_place_step_regions(array, steps[state["step"]]):
+            stop = start + region.nbytes
+            region[:] = np.frombuffer(
+                undo[start:stop], dtype=array.dtype
+            ).reshape(region.shape)
+            start = stop
+        array.flush()
+    return state, array
+
+
+def run_in_place(filepath: Path, state: dict) -> None:
+    """Run the steps of a transform in place from `state["step"]`, with a journal."""
+    journal_filepath = in_place_journal_filepath(filepath)
+    array = np.memmap(
+        filepath,
+        dtype=state["dtype"],
+        mode='r+',
+        offset=state["offset"],
+        shape=tuple(state["shape"]),
+    )
+    transform = Transform.from_name(state["transform"])
+    steps = in_place_steps(state["shape"], state["rows"], transform)
+    for i in range(state["step"], len(steps)):
+        check_cancelled()  # Leaves the journal, as if interrupted
+        # Save the original chunks of this step, and only then overwrite them.
+        state["step"] = i
+        temporary_filepath = journal_filepath.with_name(journal_filepath.name + ".tmp")
+        with open(temporary_filepath, 'wb') as file:
+            file.write(json.dumps(state).encode('ascii') + b"\n")
+            for region in in_place_step_regions(array, steps[i]):
+                file.write(np.ascontiguousarray(region).data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_filepath, journal_filepath)
+
+        apply_in_place_step(array, steps[i], transform)
+        array.flush()
+
+    del array
+    journal_filepath.unlink(missing_ok=True)
+    return None
+
+
+def in_place_steps(
+    shape: list[int],
+    rows: int,
+    transform: Transform,
+) -> list[tuple[int, int, int, bool]]:
+    """List the steps of a transform in place in order.
+
+    Returns:
+        List of (plane, start row, stop row, paired). If paired, the step swaps the
+        chunk of rows with its mirrored chunk at the bottom; else, it transforms the
+        chunk by itself.
+    """
+    planes, height = shape[0], shape[1]
+    vertical = transform.turns == 2
+    steps: list[tuple[int, int, int, bool]] = []
+    for plane in range(planes):
+        if not vertical:
+            for start in range(0, height, rows):
+                steps.append((plane, start, min(start + rows, height), False))
+            continue
+        start = 0
+        while (stop := start + rows) <= height - stop:
+            steps.append((plane, start, stop, True))
+            start = stop
+        if start < height - start:  # Chunks would overlap: do the middle by itself.
+            steps.append((plane, start, height - start, False))
+    return steps
+
+
+def in_place_step_regions(
+    array: np.ndarray,
+    step: tuple[int, int, int, bool],
+) -> list[np.ndarray]:
+    """Get the chunk of rows of a step and, if paired, its mirrored chunk."""
+    plane, start, stop, paired = step
+    regions = [array[plane, start:stop]]
+    if paired:
+        height = array.shape[1]
+        regions.append(array[plane, height - stop:height - start])
+    return regions
+
+
+def apply_in_place_step(
+    array: np.ndarray,
+    step: tuple[int, int, int, bool],
+    transform: Transform,
+) -> None:
+    """Apply one step of a transform in place."""
+    regions = in_place_step_regions(array, step)
+    if len(regions) == 2:
+        top, bottom = regions
+        top_tr = transform.apply(top).copy()
+        top[:] = transform.apply(bottom)
+        bottom[:] = top_tr
+    else:
+        (region,) = regions
+        region[:] = transform.apply(region).copy()
+    return None
+
+
+def tile_edge(
+    shape: tuple[int, ...],
+    itemsize: int,
+    tile_bytes: int = TILE_BYTES,
+) -> int:
+    """Get the edge in pixels of a square spatial tile which fits in `tile_bytes`.
+
+    A pixel spans all axes after the first two, e.g. the full spectrum of a RAW.
+    """
+    pixel_bytes = itemsize * math.prod(shape[2:])
+    return max(1, math.isqrt(tile_bytes // pixel_bytes))
+
+
+def copy_tiled(
+    source: np.ndarray,
+    out: np.ndarray,
+    edge: int | None = None,
+    workers: int = 1,
+    reduce: Callable[[slice, np.ndarray], R] | None = None,
+    combine: Callable[[R], None] | None = None,
+) -> None:
+    """Copy an array, or a view thereof (e.g. `np.rot90`), to `out` by spatial tiles.
+
+    Tiles are square over the first two axes and span all others, so each tile reads
+    and writes runs of full spectra instead of single values. Tiles are visited band by
+    band of `out` rows so that writes stay sequential. Does not flush `out`.
+
+    NumPy releases the GIL while copying, so bands (which are disjoint in `out`) can be
+    filled in parallel by a pool of threads.
+
+    Each band can also be reduced while it is in memory, e.g. by
+    `PreviewStatistics.reduce`, and the results combined in band order.
+
+    Args:
+        source: Array to copy from, of the same shape as `out`.
+        out: Array to copy to, typically a writable memory map.
+        edge: Edge of a tile in pixels. Defaults to what fits in `TILE_BYTES`.
+        workers: Amount of threads filling bands in parallel; 1 is serial.
+        reduce: Function of the rows and the copied band of `out`, called in the
+            thread which copied it.
+        combine: Function of each result of `reduce`, called in band order.
+    """
+    if source.shape != out.shape:
+        raise ValueError(f"Shapes differ: {source.shape} and {out.shape}.")
+
+    if edge is None:
+        edge = tile_edge(out.shape, out.itemsize)
+
+    height = out.shape[0]
+    bands = [slice(i, min(i + edge, height)) for i in range(0, height, edge)]
+
+    def copy_band(rows: slice) -> R | None:
+        width = out.shape[1]
+        for j in range(0, width, edge):
+            cols = slice(j, min(j + edge, width))
+            out[rows, cols] = source[rows, cols]
+        return None if reduce is None else reduce(rows, out[rows])
+
+    for result in map_ordered(copy_band, bands, workers):
+        if combine is not None:
+            combine(result)  # type: ignore
+
+    return None
 
 
 def parse_rpl_keys(keys: dict) -> tuple[str, tuple[int, int, int]]:
@@ -319,23 +2552,694 @@ def read_dms_images(
     return images
 
 
+class DmsFile:
+    """Handle of a DMS whose header and names are parsed once.
+
+    The images are memory mapped on first access only. The size and modification time
+    of the file at parsing are kept, so a handle can tell whether the file has changed
+    since (see `is_current` and `open_dms_file`).
+
+    Args:
+        filepath: Path of the DMS.
+    """
+    def __init__(self, filepath: Path) -> None:
+        stat = os.stat(filepath)
+        self.filepath = filepath
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self.header_lines = read_dms_header(filepath)
+        self.header_size = sum(len(line) for line in self.header_lines)
+        self.dimensions = parse_dms_header_dimensions(self.header_lines[1])
+        self.names_lines, self.names = read_dms_elemental_names(
+            filepath, self.header_size, self.dimensions
+        )
+        self.index: dict[str, int] = {}
+        for i, name in enumerate(self.names):
+            self.index.setdefault(name, i)
+        self._images: np.ndarray | None = None
+
+    @property
+    def images(self) -> np.typing.NDArray[np.float32]:
+        """Images as a read-only memory map of shape (images, height, width)."""
+        if self._images is None:
+            self._images = read_dms_images(
+                self.filepath, self.header_size, self.dimensions
+            )
+        return self._images
+
+    def image(self, name: str) -> np.typing.NDArray[np.float32]:
+        """Get the (first) image of a name."""
+        return self.images[self.index[name]]
+
+    def select(self, patterns: Iterable[str]) -> list[int]:
+        """Get the indices of the images of names matching any of some patterns.
+
+        A pattern matches a name case-insensitively if it is the name, its element (its
+        first word, e.g. 'Pb' of 'Pb L'), or a shell-style wildcard pattern of either
+        (see `fnmatch`), e.g. 'Fe*'.
+
+        Raises:
+            ValueError: If a pattern matches no name.
+        """
+        originals = [pattern.strip() for pattern in patterns]
+        patterns = [pattern.lower() for pattern in originals]
+        matched: set[str] = set()
+        indices: list[int] = []
+        for i, name in enumerate(self.names):
+            candidates = [name.lower(), *name.lower().split()[:1]]
+            hits = {
+                pattern for pattern in patterns
+                if any(
+                    pattern == candidate or fnmatch.fnmatchcase(candidate, pattern)
+                    for candidate in candidates
+                )
+            }
+            if hits:
+                indices.append(i)
+                matched |= hits
+        if unmatched := [
+            original for original, pattern in zip(originals, patterns)
+            if pattern not in matched
+        ]:
+            raise ValueError(f"No image names match: {', '.join(unmatched)}.")
+        return indices
+
+    def is_current(self) -> bool:
+        """Whether the file has the same size and modification time as when parsed."""
+        try:
+            stat = os.stat(self.filepath)
+        except OSError:
+            return False
+        return (stat.st_size, stat.st_mtime_ns) == (self.size, self.mtime_ns)
+
+    def close(self) -> None:
+        """Drop the memory map of the images, if any, e.g. before replacing the file."""
+        self._images = None
+
+
+_dms_files: dict[Path, DmsFile] = {}
+
+
+def open_dms_file(filepath: Path) -> DmsFile:
+    """Get the handle of a DMS, parsing it only if new or changed since last opened."""
+    key = Path(filepath).resolve()
+    dms = _dms_files.get(key)
+    if dms is None or not dms.is_current():
+        if dms is not None:
+            dms.close()
+        dms = _dms_files[key] = DmsFile(filepath)
+    return dms
+
+
+def close_dms_file(filepath: Path) -> None:
+    """Forget the handle of a DMS, if any, dropping its memory map."""
+    if dms := _dms_files.pop(Path(filepath).resolve(), None):
+        dms.close()
+
+
+def transform_dms(
+    dms_filepath: Path,
+    output_dir: Path | None = None,
+    transform: Transform = Transform.rotation(1),
+    mode: WriteMode = 'x',
+    workers: int = 1,
+) -> Path:
+    """Transform and save a DMS image by image and tile by tile, appending `_<name>`.
+
+    Each image is transformed as a view (see `transformed_dms_images`) and streamed
+    by `write_dms`, so memory is bounded by about one image of the DMS and one band of
+    the output, however many images. With `workers` > 1, the tiles of a band are
+    filled in parallel by threads. The output is identical regardless of `workers`.
+    """
+    return transform_dms_with_images(
+        dms_filepath, [], output_dir, transform, mode, workers
+    )
+
+
+def transform_dms_with_images(
+    dms_filepath: Path,
+    paths: list[Path],
+    output_dir: Path | None = None,
+    transform: Transform = Transform.rotation(1),
+    mode: WriteMode = 'x',
+    workers: int = 1,
+    bitdepth: Literal[8, 16] = 16,
+    stretch: tuple[float, float] | None = None,
+    compression: int | None = None,
+    backend: PngBackend = 'pypng',
+    indices: Iterable[int] | None = None,
+    groups: Sequence[Hashable] | None = None,
+) -> Path:
+    """Transform and save a DMS as `transform_dms`, and save its images as PNGs.
+
+    Each transformed image is saved to its path right after it is written to the
+    copy, while it is still in memory, so the copy is not read at all. With `workers`
+    > 1, the image is instead submitted to a pool of as many processes, each opening
+    the DMS itself (see `save_dms_image_at`), so the PNGs are encoded while the copy
+    continues and no image is sent between processes; all are saved before returning.
+    A shared scale (`groups`) takes one more pass over the DMS first, for
+    the ranges of the images (see `image_ranges`). See `save_dms_images` for the other
+    arguments.
+
+    Returns:
+        Path of the copy.
+    """
+    if output_dir is not None and not output_dir.exists():
+        raise FileNotFoundError(f"Folder does not exist at {output_dir}.")
+
+    if output_dir is None:
+        output_dir = dms_filepath.parent
+
+    tr_dms_filepath: Path = (
+        output_dir / (dms_filepath.stem + f"_{transform.name}" + dms_filepath.suffix)
+    )
+    if tr_dms_filepath.exists() and mode != 'w':
+        raise FileExistsError(f'DMS file already exists: {tr_dms_filepath}.')
+
+    dms = open_dms_file(dms_filepath)
+    indices = range(len(paths)) if indices is None else list(indices)
+    if len(indices) != len(paths):
+        raise ValueError(f"{len(paths)} paths for {len(indices)} images.")
+    limits: list[tuple[float, float] | None] = [None] * len(paths)
+    if groups is not None:
+        limits = list(shared_limits(image_ranges(dms.images, indices), groups))
+        stretch = None
+    selected = dict(zip(indices, zip(paths, limits)))
+    executor = (
+        ProcessPoolExecutor(max_workers=workers) if workers > 1 and selected else None
+    )
+    futures: list[Future] = []
+
+    def images_saving() -> Iterator[np.ndarray]:
+        for i, image in enumerate(transformed_dms_images(dms, transform)):
+            yield image
+            if i not in selected:
+                continue
+            path, image_limits = selected[i]
+            if executor is None:
+                save_dms_image(
+                    image, path, bitdepth, stretch, image_limits, compression, backend
+                )
+            else:
+                futures.append(executor.submit(
+                    save_dms_image_at, dms.filepath, dms.header_size, dms.dimensions,
+                    i, path, bitdepth, stretch, compression, backend, image_limits,
+                    transform,
+                ))
+
+    with removed_if_cancelled(*paths):
+        try:
+            write_dms(
+                tr_dms_filepath,
+                transform_dms_header(dms.header_lines, transform),
+                images_saving(),
+                dms.names_lines,
+                mode,
+                workers,
+            )
+            for future in futures:
+                future.result()  # Raise any error of a process
+                check_cancelled()
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+    return tr_dms_filepath
+
+
+def dms_image_filepaths(dms_filepath: Path, names: list[str]) -> list[Path]:
+    """Get the paths of the PNGs of images of a DMS: `<DMS name>_<image name>.png`."""
+    return [
+        dms_filepath.parent / f"{dms_filepath.stem}_{''.join(name.split())}.png"
+        for name in names
+    ]
+
+
+def transform_dms_header(
+    header_lines: tuple[bytes, bytes],
+    transform: Transform,
+) -> tuple[bytes, bytes]:
+    """Transform the header of a DMS, switching width and height if need be."""
+    width, height, rest = split_dms_header_dimensions(header_lines[1])
+    if transform.swaps_axes:  # Switch height and width if 90, 270, transpose, ...
+        width, height = height, width
+    return header_lines[0], b"".join((width, height, rest))
+
+
+def transformed_dms_images(
+    dms: DmsFile,
+    transform: Transform = Transform(),
+) -> Iterator[np.ndarray]:
+    """Yield each image of a DMS transformed as a view of a read-only memory map.
+
+    Once the next image is requested, the pages of the previous one are released from
+    the resident memory (see `release_pages`), so that streaming all images (e.g. by
+    `write_dms`) keeps about one image resident instead of the whole DMS.
+    """
+    with open(dms.filepath, 'rb') as file:
+        # The map outlives the file and is closed once no image refers to it
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    _, height, width = dms.dimensions
+    image_bytes = height * width * np.dtype(np.float32).itemsize
+    for i in range(dms.dimensions[0]):
+        start = dms.header_size + i * image_bytes
+        image = np.frombuffer(mapped, np.float32, height * width, start)
+        yield transform.apply(image.reshape(height, width))
+        release_pages(mapped, start, image_bytes)
+
+
+def release_pages(mapped: mmap.mmap, start: int, length: int) -> None:
+    """Release the pages of a range of a read-only memory map from resident memory.
+
+    The pages stay in the page cache and are read again if accessed. Does nothing
+    where not supported (e.g. on Windows).
+    """
+    if not hasattr(mmap, "MADV_DONTNEED"):
+        return
+    first = start - start % mmap.PAGESIZE
+    stop = min(start + length, len(mapped))
+    mapped.madvise(mmap.MADV_DONTNEED, first, stop - first)
+
+
+def write_dms(
+    filepath: Path,
+    header_lines: tuple[bytes, bytes],
+    images: Iterable[np.ndarray],
+    names_lines: Iterable[bytes],
+    mode: WriteMode = 'x',
+    workers: int = 1,
+) -> None:
+    """Write a DMS from its header, images and names in one pass over an open file.
+
+    The images are streamed: each is copied by square tile (see `copy_tiled`) into a
+    buffer of one band of rows, which is appended to the file, so memory is bounded by
+    one band however many and however large the images. Any iterable of arrays works,
+    e.g. a memory map, transformed views of its images (`Transform.apply`), a generator
+    of crops or conversions, or blocks of rows of images, as long as their rows add up
+    to the images of the header in order.
+
+    Args:
+        filepath: Path of the DMS.
+        header_lines: Title and dimensions lines of the header (`read_dms_header`).
+        images: Arrays of shape (height, width), or (images, height, width), or blocks
+            of rows of shape (rows, width) thereof, of any float dtype.
+        names_lines: Lines of the names of the images (`read_dms_elemental_names`).
+        mode: Mode to write the file; see `WriteMode`.
+        workers: Amount of threads filling the tiles of a band in parallel, from one
+            pool for the whole write.
+    """
+    dimensions = parse_dms_header_dimensions(header_lines[1])
+    total_rows = dimensions[0] * dimensions[1]
+    width = dimensions[2]
+    edge = tile_edge(dimensions[1:], np.dtype(np.float32).itemsize)
+    band = np.empty((edge, width), dtype='<f4')
+    columns = [slice(j, min(j + edge, width)) for j in range(0, width, edge)]
+
+    def blocks() -> Iterator[np.ndarray]:
+        for image in images:
+            # Never reshape a stack, which would copy a view of it whole
+            yield from (image if image.ndim == 3 else [image])
+
+    close_dms_file(filepath)
+    rows_written = 0
+    # One pool for the whole write, rather than one per band
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    fill = map if executor is None else executor.map
+    try:
+        with removed_if_cancelled(filepath), open(filepath, f'{mode}b') as file:
+            file.writelines(header_lines)
+            for rows in blocks():
+                if rows.ndim != 2 or rows.shape[1] != width:
+                    raise ValueError(
+                        f"Image of shape {rows.shape} is not {width} wide."
+                    )
+                if rows_written + rows.shape[0] > total_rows:
+                    raise ValueError(f"More images than the header's {dimensions}.")
+                for start in range(0, rows.shape[0], edge):
+                    stop = min(start + edge, rows.shape[0])
+                    out = band[:stop - start]
+
+                    def copy_tile(cols: slice) -> None:
+                        out[:, cols] = rows[start:stop, cols]
+
+                    for _ in fill(copy_tile, columns):
+                        check_cancelled()
+                    file.write(out.data)
+                rows_written += rows.shape[0]
+            if rows_written != total_rows:
+                raise ValueError(
+                    f"{rows_written} rows of images written instead of {total_rows}."
+                )
+            file.writelines(names_lines)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    return None
+
+
 def save_dms_image(
     image: np.typing.NDArray[np.float32],
     path: Path,
     bitdepth: Literal[8, 16] = 16,
+    stretch: tuple[float, float] | None = None,
+    limits: tuple[float, float] | None = None,
+    compression: int | None = None,
+    backend: PngBackend = 'pypng',
 ) -> None:
-    """Save a single DMS image."""
+    """Save a single DMS image.
+
+    With `stretch` percentiles (e.g. `STRETCH_PERCENTILES`), the image is normalized
+    from its low to its high percentile instead of from its minimum to its maximum,
+    clipping values beyond them. See `stretch_limits`, fed a histogram built by block of
+    rows (see `image_histogram`). Known `limits` to normalize from and to can be given
+    instead. See `write_png` for `compression` and `backend`.
+
+    The image is normalized and encoded by block of rows (see `ROW_BLOCK_BYTES`), so
+    no normalized copy of the whole image is made.
+    """
+    if stretch is not None:
+        limits = stretch_limits(image, stretch, image_histogram(image))
+    height, width = image.shape
+    write_png_blocks(
+        normalized_rows(image, bitdepth, limits),
+        path,
+        width,
+        height,
+        bitdepth,
+        compression,
+        backend,
+    )
+    return
+
+
+def normalized_rows(
+    image: np.ndarray,
+    bitdepth: Literal[8, 16] = 16,
+    limits: tuple[float, float] | None = None,
+    block_bytes: int = ROW_BLOCK_BYTES,
+) -> Iterator[np.ndarray]:
+    """Normalize an image to a bit-depth, by block of rows.
+
+    Without `limits`, the image is normalized from its finite minimum to its finite
+    maximum (see `image_ranges`), else from the low to the high limit, clipping values
+    beyond them. NaN values become 0, -inf 0 and inf the highest level. An image
+    without a range (constant, or without finite values) becomes 0.
+
+    Yields:
+        Blocks of rows of shape (rows, width) and dtype uint8 or uint16.
+    """
     levels = 2 ** (bitdepth - 1)
     dtype: np.dtype = np.dtype(f"uint{bitdepth}")
+    if limits is None:
+        minimum, maximum = image_ranges(image[np.newaxis])[0]
+        if image.dtype.kind == 'f':
+            # Same arithmetic as with the image's own min() and max()
+            minimum, maximum = image.dtype.type(minimum), image.dtype.type(maximum)
+    else:
+        minimum, maximum = limits
+    for rows in row_blocks(image.shape, 8, block_bytes):
+        block = image[rows]
+        if not maximum > minimum:
+            yield np.zeros(block.shape, dtype=dtype)
+            continue
+        if limits is None:
+            block = levels * (block - minimum) / (maximum - minimum)
+        else:
+            block = levels * np.clip((block - minimum) / (maximum - minimum), 0, 1)
+        if block.dtype.kind == 'f':
+            block = np.nan_to_num(np.clip(block, 0, levels), nan=0)
+        yield block.astype(dtype)
+
+
+def image_ranges(
+    images: np.ndarray,
+    indices: Iterable[int] | None = None,
+    chunk_bytes: int = CHUNK_BYTES,
+) -> np.typing.NDArray[np.float64]:
+    """Get the finite minimum and maximum of each image of a stack in one pass.
+
+    The stack is read band by band of rows of all (or the `indices` of) its images at
+    once, and both extremes of every image are reduced from each band while it is in
+    memory, instead of a pass over each image for each extreme. NaN and inf values are
+    ignored.
 
-    # Normalize to bit-depth
-    minimum = image.min()
-    maximum = image.max()
-    image = levels * (image - minimum) / (maximum - minimum)
-    image = image.astype(dtype)
+    Args:
+        images: Images of shape (images, height, width), e.g. a memory map of a DMS.
+        indices: Indices of the images to get the ranges of, else all.
+        chunk_bytes: Target size in bytes of a band of rows of all images.
 
-    png.from_array(image, mode=f'L;{bitdepth}').save(path)
-    return
+    Returns:
+        Array of shape (images, 2) of the minimum and maximum of each image, NaN for
+        an image without finite values.
+    """
+    indices = list(range(len(images))) if indices is None else list(indices)
+    ranges = np.empty((len(indices), 2), dtype=np.float64)
+    ranges[:, 0] = np.inf
+    ranges[:, 1] = -np.inf
+    if not indices:
+        return ranges
+    height, width = images.shape[1:]
+    rows = max(1, chunk_bytes // max(1, len(indices) * width * images.itemsize))
+    for start in range(0, height, rows):
+        check_cancelled()
+        band = images[indices, start:start + rows]
+        if band.dtype.kind == 'f':
+            finite = np.isfinite(band)
+            low = band.min(axis=(1, 2), where=finite, initial=np.inf)
+            high = band.max(axis=(1, 2), where=finite, initial=-np.inf)
+        else:
+            low, high = band.min(axis=(1, 2)), band.max(axis=(1, 2))
+        np.minimum(ranges[:, 0], low, out=ranges[:, 0])
+        np.maximum(ranges[:, 1], high, out=ranges[:, 1])
+    ranges[~(ranges[:, 0] <= ranges[:, 1])] = np.nan
+    return ranges
+
+
+def shared_limits(
+    ranges: np.ndarray,
+    groups: Sequence[Hashable] | None = None,
+) -> list[tuple[float, float]]:
+    """Share the ranges of images (see `image_ranges`) among all images or per group.
+
+    Args:
+        ranges: Minimum and maximum of each image, of shape (images, 2).
+        groups: Group of each image, e.g. its element or its line, else all one group.
+
+    Returns:
+        Limits of each image: the lowest minimum and highest maximum of its group.
+    """
+    groups = [None] * len(ranges) if groups is None else list(groups)
+    group_limits: dict[Hashable, tuple[float, float]] = {}
+    for group in dict.fromkeys(groups):
+        members = ranges[[i for i, g in enumerate(groups) if g == group]]
+        group_limits[group] = (
+            float(np.fmin.reduce(members[:, 0])),
+            float(np.fmax.reduce(members[:, 1])),
+        )
+    return [group_limits[group] for group in groups]
+
+
+def save_dms_images(
+    dms_filepath: Path,
+    header_size: int,
+    dimensions: tuple[int, int, int],
+    paths: list[Path],
+    bitdepth: Literal[8, 16] = 16,
+    stretch: tuple[float, float] | None = None,
+    compression: int | None = None,
+    backend: PngBackend = 'pypng',
+    workers: int = 1,
+    indices: Iterable[int] | None = None,
+    groups: Sequence[Hashable] | None = None,
+) -> None:
+    """Save each image of a DMS to its path, encoding them on a pool of processes.
+
+    With `workers` > 1, each process opens the DMS itself (see `save_dms_image_at`), so
+    no image is sent between processes. With `indices` (e.g. of `DmsFile.select`), only
+    the images at those indices are read and saved, to `paths` in the same order.
+
+    By default each image is normalized on its own. With `groups` (one per image, e.g.
+    all the same), the images of a group share one scale from the lowest minimum to
+    the highest maximum among them, from one pass over the stack (see `image_ranges`
+    and `shared_limits`), so they can be compared quantitatively. A shared scale takes
+    precedence over `stretch`. See `save_dms_image` for the other arguments.
+    """
+    indices = range(len(paths)) if indices is None else list(indices)
+    if len(indices) != len(paths):
+        raise ValueError(f"{len(paths)} paths for {len(indices)} images.")
+    limits: list[tuple[float, float] | None] = [None] * len(paths)
+    if groups is not None:
+        images = read_dms_images(dms_filepath, header_size, dimensions)
+        limits = list(shared_limits(image_ranges(images, indices), groups))
+        stretch = None
+        del images
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    save_dms_image_at, dms_filepath, header_size, dimensions, i,
+                    path, bitdepth, stretch, compression, backend, image_limits,
+                )
+                for i, path, image_limits in zip(indices, paths, limits)
+            ]
+            try:
+                for future in futures:
+                    future.result()  # Raise any error of a process
+                    check_cancelled()
+            finally:
+                executor.shutdown(cancel_futures=True)
+        return
+    for i, path, image_limits in zip(indices, paths, limits):
+        check_cancelled()
+        save_dms_image_at(
+            dms_filepath, header_size, dimensions, i,
+            path, bitdepth, stretch, compression, backend, image_limits,
+        )
+
+
+def save_dms_image_at(
+    dms_filepath: Path,
+    header_size: int,
+    dimensions: tuple[int, int, int],
+    index: int,
+    path: Path,
+    bitdepth: Literal[8, 16] = 16,
+    stretch: tuple[float, float] | None = None,
+    compression: int | None = None,
+    backend: PngBackend = 'pypng',
+    limits: tuple[float, float] | None = None,
+    transform: Transform = Transform(),
+) -> None:
+    """Save the image at an index of a DMS, opening it, e.g. in another process.
+
+    The image is saved transformed by `transform`, as a view of the memory map.
+    """
+    images = read_dms_images(dms_filepath, header_size, dimensions)
+    save_dms_image(
+        transform.apply(images[index]), path, bitdepth, stretch, limits,
+        compression=compression, backend=backend,
+    )
+
+
+def write_png(
+    image: np.ndarray,
+    path: Path,
+    compression: int | None = None,
+    backend: PngBackend = 'pypng',
+) -> None:
+    """Write a grayscale 8- or 16-bit image as a PNG.
+
+    Args:
+        image: Image of shape (height, width) and dtype uint8 or uint16.
+        path: Path of the PNG.
+        compression: zlib compression level from 0 (none, fastest) to 9 (smallest),
+            else zlib's default.
+        backend: 'pypng', or 'zlib' for `encode_png`, which is faster and writes a
+            PNG of the same pixels.
+    """
+    height, width = image.shape
+    bitdepth = 8 * image.dtype.itemsize
+    blocks = (image[rows] for rows in row_blocks(image.shape, image.dtype.itemsize))
+    write_png_blocks(
+        blocks, path, width, height, bitdepth, compression, backend  # type: ignore
+    )
+
+
+def write_png_blocks(
+    blocks: Iterable[np.ndarray],
+    path: Path,
+    width: int,
+    height: int,
+    bitdepth: Literal[8, 16] = 8,
+    compression: int | None = None,
+    backend: PngBackend = 'pypng',
+) -> None:
+    """Write a grayscale 8- or 16-bit image as a PNG from blocks of its rows.
+
+    Each block is encoded as it is produced, so only one block need be in memory.
+
+    Args:
+        blocks: Blocks of rows of shape (rows, width) and dtype uint8 or uint16, of
+            `height` rows in total.
+        path: Path of the PNG.
+        width: Width of the image.
+        height: Height of the image.
+        bitdepth: Bit-depth of the image, 8 or 16.
+        compression: zlib compression level from 0 (none, fastest) to 9 (smallest),
+            else zlib's default.
+        backend: 'pypng', or 'zlib' for `encode_png_blocks`, which is faster and
+            writes a PNG of the same pixels.
+    """
+    match backend:
+        case 'pypng':
+            writer = png.Writer(
+                width, height, greyscale=True, bitdepth=bitdepth,
+                compression=compression,
+            )
+            with open(path, 'wb') as file:
+                writer.write(
+                    file,
+                    (row for block in blocks for row in np.ascontiguousarray(block)),
+                )
+        case 'zlib':
+            with open(path, 'wb') as file:
+                for data in encode_png_blocks(
+                    blocks, width, height, bitdepth, compression
+                ):
+                    file.write(data)
+        case _:
+            raise ValueError(f"Unknown PNG backend: {backend}.")
+
+
+def encode_png(image: np.ndarray, compression: int | None = None) -> bytes:
+    """Encode a grayscale 8- or 16-bit image as PNG with numpy and zlib only."""
+    height, width = image.shape
+    bitdepth = 8 * image.dtype.itemsize
+    return b"".join(
+        encode_png_blocks([image], width, height, bitdepth, compression)  # type: ignore
+    )
+
+
+def encode_png_blocks(
+    blocks: Iterable[np.ndarray],
+    width: int,
+    height: int,
+    bitdepth: Literal[8, 16] = 8,
+    compression: int | None = None,
+) -> Iterator[bytes]:
+    """Encode a grayscale 8- or 16-bit image as PNG with numpy and zlib only.
+
+    The rows are filtered with filter type 0 (none), as `pypng` does, but laid out
+    and compressed by block instead of row by row in Python. Each block is streamed
+    through one zlib compressor and the compressed data written as IDAT chunks.
+
+    Yields:
+        Consecutive bytes of the PNG.
+    """
+    if bitdepth not in (8, 16):
+        raise ValueError(f"PNG of bit-depth {bitdepth} not supported.")
+    itemsize = bitdepth // 8
+    level = -1 if compression is None else compression
+    compressor = zlib.compressobj(level)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data)) + kind + data
+            + struct.pack(">I", zlib.crc32(kind + data))
+        )
+
+    header = struct.pack(">IIBBBBB", width, height, bitdepth, 0, 0, 0, 0)
+    yield b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+    for block in blocks:
+        rows = np.zeros((len(block), 1 + width * itemsize), dtype=np.uint8)
+        # PNG samples are big-endian; the first byte of each row is its filter type
+        rows[:, 1:] = block.astype(f">u{itemsize}").view(np.uint8).reshape(
+            len(block), -1
+        )
+        data = compressor.compress(rows.tobytes())
+        if data:
+            yield chunk(b"IDAT", data)
+    yield chunk(b"IDAT", compressor.flush()) + chunk(b"IEND", b"")
 
 
 Number = float | int | Decimal
@@ -0,0 +1,401 @@
+"""Benchmark script on a synthetic RAW-RPL pair and DMS in a temporary folder."""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import png
+
+from maxrf4u_lite.storage import (
+    read_rpl,
+    parse_rpl_keys,
+    rot90_raw_rpl,
+    transform_raw_rpl_with_preview,
+    transform_raw_rpl_fan_out,
+    make_raw_preview,
+    make_raw_composite,
+    read_dms_header,
+    parse_dms_header_dimensions,
+    read_dms_images,
+    save_dms_image,
+    save_dms_images,
+    transform_dms,
+    Transform,
+    ALL_ROTATIONS,
+)
+from raw_rpl_dms_tools.transform import ROTATIONS
+
+RPL_TEMPLATE = """\
+key\t value
+width\t {width}
+height\t {height}
+depth\t {depth}
+offset\t 0
+data-length\t 2
+data-type\t unsigned
+byte-order\t little-endian
+record-by\t vector
+"""
+
+
+def make_synthetic_raw_rpl(
+    folder: Path,
+    shape: tuple[int, int, int],
+) -> tuple[Path, Path]:
+    """Write a synthetic uint16 RAW-RPL pair of shape (height, width, depth)."""
+    height, width, depth = shape
+    raw_filepath = folder / "synthetic.raw"
+    rpl_filepath = folder / "synthetic.rpl"
+    with open(rpl_filepath, 'w') as file:
+        file.write(RPL_TEMPLATE.format(width=width, height=height, depth=depth))
+
+    raw_mm = np.memmap(raw_filepath, dtype=np.uint16, mode='w+', shape=shape)
+    rng = np.random.default_rng(0)
+    for i in range(height):
+        raw_mm[i] = rng.integers(0, 64, size=(width, depth), dtype=np.uint16)
+        raw_mm[i, :, depth // 2] += np.arange(width, dtype=np.uint16) % 256 + i % 256
+    raw_mm.flush()
+    del raw_mm
+    return raw_filepath, rpl_filepath
+
+
+def rot90_raw_row_loop(raw_filepath: Path, rpl_filepath: Path, n: int) -> Path:
+    """Rotate a RAW row by row with a flush per row, as `rot90_raw_rpl` used to."""
+    dtype, shape = parse_rpl_keys(read_rpl(rpl_filepath))
+    raw_mm = np.memmap(raw_filepath, dtype=dtype, mode='r', shape=shape)
+    rot_raw_mm = np.rot90(raw_mm, k=n)
+    rot_raw_filepath = raw_filepath.with_name(f"{raw_filepath.stem}_row_loop.raw")
+    out = np.memmap(rot_raw_filepath, dtype=dtype, mode='w+', shape=rot_raw_mm.shape)
+    for i in range(rot_raw_mm.shape[0]):
+        out[i:i + 1] = rot_raw_mm[i:i + 1]
+        out.flush()
+    return rot_raw_filepath
+
+
+def benchmark_rotation(raw_filepath: Path, rpl_filepath: Path, workers: int) -> None:
+    """Print the throughput of the row loop and `rot90_raw_rpl` for all ROTATIONS."""
+    size = raw_filepath.stat().st_size
+    for key, value in ROTATIONS.items():
+        n = value["turns"]
+
+        start = time.perf_counter()
+        row_loop_filepath = rot90_raw_row_loop(raw_filepath, rpl_filepath, n)
+        row_loop_seconds = time.perf_counter() - start
+        row_loop_bytes = row_loop_filepath.read_bytes()
+
+        results = [f"row loop {size / row_loop_seconds / 2**20:8.1f} MiB/s"]
+        for w in sorted({1, workers}):
+            start = time.perf_counter()
+            rot_raw_filepath, _ = rot90_raw_rpl(
+                raw_filepath, rpl_filepath, n=n, mode='w', workers=w
+            )
+            seconds = time.perf_counter() - start
+            identical = row_loop_bytes == rot_raw_filepath.read_bytes()
+            results.append(
+                f"tiled ({w} worker{'' if w == 1 else 's'}) "
+                f"{size / seconds / 2**20:8.1f} MiB/s"
+                f"{'' if identical else ' (NOT IDENTICAL)'}"
+            )
+        print(f"{key:>5}: {', '.join(results)}")
+
+
+def benchmark_fan_out(raw_filepath: Path, rpl_filepath: Path, workers: int) -> None:
+    """Print the time of rotating to 3 orientations with previews, one by one or not.
+
+    Fanned out, the RAW is read once for all 3 (see `transform_raw_rpl_fan_out`).
+    """
+    start = time.perf_counter()
+    one_by_one = [
+        transform_raw_rpl_with_preview(
+            raw_filepath, rpl_filepath, transform=transform, mode='w', workers=workers
+        )
+        for transform in ALL_ROTATIONS[1:]
+    ]
+    one_by_one_seconds = time.perf_counter() - start
+    one_by_one_bytes = [raw.read_bytes() for raw, _, _ in one_by_one]
+    one_by_one_pixels = [
+        read_png_pixels(preview) for _, _, preview in one_by_one  # type: ignore
+    ]
+
+    start = time.perf_counter()
+    fanned_out = transform_raw_rpl_fan_out(
+        raw_filepath, rpl_filepath, mode='w', workers=workers, previews=True
+    )
+    fan_out_seconds = time.perf_counter() - start
+    identical = all(
+        raw.read_bytes() == raw_bytes
+        and np.array_equal(read_png_pixels(preview), pixels)  # type: ignore
+        for (raw, _, preview), raw_bytes, pixels
+        in zip(fanned_out, one_by_one_bytes, one_by_one_pixels)
+    )
+    print(
+        f"rotate to 3 orientations with previews: one by one {one_by_one_seconds:.2f} "
+        f"s, fanned out {fan_out_seconds:.2f} s"
+        f"{'' if identical else ' (NOT IDENTICAL)'}"
+    )
+
+
+def drop_from_page_cache(filepath: Path) -> bool:
+    """Ask the OS to drop the cached pages of a file, if supported (Linux).
+
+    Returns:
+        Whether the request was made, i.e. whether a following read is cold.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    fd = os.open(filepath, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+
+def raw_peak_map_two_pass(raw_filepath: Path, rpl_filepath: Path) -> np.ndarray:
+    """Compute the preview peak map in two passes, as `make_raw_preview` used to."""
+    dtype, shape = parse_rpl_keys(read_rpl(rpl_filepath))
+    raw_mm = np.memmap(raw_filepath, dtype=dtype, mode='r', shape=shape)
+    raw_max = np.max(raw_mm.reshape([-1, shape[2]]), axis=0)
+    max_peak_idx = np.argmax(raw_max)
+    return np.average(raw_mm[:, :, max_peak_idx - 10:max_peak_idx + 10], axis=2)
+
+
+def benchmark_preview(raw_filepath: Path, rpl_filepath: Path, workers: int) -> None:
+    """Print the times of the two-pass, fused, composite and cached previews.
+
+    Each read is of a cold page cache, if possible.
+    """
+    cold = drop_from_page_cache(raw_filepath)
+    start = time.perf_counter()
+    raw_peak_map_two_pass(raw_filepath, rpl_filepath)
+    two_pass_seconds = time.perf_counter() - start
+    results = [f"two-pass {two_pass_seconds:.2f} s"]
+
+    previews: list[bytes] = []
+    for w in sorted({1, workers}):
+        drop_from_page_cache(raw_filepath)
+        start = time.perf_counter()
+        preview_filepath = make_raw_preview(
+            raw_filepath, rpl_filepath, overwrite=True, workers=w
+        )
+        seconds = time.perf_counter() - start
+        if preview_filepath:
+            previews.append(preview_filepath.read_bytes())
+        results.append(f"fused ({w} worker{'' if w == 1 else 's'}) {seconds:.2f} s")
+
+    drop_from_page_cache(raw_filepath)
+    start = time.perf_counter()
+    make_raw_composite(raw_filepath, rpl_filepath, overwrite=True, workers=workers)
+    results.append(f"3-peak composite {time.perf_counter() - start:.2f} s")
+
+    for label in ("cache miss", "cache hit"):
+        drop_from_page_cache(raw_filepath)
+        start = time.perf_counter()
+        preview_filepath = make_raw_preview(
+            raw_filepath, rpl_filepath, overwrite=True, workers=workers, cache=True
+        )
+        seconds = time.perf_counter() - start
+        if preview_filepath:
+            previews.append(preview_filepath.read_bytes())
+        results.append(f"{label} {seconds:.3f} s")
+
+    identical = all(preview == previews[0] for preview in previews)
+    print(
+        f"Preview ({'cold' if cold else 'warm'} page cache): {', '.join(results)}"
+        f"{'' if identical else ' (NOT IDENTICAL)'}"
+    )
+
+
+def make_synthetic_dms(folder: Path, shape: tuple[int, int, int]) -> Path:
+    """Write a synthetic DMS of float32 images of shape (images, height, width)."""
+    images, height, width = shape
+    dms_filepath = folder / "synthetic.dms"
+    rng = np.random.default_rng(0)
+    with open(dms_filepath, 'wb') as file:
+        file.write(b"Synthetic DMS\r\n")
+        file.write(f"  {width}  {height}  {images}\r\n".encode())
+        for _ in range(images):
+            file.write(rng.random((height, width), dtype=np.float32).tobytes())
+        for i in range(images):
+            file.write(f"El{i} K\r\n".encode())
+    return dms_filepath
+
+
+def read_png_pixels(filepath: Path) -> np.ndarray:
+    """Read the pixels of a grayscale PNG."""
+    _, _, rows, _ = png.Reader(filename=str(filepath)).read()
+    return np.vstack([np.asarray(row) for row in rows])
+
+
+def benchmark_extract(dms_filepath: Path, workers: int) -> None:
+    """Print the time to extract all images of a DMS per PNG backend and workers."""
+    header_lines = read_dms_header(dms_filepath)
+    header_size = sum(len(line) for line in header_lines)
+    dimensions = parse_dms_header_dimensions(header_lines[1])
+    folder = dms_filepath.parent / "extract"
+    folder.mkdir(exist_ok=True)
+
+    def paths(label: str) -> list[Path]:
+        return [folder / f"{label}_{i}.png" for i in range(dimensions[0])]
+
+    # Image by image with pypng, as `DmsModel.extract` used to
+    start = time.perf_counter()
+    images = read_dms_images(dms_filepath, header_size, dimensions)
+    for i, path in enumerate(paths("loop")):
+        save_dms_image(images[i], path, 16)
+    results = [f"loop {time.perf_counter() - start:.2f} s"]
+    reference = [read_png_pixels(path) for path in paths("loop")]
+
+    for backend in ("pypng", "zlib"):
+        for w in sorted({1, workers}):
+            label = f"{backend}_{w}"
+            start = time.perf_counter()
+            save_dms_images(
+                dms_filepath, header_size, dimensions, paths(label),
+                backend=backend, workers=w,  # type: ignore
+            )
+            seconds = time.perf_counter() - start
+            identical = all(
+                np.array_equal(read_png_pixels(path), pixels)
+                for path, pixels in zip(paths(label), reference)
+            )
+            results.append(
+                f"{backend} ({w} process{'' if w == 1 else 'es'}) {seconds:.2f} s"
+                f"{'' if identical else ' (NOT PIXEL-IDENTICAL)'}"
+            )
+    print(f"Extract {dimensions[0]} images: {', '.join(results)}")
+
+
+def transform_dms_one_shot(dms_filepath: Path, transform: Transform) -> Path:
+    """Transform a DMS in one assignment to a memory map, as `DmsModel` used to."""
+    header_lines = read_dms_header(dms_filepath)
+    header_size = sum(len(line) for line in header_lines)
+    dimensions = parse_dms_header_dimensions(header_lines[1])
+    images_tr = transform.apply(
+        read_dms_images(dms_filepath, header_size, dimensions), axes=(1, 2)
+    )
+    out_filepath = dms_filepath.with_stem(f"{dms_filepath.stem}_one_shot")
+    with open(out_filepath, 'wb') as file:
+        file.write(b"".join(header_lines))
+    out = np.memmap(
+        out_filepath, dtype=np.float32, mode='r+', shape=images_tr.shape,
+        offset=header_size,
+    )
+    out[:] = images_tr[:]
+    out.flush()
+    return out_filepath
+
+
+def timed_peak_rss(function: Callable, *args: object) -> tuple[float, int | None]:
+    """Run a function and get its time and the peak resident memory of the process.
+
+    On Linux, the peak is reset first, since a new process starts from the peak of the
+    one it was forked from.
+
+    Returns:
+        Seconds and the peak resident set size in bytes, or None where unknown (e.g.
+        on Windows).
+    """
+    try:
+        with open("/proc/self/clear_refs", 'w') as file:
+            file.write("5")  # Reset the peak resident set size
+    except OSError:
+        pass
+    start = time.perf_counter()
+    function(*args)
+    seconds = time.perf_counter() - start
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return seconds, int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return seconds, None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return seconds, peak if sys.platform == "darwin" else peak * 1024
+
+
+def in_new_process(function: Callable, *args: object) -> tuple[float, int | None]:
+    """Run `timed_peak_rss` in a new process, so its peak is of the function alone."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(timed_peak_rss, function, *args).result()
+
+
+def benchmark_dms_rotation(dms_filepath: Path, workers: int) -> None:
+    """Print the time and peak resident memory to rotate a DMS by 90 degrees.
+
+    Each rotation runs in a new process, next to one which does nothing for the
+    baseline of the interpreter and imports.
+    """
+    transform = Transform.rotation(1)
+    _, baseline = in_new_process(time.sleep, 0)
+
+    def mib(peak: int | None) -> str:
+        return "n/a" if peak is None else f"{peak / 2**20:.0f} MiB"
+
+    results = [f"baseline {mib(baseline)}"]
+    seconds, peak = in_new_process(transform_dms_one_shot, dms_filepath, transform)
+    results.append(f"one shot {seconds:.2f} s, peak RSS {mib(peak)}")
+    seconds, peak = in_new_process(
+        transform_dms, dms_filepath, None, transform, 'w', workers
+    )
+    results.append(f"streamed {seconds:.2f} s, peak RSS {mib(peak)}")
+    size = dms_filepath.stat().st_size
+    print(f"Rotate DMS of {size / 2**30:.2f} GiB: {', '.join(results)}")
+
+
+def main() -> None:
+    """Run the benchmarks on a synthetic RAW-RPL."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--height", type=int, default=256)
+    parser.add_argument("--width", type=int, default=256)
+    parser.add_argument("--depth", type=int, default=2048)
+    parser.add_argument("--images", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--rss-gib",
+        type=float,
+        default=0,
+        help="Size of a synthetic DMS (of --height and --width) to report the peak "
+        "resident memory of rotating, e.g. 4; 0 to skip.",
+    )
+    args = parser.parse_args()
+
+    shape = (args.height, args.width, args.depth)
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"Synthetic RAW of shape {shape}, uint16")
+        raw_filepath, rpl_filepath = make_synthetic_raw_rpl(Path(folder), shape)
+        benchmark_rotation(raw_filepath, rpl_filepath, args.workers)
+        benchmark_preview(raw_filepath, rpl_filepath, args.workers)
+        benchmark_fan_out(raw_filepath, rpl_filepath, args.workers)
+
+        dms_shape = (args.images, args.height, args.width)
+        print(f"Synthetic DMS of shape {dms_shape}, float32")
+        dms_filepath = make_synthetic_dms(Path(folder), dms_shape)
+        benchmark_extract(dms_filepath, args.workers)
+
+        if args.rss_gib > 0:
+            image_bytes = args.height * args.width * 4
+            images = max(1, round(args.rss_gib * 2**30 / image_bytes))
+            large_folder = Path(folder) / "large"
+            large_folder.mkdir()
+            dms_filepath = make_synthetic_dms(
+                large_folder, (images, args.height, args.width)
+            )
+            benchmark_dms_rotation(dms_filepath, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,59 @@
 """Model for DMS functions."""
 
+import os
 from pathlib import Path
-
-import numpy as np
+from typing import Literal
 
 from raw_rpl_dms_tools.signaler import Signaler
 from maxrf4u_lite.storage import (
-    read_dms_images,
-    read_dms_header,
-    parse_dms_header_dimensions,
-    read_dms_elemental_names,
-    split_dms_header_dimensions,
-    save_dms_image,
+    DmsFile,
+    open_dms_file,
+    save_dms_images,
+    PngBackend,
+    transform_dms,
+    transform_dms_with_images,
+    dms_image_filepaths,
+    transform_dms_in_place,
+    in_place_journal_filepath,
+    resume_in_place,
+    rollback_in_place,
+    Transform,
 )
 
 PathOrNone = Path | None
 
+Scale = Literal["image", "global", "element", "line"]
+"""Scale of extracted images: their own, or shared by all, per element or per line."""
+
+
+def scale_groups(names: list[str], scale: Scale) -> list[str] | None:
+    """Get the group of each image name to share a scale by, else None for its own.
+
+    The element of a name is its first word and the line the rest, e.g. 'Pb' and 'L'
+    of 'Pb L'.
+    """
+    match scale:
+        case "image":
+            return None
+        case "global":
+            return [""] * len(names)
+        case "element":
+            return [(name.split() or [""])[0] for name in names]
+        case "line":
+            return [" ".join(name.split()[1:]) for name in names]
+        case _:
+            raise ValueError(f"Unknown scale: {scale}.")
+
+
+def raise_if_any_exists(paths: list[Path]) -> None:
+    """Raise which paths exist if any, so that either all images are saved or none."""
+    existing: list[Path] = [path for path in paths if path.is_file()]
+    if existing:
+        raise FileExistsError(
+            "No extracted images saved. One or more already exist:\n\n"
+            f"{'\n'.join(str(path) for path in existing)}"
+        )
+
 
 class DmsModel(Signaler):
     """maxrf4u_lite DMS functions bundled as a model."""
@@ -28,7 +66,15 @@ class DmsModel(Signaler):
         """Initialize model."""
         self.dms_filepath = None
         self.rotate_turns = 0
+        self.flip = Transform()
         self.overwrite = False
+        self.in_place = False
+        self.workers = os.cpu_count() or 1
+        self.stretch = None
+        self.png_compression = None
+        self.png_backend = "pypng"
+        self.selection = []
+        self.scale = "image"
         return
 
     @property
@@ -42,6 +88,7 @@ class DmsModel(Signaler):
             raise FileNotFoundError("File does not exist.")
         self._dms_filepath = path
         self._signal(path)
+        self.selection = []
 
     @property
     def rotate_turns(self) -> int:
@@ -53,6 +100,21 @@ class DmsModel(Signaler):
         self._rotate_turns = turns
         self._signal(turns)
 
+    @property
+    def flip(self) -> Transform:
+        """Flip to apply before rotating."""
+        return self._flip
+
+    @flip.setter
+    def flip(self, flip: Transform) -> None:
+        self._flip = flip
+        self._signal(flip)
+
+    @property
+    def transform(self) -> Transform:
+        """Flip and then rotation collapsed into a single transform."""
+        return Transform.chain(self.flip, Transform.rotation(self.rotate_turns))
+
     @property
     def overwrite(self) -> bool:
         """Whether to overwrite existing files."""
@@ -63,105 +125,191 @@ class DmsModel(Signaler):
         self._overwrite = overwrite
         self._signal(overwrite)
 
-    def extract(self) -> tuple[list[str], list[Path]]:
-        """Extract the elemental distribution images from the DMS."""
+    @property
+    def in_place(self) -> bool:
+        """Whether to transform in place instead of saving a copy (180° and flips)."""
+        return self._in_place
+
+    @in_place.setter
+    def in_place(self, in_place: bool) -> None:
+        self._in_place = in_place
+        self._signal(in_place)
+
+    @property
+    def workers(self) -> int:
+        """Amount of threads with which to transform and processes to extract with."""
+        return self._workers
+
+    @workers.setter
+    def workers(self, workers: int) -> None:
+        self._workers = workers
+        self._signal(workers)
+
+    @property
+    def stretch(self) -> tuple[float, float] | None:
+        """Percentiles to stretch images to, else from their minimum to maximum."""
+        return self._stretch
+
+    @stretch.setter
+    def stretch(self, stretch: tuple[float, float] | None) -> None:
+        self._stretch = stretch
+        self._signal(stretch)
+
+    @property
+    def png_compression(self) -> int | None:
+        """Compression level (0-9) of zlib for extracted PNGs, else its default."""
+        return self._png_compression
+
+    @png_compression.setter
+    def png_compression(self, compression: int | None) -> None:
+        self._png_compression = compression
+        self._signal(compression)
+
+    @property
+    def png_backend(self) -> PngBackend:
+        """Encoder of extracted PNGs: 'pypng', or the faster 'zlib'."""
+        return self._png_backend
+
+    @png_backend.setter
+    def png_backend(self, backend: PngBackend) -> None:
+        self._png_backend = backend
+        self._signal(backend)
+
+    @property
+    def scale(self) -> Scale:
+        """Whether extracted images have their own scale or share one (see `Scale`)."""
+        return self._scale
+
+    @scale.setter
+    def scale(self, scale: Scale) -> None:
+        self._scale = scale
+        self._signal(scale)
+
+    @property
+    def selection(self) -> list[int]:
+        """Indices of the images to extract, e.g. as ticked in a list, else all.
+
+        Names or patterns can be turned into indices with `DmsFile.select`.
+        """
+        return self._selection
+
+    @selection.setter
+    def selection(self, selection: list[int]) -> None:
+        self._selection = selection
+        self._signal(selection)
+
+    @property
+    def dms_file(self) -> DmsFile:
+        """Handle of the DMS, parsed once and again only if the file has changed."""
         if not (dms_filepath := self.dms_filepath):
             raise Exception("DMS file not defined.")
+        return open_dms_file(dms_filepath)
+
+    def extract(self) -> tuple[list[str], list[Path]]:
+        """Extract the elemental distribution images from the DMS, or those selected.
 
-        header_lines = read_dms_header(dms_filepath)
-        header_size = sum([len(line) for line in header_lines])
-        dimensions_line = header_lines[1]
-        dimensions = parse_dms_header_dimensions(dimensions_line)
-        _, names = read_dms_elemental_names(dms_filepath, header_size, dimensions)
-
-        # "All or nothing": Check if all available. If not, raise which ones.
-        paths = [
-            dms_filepath.parent / f"{dms_filepath.stem}_{''.join(name.split())}.png"
-            for name in names
-        ]
-        existing: list[Path] = [path for path in paths if path.is_file()]
-        if existing:
-            raise FileExistsError(
-                "No extracted images saved. One or more already exist:\n\n"
-                f"{'\n'.join(str(path) for path in existing)}"
-            )
-
-        images = read_dms_images(dms_filepath, header_size, dimensions)
-        for i, path in zip(range(images.shape[0]), paths):
-            save_dms_image(images[i, :, :], path, 16)
-
-        self._signal(names=names, paths=paths)
+        Only the selected images are read, so time and I/O scale with the selection.
+        """
+        dms = self.dms_file
+        dms_filepath = dms.filepath
+        indices = self.selected_indices()
+        names = [dms.names[i] for i in indices]
+        paths = dms_image_filepaths(dms_filepath, names)
+        raise_if_any_exists(paths)
+
+        save_dms_images(
+            dms_filepath,
+            dms.header_size,
+            dms.dimensions,
+            paths,
+            16,
+            stretch=self.stretch,
+            compression=self.png_compression,
+            backend=self.png_backend,
+            workers=self.workers,
+            indices=indices,
+            groups=scale_groups(names, self.scale),
+        )
 
         return names, paths
 
+    def selected_indices(self) -> list[int]:
+        """Indices of the images selected to extract, else of all."""
+        amount = len(self.dms_file.names)
+        if invalid := [i for i in self.selection if not 0 <= i < amount]:
+            raise IndexError(f"No images at {invalid} among {amount} images.")
+        return list(self.selection) or list(range(amount))
+
+    def transform_and_save_copy_with_extract(self) -> tuple[PathOrNone, list[Path]]:
+        """Transform and save a copy of the DMS, extracting its images as it is written.
+
+        The DMS is read once and the copy not at all. See `extract` for the selection
+        and the scale.
+        """
+        dms = self.dms_file
+        transform = self.transform
+        if transform == Transform():
+            raise Exception("No rotation or flip to apply.")
+        indices = self.selected_indices()
+        names = [dms.names[i] for i in indices]
+        dms_tr_filepath = dms.filepath.with_stem(
+            f"{dms.filepath.stem}_{transform.name}"
+        )
+        paths = dms_image_filepaths(dms_tr_filepath, names)
+        raise_if_any_exists(paths)
+
+        transform_dms_with_images(
+            dms.filepath,
+            paths,
+            transform=transform,
+            mode='w' if self.overwrite else 'x',
+            workers=self.workers,
+            bitdepth=16,
+            stretch=self.stretch,
+            compression=self.png_compression,
+            backend=self.png_backend,
+            indices=indices,
+            groups=scale_groups(names, self.scale),
+        )
+
+        return dms_tr_filepath, paths
+
     def transform_and_save_copy(self) -> PathOrNone:
         """Transform and save a copy of the DMS."""
-        if not (dms_filepath := self.dms_filepath):
-            raise Exception("DMS file not defined.")
-        n = self.rotate_turns
-
-        header_lines = read_dms_header(dms_filepath)
-        header_size = sum([len(line) for line in header_lines])
-        dimensions_line = header_lines[1]
-        dimensions = parse_dms_header_dimensions(dimensions_line)
-        names_lines, _ = read_dms_elemental_names(dms_filepath, header_size, dimensions)
-        images = read_dms_images(dms_filepath, header_size, dimensions)
-
-        # Rotate
-        angle: int = n * 90 % 360
-        dimensions_split = split_dms_header_dimensions(dimensions_line)
-        images_rot = np.rot90(images, k=n, axes=(1, 2))
-        if n % 2:
-            dimensions_rot_split = (
-                dimensions_split[1],
-                dimensions_split[0],
-                dimensions_split[2]
-            )
-        else:
-            dimensions_rot_split = dimensions_split
-        dimensions_rot_line: bytes = b"".join(dimensions_rot_split)
-        header_rot_lines: list[bytes] = [
-            header_lines[0],
-            dimensions_rot_line
-        ]
-
-        # Write
-        dms_tr_filepath = (
-            dms_filepath.parent /
-            (dms_filepath.stem + f"_rot{angle}" + dms_filepath.suffix)
-        )
-        if dms_tr_filepath.exists() and not self.overwrite:
-            raise FileExistsError(f'DMS file already exists: {dms_tr_filepath}.')
-
-        offset = 0
-
-        # Write header
-        with open(dms_tr_filepath, 'wb') as file:
-            file.writelines(header_rot_lines)
-        offset += sum([len(line) for line in header_rot_lines])
-
-        # Write images
-        out = np.memmap(
-            dms_tr_filepath,
-            dtype=np.float32,
-            mode='r+',  # "w+" with offset does not work! You have been warned.
-            shape=images_rot.shape,
-            offset=offset,
+        if self.transform == Transform():
+            raise Exception("No rotation or flip to apply.")
+        # Write image by image and tile by tile, with bounded memory
+        dms_tr_filepath = transform_dms(
+            self.dms_file.filepath,
+            transform=self.transform,
+            mode='w' if self.overwrite else 'x',
+            workers=self.workers,
         )
-        out[:] = images_rot[:]
-        # Go by chunk instead of all at once.
-        # chunk_size = 1
-        # total_rows = images_rot.shape[0]
-        # for i in range(0, total_rows, chunk_size):
-        #     sl = slice(i, min(i + chunk_size, total_rows))
-        #     data_chunk = images_rot[sl]
-        #     out[sl] = data_chunk
-        #     out.flush()
-        # offset += dimensions[0] * dimensions[1] * dimensions[2] * 4
-
-        # Write elemental names
-        with open(dms_tr_filepath, 'ab') as file:
-            # file.seek(offset)
-            file.writelines(names_lines)
 
         return dms_tr_filepath
+
+    @property
+    def in_place_journal(self) -> PathOrNone:
+        """Journal of an interrupted transform in place of the DMS, if any."""
+        if not self.dms_filepath:
+            return None
+        journal = in_place_journal_filepath(self.dms_filepath)
+        return journal if journal.is_file() else None
+
+    def transform_in_place(self) -> PathOrNone:
+        """Transform the DMS images in place, without a copy, by 180° or a flip."""
+        if not (dms_filepath := self.dms_filepath):
+            raise Exception("DMS file not defined.")
+        if self.transform == Transform():
+            raise Exception("No rotation or flip to apply.")
+        return transform_dms_in_place(dms_filepath, self.transform)
+
+    def recover_in_place(self, resume: bool) -> PathOrNone:
+        """Resume or roll back an interrupted transform in place of the DMS."""
+        if not (dms_filepath := self.dms_filepath):
+            raise Exception("DMS file not defined.")
+        if resume:
+            resume_in_place(dms_filepath)
+        else:
+            rollback_in_place(dms_filepath)
+        return dms_filepath
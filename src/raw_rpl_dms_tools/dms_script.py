@@ -11,6 +11,7 @@ from maxrf4u_lite.storage import (
     read_dms_elemental_names,
     split_dms_header_dimensions,
     save_dms_image,
+    write_dms,
 )
 
 dms_filepath = Path(r"C:\art\data-NOBACKUP\xrf\elemental-datacube.dms")
@@ -46,15 +47,14 @@ if n % 2:
 else:
     dimensions_rot_split = dimensions_split
 dimensions_rot_line: bytes = b"".join(dimensions_rot_split)
-header_rot_lines: list[bytes] = [
+header_rot_lines: tuple[bytes, bytes] = (
     header_lines[0],
     dimensions_rot_line
-]
+)
 
 
 # Write rotated DMS
 
-# TODO: write_dms(filepath, header_lines, images, names_lines)
 dms_rot_filepath = (
     dms_filepath.parent / (dms_filepath.stem + f"_rot{angle}" + dms_filepath.suffix)
 )
@@ -62,35 +62,14 @@ overwrite = True
 if dms_rot_filepath.exists() and not overwrite:
     raise FileExistsError(f'DMS file already exists: {dms_rot_filepath}.')
 
-offset = 0
-
-# Write header
-with open(dms_rot_filepath, 'wb') as file:
-    file.writelines(header_rot_lines)
-offset += sum([len(line) for line in header_rot_lines])
-# Write images
-out = np.memmap(
+# Write header, images by image and tile, and names in one pass
+write_dms(
     dms_rot_filepath,
-    dtype=np.float32,
-    mode='r+',  # "w+" with offset does not work! You have been warned.
-    shape=images_rot.shape,
-    offset=offset,
+    header_rot_lines,
+    images_rot,
+    names_lines,
+    mode='w' if overwrite else 'x',
 )
-out[:] = images_rot[:]
-# Go by chunk instead of all at once.
-# chunk_size = 1
-# total_rows = images_rot.shape[0]
-# for i in range(0, total_rows, chunk_size):
-#     sl = slice(i, min(i + chunk_size, total_rows))
-#     data_chunk = images_rot[sl]
-#     out[sl] = data_chunk
-#     out.flush()
-# offset += dimensions[0] * dimensions[1] * dimensions[2] * 4
-
-# Write elemental names
-with open(dms_rot_filepath, 'ab') as file:
-    # file.seek(offset)
-    file.writelines(names_lines)
 
 # Save images
 image_paths = [
@@ -8,11 +8,20 @@ from tkinter import ttk
 from tkinter import messagebox
 from tkinter import filedialog
 
-from raw_rpl_dms_tools.dms_model import DmsModel, PathOrNone
-from raw_rpl_dms_tools.tk_utilities import Tooltip, LabelText, ModalLoadingDialog
+from raw_rpl_dms_tools.dms_model import DmsModel, PathOrNone, Scale
+from raw_rpl_dms_tools.tk_utilities import Tooltip, LabelText
+from raw_rpl_dms_tools.worker import run_with_loading_dialog
 from raw_rpl_dms_tools.metadata import TITLE
-from raw_rpl_dms_tools.icon import set_window_icon
-from raw_rpl_dms_tools.transform import ROTATIONS
+from raw_rpl_dms_tools.transform import ROTATIONS, FLIPS
+from maxrf4u_lite.storage import Transform, STRETCH_PERCENTILES
+
+
+SCALES: dict[str, Scale] = {
+    "Scale each image": "image",
+    "Share one scale": "global",
+    "Share per element": "element",
+    "Share per line": "line",
+}
 
 
 def s(n: int) -> str:
@@ -29,7 +38,8 @@ class DmsView(ttk.Frame):
 
         self._pad = (5, 5)
 
-        self.rotations = ROTATIONS
+        # Offer no rotation as well, e.g. to only flip (not one of the ROTATIONS)
+        self.rotations = {"0°": {"turns": 0}, **ROTATIONS}
         default_turns = 1
         self.model.rotate_turns = default_turns
         rotations_key_str = next(
@@ -37,6 +47,9 @@ class DmsView(ttk.Frame):
         )
         self.rotations_key = tk.StringVar(master=self, value=f"{rotations_key_str}")
 
+        self.flips = FLIPS
+        self.flips_key = tk.StringVar(master=self, value=f"{next(iter(self.flips))}")
+
         row = -1
 
         # Draw Select button
@@ -144,10 +157,172 @@ class DmsView(ttk.Frame):
                 "as <dms_filename>_<elemental name>.png."
             )
         )
+
+        row += 1
+        checklist_frame = ttk.Frame(master=frame)
+        checklist_frame.grid(
+            sticky="ew",
+            column=0, row=row,
+            columnspan=2,
+            padx=0, pady=(self._pad[1], 0),
+        )
+        checklist_frame.grid_columnconfigure(0, weight=1)
+        listbox = tk.Listbox(
+            checklist_frame,
+            selectmode="multiple",
+            exportselection=False,
+            height=6,
+        )
+        listbox.grid(sticky="ew", column=0, row=0)
+        scrollbar = ttk.Scrollbar(
+            checklist_frame, orient="vertical", command=listbox.yview
+        )
+        scrollbar.grid(sticky="ns", column=1, row=0)
+        listbox.configure(yscrollcommand=scrollbar.set)
+        listbox.bind(
+            "<<ListboxSelect>>",
+            lambda _: setattr(
+                self.model,
+                "selection",
+                list(listbox.curselection()),
+            ),
+        )
+        Tooltip(
+            listbox,
+            text=(
+                "Select the images to extract, e.g. only Pb, Hg and Fe. Only those are "
+                "read from the DMS. Select none to extract all."
+            )
+        )
+        self.selection_listbox = listbox
+
+        row += 1
+        self.stretch_var = tk.IntVar(master=self, value=0)
+        checkbutton = ttk.Checkbutton(
+            frame,
+            text=(
+                f"Stretch contrast ({STRETCH_PERCENTILES[0]}–"
+                f"{STRETCH_PERCENTILES[1]}%)"
+            ),
+            variable=self.stretch_var,
+            onvalue=1,
+            offvalue=0,
+            command=lambda v=self.stretch_var: [
+                setattr(
+                    self.model,
+                    "stretch",
+                    STRETCH_PERCENTILES if v.get() else None,
+                ),
+            ],
+        )
+        checkbutton.grid(
+            sticky="e",
+            row=row,
+            column=0,
+            columnspan=2,
+            padx=0, pady=0,
+        )
+        Tooltip(
+            checkbutton,
+            text=(
+                "Scale the extracted images from their low to their high percentile "
+                "instead of from their minimum to their maximum, so that a few hot "
+                "pixels do not darken the whole image."
+            )
+        )
+
+        row += 1
+        self.scale_var = tk.StringVar(master=self, value=next(iter(SCALES)))
+        combobox = ttk.Combobox(
+            frame,
+            values=list(SCALES),
+            state="readonly",
+            textvariable=self.scale_var,
+        )
+        combobox.bind(
+            "<<ComboboxSelected>>",
+            lambda _: setattr(self.model, "scale", SCALES[self.scale_var.get()]),
+        )
+        combobox.grid(
+            sticky="e",
+            row=row,
+            column=0,
+            columnspan=2,
+            padx=0, pady=0,
+        )
+        Tooltip(
+            combobox,
+            text=(
+                "Normalize each extracted image from its own minimum to maximum, or "
+                "share one scale among all images, or among those of the same element "
+                "(e.g. Pb L and Pb M) or line (e.g. all K), so that they can be "
+                "compared quantitatively. A shared scale overrides the stretch."
+            )
+        )
+
+        row += 1
+        png_frame = ttk.Frame(master=frame)
+        png_frame.grid(
+            sticky="e",
+            column=0, row=row,
+            columnspan=2,
+            padx=0, pady=0,
+        )
+
+        self.png_backend_var = tk.IntVar(master=self, value=0)
+        checkbutton = ttk.Checkbutton(
+            png_frame,
+            text="Fast PNG encoder",
+            variable=self.png_backend_var,
+            onvalue=1,
+            offvalue=0,
+            command=lambda v=self.png_backend_var: [
+                setattr(
+                    self.model,
+                    "png_backend",
+                    "zlib" if v.get() else "pypng",
+                ),
+            ],
+        )
+        checkbutton.grid(sticky="w", column=0, row=0, padx=(0, self._pad[0]))
+        Tooltip(
+            checkbutton,
+            text=(
+                "Encode the PNGs with numpy and zlib instead of pypng, which is "
+                "faster and gives PNGs of the same pixels."
+            )
+        )
+
+        label = ttk.Label(master=png_frame, text="Compression")
+        label.grid(sticky="e", column=1, row=0, padx=(0, self._pad[0]))
+        self.png_compression_var = tk.StringVar(master=self, value="6")
+        spinbox = ttk.Spinbox(
+            png_frame,
+            from_=0,
+            to=9,
+            width=2,
+            state="readonly",
+            textvariable=self.png_compression_var,
+            command=lambda v=self.png_compression_var: [
+                setattr(
+                    self.model,
+                    "png_compression",
+                    int(v.get()),
+                ),
+            ],
+        )
+        spinbox.grid(sticky="e", column=2, row=0)
+        Tooltip(
+            spinbox,
+            text=(
+                "zlib compression level of the PNGs, from 0 (fastest, largest) to 9 "
+                "(slowest, smallest). 6 is zlib's default."
+            )
+        )
         return
 
     def draw_transform(self, row: int) -> None:
-        """Draw the transform frame and rotate subframe."""
+        """Draw the transform frame with flip and rotate subframes."""
         transform_frame = ttk.Frame(master=self)
         transform_frame.grid(
             sticky="ew",
@@ -166,6 +341,39 @@ class DmsView(ttk.Frame):
             padx=0, pady=(0, self._pad[1]),
         )
 
+        transform_row += 1
+        frame = ttk.LabelFrame(master=transform_frame, text="Flip")
+        frame.grid(
+            sticky="ew",
+            column=0, row=transform_row,
+            padx=0,
+            pady=(0, self._pad[1]),
+        )
+        frame.grid_rowconfigure(0, weight=1)
+        frame.grid_columnconfigure(0, weight=1)
+        row = -1
+
+        for key, value in self.flips.items():
+            row += 1
+            radiobutton = ttk.Radiobutton(
+                frame,
+                text=key,
+                variable=self.flips_key,
+                value=key,
+                command=lambda v=value: [
+                    setattr(
+                        self.model,
+                        "flip",
+                        v["transform"],
+                    ),
+                ],
+            )
+            radiobutton.grid(sticky="w", column=0, row=row)
+            Tooltip(
+                radiobutton,
+                text=value["description"]
+            )
+
         transform_row += 1
         frame = ttk.LabelFrame(master=transform_frame, text="Rotate counterclockwise")
         frame.grid(
@@ -185,11 +393,11 @@ class DmsView(ttk.Frame):
                 text=key,
                 variable=self.rotations_key,
                 value=key,
-                command=lambda k=self.rotations_key: [
+                command=lambda v=value: [
                     setattr(
                         self.model,
                         "rotate_turns",
-                        value["turns"],
+                        v["turns"],
                     ),
                 ],
             )
@@ -210,6 +418,40 @@ class DmsView(ttk.Frame):
         frame.grid_columnconfigure(0, weight=1)
         row = -1
 
+        row += 1
+        self.transform_in_place_var = tk.IntVar(master=self, value=0)
+        checkbutton = ttk.Checkbutton(
+            frame,
+            text="Transform in place (180° and flips only)",
+            variable=self.transform_in_place_var,
+            onvalue=1,
+            offvalue=0,
+            command=lambda v=self.transform_in_place_var: [
+                setattr(
+                    self.model,
+                    "in_place",
+                    bool(v.get()),
+                ),
+            ],
+        )
+        checkbutton.grid(
+            sticky="w",
+            row=row,
+            column=0,
+            columnspan=2,
+            padx=0, pady=0,
+        )
+        Tooltip(
+            checkbutton,
+            text=(
+                "Overwrite the DMS itself instead of saving a copy, which saves "
+                "disk space. Only for transforms which keep the shape: 180° and flips. "
+                "A journal is kept next to the DMS so that an interrupted "
+                "transform can be resumed or rolled back. No images are extracted when "
+                "in place."
+            )
+        )
+
         row += 1
         self.extract_transform_preview = tk.IntVar(master=self, value=1)
         col = 0
@@ -252,9 +494,11 @@ class DmsView(ttk.Frame):
             frame,
             text=text,
             command=lambda p=self.extract_transform_preview: [
-                self.transform_and_save_copy(extract=bool(p.get())),
+                self.transform_in_place() if self.model.in_place
+                else self.transform_and_save_copy(extract=bool(p.get())),
             ]
         )
+        self.transform_button = button
         button.grid(
             sticky="e",
             column=1, row=row,
@@ -327,6 +571,21 @@ class DmsView(ttk.Frame):
         """Listener for dms_filepath."""
         text = str(path or "")
         self.dms_label.set_text(text=text)
+        self.selection_listbox.delete(0, "end")
+        if path:
+            try:
+                names = self.model.dms_file.names
+            except Exception:
+                names = []
+            self.selection_listbox.insert("end", *names)
+        return
+
+    def selection_listener(self, selection: list[int]) -> None:
+        """Listener for DmsModel.selection."""
+        listbox = self.selection_listbox
+        listbox.selection_clear(0, "end")
+        for i in selection:
+            listbox.selection_set(i)
         return
 
     def set_dms_filepath(self, path: PathOrNone) -> None:
@@ -338,6 +597,48 @@ class DmsView(ttk.Frame):
 
     def rotate_turns_listener(self, turns: int) -> None:
         """Listener for DmsModel.rotate_turns."""
+        self.enable_transform_button()
+        return
+
+    def flip_listener(self, flip: Transform) -> None:
+        """Listener for DmsModel.flip."""
+        self.enable_transform_button()
+        return
+
+    def enable_transform_button(self) -> None:
+        """Disable the transform button if there is no rotation or flip to apply."""
+        identity = self.model.transform == Transform()
+        self.transform_button.configure(state="disabled" if identity else "normal")
+        return
+
+    def in_place_listener(self, in_place: bool) -> None:
+        """Listener for DmsModel.in_place."""
+        text = "Transform In Place" if in_place else "Transform & Save Copy"
+        self.transform_button.configure(text=text)
+        return
+
+    def workers_listener(self, workers: int) -> None:
+        """Listener for DmsModel.workers."""
+        return
+
+    def stretch_listener(self, stretch: tuple[float, float] | None) -> None:
+        """Listener for DmsModel.stretch."""
+        self.stretch_var.set(int(stretch is not None))
+        return
+
+    def scale_listener(self, scale: Scale) -> None:
+        """Listener for DmsModel.scale."""
+        self.scale_var.set(next(k for k, v in SCALES.items() if v == scale))
+        return
+
+    def png_compression_listener(self, compression: int | None) -> None:
+        """Listener for DmsModel.png_compression."""
+        self.png_compression_var.set(str(6 if compression is None else compression))
+        return
+
+    def png_backend_listener(self, backend: str) -> None:
+        """Listener for DmsModel.png_backend."""
+        self.png_backend_var.set(int(backend == "zlib"))
         return
 
     def extract_listener(self, names: list[str], paths: list[Path]) -> None:
@@ -350,89 +651,79 @@ class DmsView(ttk.Frame):
         self.extract_label.set_text(text=text)
         return
 
-    def extract(self) ->  tuple[list[str], list[Path]]:
-        """Extract the elemental distribution images with the model."""
-        names = []
-        paths = []
-
-        dialog = set_window_icon(
-            ModalLoadingDialog(master=self, text="Extracting from DMS...")
-        )
-        dialog.update()  # Works, but I really should multi-thread with root.after()...
-        try:
-            names, paths = self.model.extract()
-        except Exception as error:
-            message = f"Error while generating preview:\n\n{str(error)}"
-            messagebox.showerror(TITLE, message,)
-            self.extract_label.set_text("")
-        else:
+    def extract(self) -> None:
+        """Extract the elemental distribution images with the model, in a thread."""
+        def done(result: tuple[list[str], list[Path]]) -> None:
+            names, paths = result
+            self.extract_listener(names=names, paths=paths)
             n = len(names)
             message = (
                 f"{n} elemental distribution image{s(n)} extracted:\n\n"
                 f"{'\n'.join(str(path) for path in paths)}"
             )
             messagebox.showinfo(TITLE, message,)
-        finally:
-            dialog.destroy()
-
-        return names, paths
 
-    def transform_and_save_copy(
-        self,
-        extract: bool = True,
-    ) -> tuple[PathOrNone, list[Path]]:
-        """Transform and save a DMS copy with an optional extraction."""
-        dms_tr: PathOrNone = None
-        extract_tr: list[Path] = []
+        def failed(error: Exception) -> None:
+            message = f"Error while extracting from DMS:\n\n{str(error)}"
+            messagebox.showerror(TITLE, message,)
+            self.extract_listener(names=[], paths=[])
 
-        dialog = set_window_icon(
-            ModalLoadingDialog(master=self, text="Transforming and saving DMS...")
+        def cancelled() -> None:
+            self.extract_listener(names=[], paths=[])
+            messagebox.showinfo(TITLE, "Cancelled. Images saved so far are kept.",)
+
+        run_with_loading_dialog(
+            self,
+            "Extracting from DMS...",
+            self.model.extract,
+            done,
+            failed,
+            cancelled,
         )
-        dialog.update()
-        try:
-            dms_tr = self.model.transform_and_save_copy()
-        except Exception as error:
-            message = f"Error while transforming and saving DMS:\n\n{str(error)}"
-            messagebox.showerror(TITLE, message,)
+        return
+
+    def transform_and_save_copy(self, extract: bool = True) -> None:
+        """Transform and save a DMS copy with an optional extraction.
+
+        Runs in the background. If cancelled, the partial copy is removed.
+        """
+        def done(paths: tuple[PathOrNone, list[Path]]) -> None:
+            dms_tr, extract_tr = paths
             self.transform_and_save_copy_listener(dms_tr, extract_tr)
-            return dms_tr, extract_tr
-        else:
             message = f"Transformed DMS saved:\n\n{dms_tr}"
-            messagebox.showinfo(TITLE, message,)
-        finally:
-            dialog.destroy()
-
-        if extract:
-            dialog = set_window_icon(
-                ModalLoadingDialog(
-                    master=self,
-                    text="Extracting from transformed DMS..."
-                )
-            )
-            dialog.update()
-            try:
-                model = DmsModel()
-                model.dms_filepath = dms_tr
-                _, extract_tr = model.extract()
-            except Exception as error:
-                message = (
-                    "Error while extracting images from transformed DMS:\n\n"
-                    f"{str(error)}"
-                )
-                messagebox.showerror(TITLE, message,)
-                self.transform_and_save_copy_listener(dms_tr, extract_tr)
-                return dms_tr, extract_tr
-            else:
-                message = (
-                    "Images from transformed DMS extracted:\n\n"
+            if extract_tr:
+                message += (
+                    "\n\nImages from transformed DMS extracted:\n\n"
                     f"{'\n'.join(str(path) for path in extract_tr)}"
                 )
-                messagebox.showinfo(TITLE, message,)
-            finally:
-                dialog.destroy()
+            messagebox.showinfo(TITLE, message,)
+
+        def failed(error: Exception) -> None:
+            message = f"Error while transforming and saving DMS:\n\n{str(error)}"
+            messagebox.showerror(TITLE, message,)
+            self.transform_and_save_copy_listener(None, [])
 
-        self.transform_and_save_copy_listener(dms_tr, extract_tr)
-        return dms_tr, extract_tr
+        def cancelled() -> None:
+            self.transform_and_save_copy_listener(None, [])
+            message = "Cancelled. The partial copy and its images were removed."
+            messagebox.showinfo(TITLE, message,)
+
+        def transform() -> tuple[PathOrNone, list[Path]]:
+            if extract:
+                # Fused: each image is extracted as it is written to the copy
+                return self.model.transform_and_save_copy_with_extract()
+            return self.model.transform_and_save_copy(), []
+
+        text = "Transforming and saving DMS"
+        run_with_loading_dialog(
+            self,
+            f"{text} and extracting images..." if extract else f"{text}...",
+            transform,
+            done,
+            failed,
+            cancelled,
+        )
+        return
 
     def transform_and_save_copy_listener(
         self,
@@ -448,3 +739,69 @@ class DmsView(ttk.Frame):
 
         self.transform_label.set_text(text)
         return
+
+    def transform_in_place(self) -> None:
+        """Transform the DMS in place with the model, first offering to recover.
+
+        Runs in the background. If cancelled, it stops between steps as if
+        interrupted, so it can be resumed or rolled back the next time.
+        """
+        def cancelled() -> None:
+            message = (
+                "Transform in place cancelled. Transform in place again to resume or "
+                "roll it back."
+            )
+            messagebox.showinfo(TITLE, message,)
+
+        if journal := self.model.in_place_journal:
+            answer = messagebox.askyesnocancel(
+                TITLE,
+                (
+                    "A previous transform in place was interrupted:\n\n"
+                    f"{journal}\n\n"
+                    "Yes: resume it.\n"
+                    "No: roll it back to the original.\n"
+                    "Cancel: do nothing."
+                ),
+            )
+            if answer is None:
+                return
+            text = "Resuming" if answer else "Rolling back"
+
+            def recovered(filepath: PathOrNone) -> None:
+                done = "resumed" if answer else "rolled back"
+                message = f"Transform in place {done}:\n\n{filepath}"
+                messagebox.showinfo(TITLE, message,)
+
+            def recovery_failed(error: Exception) -> None:
+                message = f"Error while recovering transform in place:\n\n{str(error)}"
+                messagebox.showerror(TITLE, message,)
+
+            # A roll back is not cancellable, to always end in the original
+            run_with_loading_dialog(
+                self,
+                f"{text} transform in place...",
+                lambda: self.model.recover_in_place(resume=bool(answer)),
+                recovered,
+                recovery_failed,
+                cancelled if answer else None,
+            )
+            return
+
+        def done(filepath: PathOrNone) -> None:
+            message = f"DMS transformed in place:\n\n{filepath}"
+            messagebox.showinfo(TITLE, message,)
+
+        def failed(error: Exception) -> None:
+            message = f"Error while transforming DMS in place:\n\n{str(error)}"
+            messagebox.showerror(TITLE, message,)
+
+        run_with_loading_dialog(
+            self,
+            "Transforming DMS in place...",
+            self.model.transform_in_place,
+            done,
+            failed,
+            cancelled,
+        )
+        return
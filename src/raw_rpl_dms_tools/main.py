@@ -1,6 +1,7 @@
 """Run RAW RPL Tools."""
 
 
+from multiprocessing import freeze_support
 from os import path
 # from pathlib import Path
 from platform import system
@@ -15,7 +16,7 @@ def main() -> None:
     """Main window."""
     window = tk.Tk()
     window.title(TITLE)
-    window.geometry('320x400')
+    window.geometry('320x730')
     window.grid_rowconfigure(0, weight=1)
     window.grid_columnconfigure(0, weight=1)
 
@@ -42,4 +43,5 @@ def main() -> None:
 
 
 if __name__ == "__main__":
+    freeze_support()  # Extraction encodes PNGs on a process pool, also when frozen
     main()
@@ -1,12 +1,64 @@
 """Model for RAW-RPL functions."""
 
+import os
+import platform
 from pathlib import Path
+from typing import Iterator
+
+import numpy as np
 
 from raw_rpl_dms_tools.signaler import Signaler
-from maxrf4u_lite.storage import make_raw_preview, rot90_raw_rpl
+from maxrf4u_lite.storage import (
+    make_raw_preview,
+    make_raw_contact_sheet,
+    quick_raw_previews,
+    extract_raw_maps,
+    transform_raw_rpl,
+    transform_raw_rpl_with_preview,
+    transform_raw_rpl_in_place,
+    in_place_journal_filepath,
+    resume_in_place,
+    rollback_in_place,
+    Transform,
+)
 
 PathOrNone = Path | None
 
+Windows = dict[str, tuple[int, int]]
+
+
+def user_cache_dir(name: str = "raw-rpl-dms-tools") -> Path:
+    """Get the folder of the caches of an app for the user, e.g. `~/.cache/<name>`."""
+    system = platform.system()
+    if system == "Windows":
+        base = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+    elif system == "Darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / name
+
+
+def parse_windows(text: str) -> Windows:
+    """Parse windows of channels from text like 'Fe K: 630-650; Cu K: 795-815'."""
+    windows: Windows = {}
+    for item in text.replace("\n", ";").split(";"):
+        if not item.strip():
+            continue
+        name, separator, channels = item.rpartition(":")
+        start, dash, stop = channels.partition("-")
+        if not separator or not dash or not name.strip():
+            raise ValueError(f"Window not as '<name>: <start>-<stop>': {item.strip()}")
+        windows[name.strip()] = (int(start), int(stop))
+    return windows
+
+
+def format_windows(windows: Windows) -> str:
+    """Format windows of channels as text parsed by `parse_windows`."""
+    return "; ".join(
+        f"{name}: {start}-{stop}" for name, (start, stop) in windows.items()
+    )
+
 
 class RawRplModel(Signaler):
     """maxrf4u_lite RAW-RPL functions bundled as a model."""
@@ -20,7 +72,14 @@ class RawRplModel(Signaler):
         self.raw_filepath = None
         self.rpl_filepath = None
         self.rotate_turns = 0
+        self.flip = Transform()
         self.overwrite = False
+        self.in_place = False
+        self.workers = os.cpu_count() or 1
+        self.stretch = None
+        self.cache = True
+        self.cache_dir = user_cache_dir()  # Never a file next to the user's RAW
+        self.windows = {}
         return
 
     @property
@@ -57,6 +116,21 @@ class RawRplModel(Signaler):
         self._rotate_turns = turns
         self._signal(turns)
 
+    @property
+    def flip(self) -> Transform:
+        """Flip to apply before rotating."""
+        return self._flip
+
+    @flip.setter
+    def flip(self, flip: Transform) -> None:
+        self._flip = flip
+        self._signal(flip)
+
+    @property
+    def transform(self) -> Transform:
+        """Flip and then rotation collapsed into a single transform."""
+        return Transform.chain(self.flip, Transform.rotation(self.rotate_turns))
+
     @property
     def overwrite(self) -> bool:
         """Whether to overwrite existing files."""
@@ -67,6 +141,56 @@ class RawRplModel(Signaler):
         self._overwrite = overwrite
         self._signal(overwrite)
 
+    @property
+    def in_place(self) -> bool:
+        """Whether to transform in place instead of saving a copy (180° and flips)."""
+        return self._in_place
+
+    @in_place.setter
+    def in_place(self, in_place: bool) -> None:
+        self._in_place = in_place
+        self._signal(in_place)
+
+    @property
+    def workers(self) -> int:
+        """Amount of threads with which to transform and generate previews."""
+        return self._workers
+
+    @workers.setter
+    def workers(self, workers: int) -> None:
+        self._workers = workers
+        self._signal(workers)
+
+    @property
+    def stretch(self) -> tuple[float, float] | None:
+        """Percentiles to stretch images to, else from their minimum to maximum."""
+        return self._stretch
+
+    @stretch.setter
+    def stretch(self, stretch: tuple[float, float] | None) -> None:
+        self._stretch = stretch
+        self._signal(stretch)
+
+    @property
+    def cache(self) -> bool:
+        """Whether to cache the statistics of a RAW for faster repeated previews."""
+        return self._cache
+
+    @cache.setter
+    def cache(self, cache: bool) -> None:
+        self._cache = cache
+        self._signal(cache)
+
+    @property
+    def cache_dir(self) -> PathOrNone:
+        """Central folder of statistics caches, else each cache is next to its RAW."""
+        return self._cache_dir
+
+    @cache_dir.setter
+    def cache_dir(self, path: PathOrNone) -> None:
+        self._cache_dir = path
+        self._signal(path)
+
     def generate_preview(self) -> PathOrNone:
         """Generate a preview PNG image of the RAW-RPL pair."""
         if not self.raw_filepath:
@@ -76,20 +200,146 @@ class RawRplModel(Signaler):
         filepath = make_raw_preview(
             self.raw_filepath,
             self.rpl_filepath,
-            show=True
+            show=True,
+            workers=self.workers,
+            cache=self.cache,
+            cache_dir=self.cache_dir,
+            stretch=self.stretch,
+        )
+        return filepath
+
+    def preview_all_orientations(self) -> PathOrNone:
+        """Generate one PNG of the previews of all four rotations of the RAW-RPL pair.
+
+        The RAW is read once for all of them (see `make_raw_contact_sheet`).
+        """
+        if not self.raw_filepath:
+            raise Exception("RAW file not defined.")
+        if not self.rpl_filepath:
+            raise Exception("RPL file not defined.")
+        filepath = make_raw_contact_sheet(
+            self.raw_filepath,
+            self.rpl_filepath,
+            show=True,
+            overwrite=self.overwrite,
+            workers=self.workers,
+            cache=self.cache,
+            cache_dir=self.cache_dir,
+            stretch=self.stretch,
         )
-        self._signal(filepath)
         return filepath
 
+    @property
+    def windows(self) -> Windows:
+        """Windows of channels [start, stop) by name to integrate into maps."""
+        return self._windows
+
+    @windows.setter
+    def windows(self, windows: Windows) -> None:
+        self._windows = windows
+        self._signal(windows)
+
+    def extract(self) -> tuple[list[str], list[Path]]:
+        """Integrate the windows into maps in one pass over the RAW and save them."""
+        if not self.raw_filepath:
+            raise Exception("RAW file not defined.")
+        if not self.rpl_filepath:
+            raise Exception("RPL file not defined.")
+        if not self.windows:
+            raise Exception("No windows of channels defined.")
+        names, paths = extract_raw_maps(
+            self.raw_filepath,
+            self.rpl_filepath,
+            self.windows,
+            overwrite=self.overwrite,
+            workers=self.workers,
+            cache=self.cache,
+            cache_dir=self.cache_dir,
+            stretch=self.stretch,
+        )
+        return names, paths
+
+    def quick_previews(self) -> Iterator[tuple[int, np.ndarray]]:
+        """Iterate quick previews of the RAW-RPL pair refining to the exact preview."""
+        if not self.raw_filepath:
+            raise Exception("RAW file not defined.")
+        if not self.rpl_filepath:
+            raise Exception("RPL file not defined.")
+        return quick_raw_previews(
+            self.raw_filepath,
+            self.rpl_filepath,
+            workers=self.workers,
+            cache=self.cache,
+            cache_dir=self.cache_dir,
+            stretch=self.stretch,
+        )
+
     def transform_and_save_copy(self) -> tuple[PathOrNone, PathOrNone]:
         """Transform and save a copy of the RAW-RPL pair."""
         if not self.raw_filepath:
             raise Exception("RAW file not defined.")
         if not self.rpl_filepath:
             raise Exception("RPL file not defined.")
-        return rot90_raw_rpl(
+        if self.transform == Transform():
+            raise Exception("No rotation or flip to apply.")
+        return transform_raw_rpl(
+            raw_filepath=self.raw_filepath,
+            rpl_filepath=self.rpl_filepath,
+            transform=self.transform,
+            mode="x",  # Raise if exists
+            workers=self.workers,
+        )
+
+    def transform_and_save_copy_with_preview(
+        self,
+    ) -> tuple[PathOrNone, PathOrNone, PathOrNone]:
+        """Transform and save a copy of the RAW-RPL pair and its preview in one pass."""
+        if not self.raw_filepath:
+            raise Exception("RAW file not defined.")
+        if not self.rpl_filepath:
+            raise Exception("RPL file not defined.")
+        if self.transform == Transform():
+            raise Exception("No rotation or flip to apply.")
+        return transform_raw_rpl_with_preview(
             raw_filepath=self.raw_filepath,
             rpl_filepath=self.rpl_filepath,
-            n=self.rotate_turns,
+            transform=self.transform,
             mode="x",  # Raise if exists
+            workers=self.workers,
+            show=True,
+            cache=self.cache,
+            cache_dir=self.cache_dir,
+            stretch=self.stretch,
+        )
+
+    @property
+    def in_place_journal(self) -> PathOrNone:
+        """Journal of an interrupted transform in place of the RAW, if any."""
+        if not self.raw_filepath:
+            return None
+        journal = in_place_journal_filepath(self.raw_filepath)
+        return journal if journal.is_file() else None
+
+    def transform_in_place(self) -> PathOrNone:
+        """Transform the RAW in place, without a copy, by 180° or a flip."""
+        if not self.raw_filepath:
+            raise Exception("RAW file not defined.")
+        if not self.rpl_filepath:
+            raise Exception("RPL file not defined.")
+        if self.transform == Transform():
+            raise Exception("No rotation or flip to apply.")
+        return transform_raw_rpl_in_place(
+            raw_filepath=self.raw_filepath,
+            rpl_filepath=self.rpl_filepath,
+            transform=self.transform,
         )
+
+    def recover_in_place(self, resume: bool) -> PathOrNone:
+        """Resume or roll back an interrupted transform in place of the RAW."""
+        if not self.raw_filepath:
+            raise Exception("RAW file not defined.")
+        if resume:
+            resume_in_place(self.raw_filepath)
+        else:
+            rollback_in_place(self.raw_filepath)
+        return self.raw_filepath
@@ -1,18 +1,47 @@
 """View for RawRplModel."""
 
+import base64
+import io
+import queue
+import threading
 from builtins import property
 from pathlib import Path
+from typing import Iterator
 
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
 from tkinter import filedialog
-
-from raw_rpl_dms_tools.raw_rpl_model import RawRplModel, PathOrNone
-from raw_rpl_dms_tools.tk_utilities import Tooltip, LabelText, ModalLoadingDialog
+from tkinter import simpledialog
+
+import numpy as np
+import png
+
+from raw_rpl_dms_tools.raw_rpl_model import (
+    RawRplModel,
+    PathOrNone,
+    Windows,
+    parse_windows,
+    format_windows,
+)
+from raw_rpl_dms_tools.tk_utilities import (
+    Tooltip,
+    LabelText,
+    ImageWindow,
+)
+from raw_rpl_dms_tools.worker import run_with_loading_dialog
 from raw_rpl_dms_tools.metadata import TITLE
 from raw_rpl_dms_tools.icon import set_window_icon
-from raw_rpl_dms_tools.transform import ROTATIONS
+from raw_rpl_dms_tools.transform import ROTATIONS, FLIPS
+from maxrf4u_lite.storage import (
+    Transform,
+    STRETCH_PERCENTILES,
+    Cancelled,
+    cancellable,
+)
+
+QUICK_PREVIEW_EDGE: int = 480
+"""Maximum edge in pixels of a quick preview as displayed."""
 
 
 class RawRplView(ttk.Frame):
@@ -24,7 +53,8 @@ class RawRplView(ttk.Frame):
 
         self._pad = (5, 5)
 
-        self.rotations = ROTATIONS
+        # Offer no rotation as well, e.g. to only flip (not one of the ROTATIONS)
+        self.rotations = {"0°": {"turns": 0}, **ROTATIONS}
         default_turns = 1
         self.model.rotate_turns = default_turns
         rotations_key_str = next(
@@ -32,6 +62,14 @@ class RawRplView(ttk.Frame):
         )
         self.rotations_key = tk.StringVar(master=self, value=f"{rotations_key_str}")
 
+        self.flips = FLIPS
+        self.flips_key = tk.StringVar(master=self, value=f"{next(iter(self.flips))}")
+
+        self.quick_preview_window: ImageWindow | None = None
+        self.quick_preview_queue: queue.Queue = queue.Queue()
+        self.quick_preview_stop = threading.Event()
+        self.quick_preview_thread: threading.Thread | None = None
+
         row = -1
 
         # Draw Select buttons
@@ -71,8 +109,11 @@ class RawRplView(ttk.Frame):
         )
 
         if file:
+            self.stop_quick_preview()
             self.set_raw_filepath(Path(file))
             self.generate_preview_listener(None)
+            self.preview_all_orientations_listener(None)
+            self.extract_listener(names=[], paths=[])
 
         return
 
@@ -90,8 +131,10 @@ class RawRplView(ttk.Frame):
         )
 
         if file:
+            self.stop_quick_preview()
             self.set_rpl_filepath(Path(file))
             self.generate_preview_listener(None)
+            self.preview_all_orientations_listener(None)
 
         return
 
@@ -158,10 +201,129 @@ class RawRplView(ttk.Frame):
                 "<raw_filename>.preview.png."
             )
         )
+
+        row += 1
+        col = 1
+        text = "Quick Preview"
+        button = ttk.Button(
+            frame,
+            text=text,
+            command=self.quick_preview,
+        )
+        button.grid(
+            sticky="we",
+            column=col, row=row,
+            padx=(self._pad[0], 0), pady=(self._pad[1], 0),
+        )
+        Tooltip(
+            button,
+            text=(
+                "Show a preview from a sample of the pixels of the RAW within seconds "
+                "to check the orientation, and refine it in the background until it is "
+                "exact. Nothing is saved."
+            )
+        )
+
+        row += 1
+        col = 0
+        label = LabelText(master=frame, text="", justify="right")
+        label.grid(
+            sticky="e",
+            column=col, row=row,
+            padx=0, pady=0,
+        )
+        self.preview_all_orientations_label = label
+
+        col = 1
+        text = "Preview All Orientations"
+        button = ttk.Button(
+            frame,
+            text=text,
+            command=self.preview_all_orientations,
+        )
+        button.grid(
+            sticky="we",
+            column=col, row=row,
+            padx=(self._pad[0], 0), pady=(self._pad[1], 0),
+        )
+        Tooltip(
+            button,
+            text=(
+                "Create one PNG of the previews of the RAW rotated by 0°, 90°, 180° "
+                "and 270° from left to right, from a single pass over the RAW, and "
+                "save as <raw_filename>.orientations.png."
+            )
+        )
+
+        row += 1
+        col = 0
+        label = LabelText(master=frame, text="", justify="right")
+        label.grid(
+            sticky="e",
+            column=col, row=row,
+            padx=0, pady=0,
+        )
+        self.extract_label = label
+
+        col = 1
+        text = "Extract Element Maps..."
+        button = ttk.Button(
+            frame,
+            text=text,
+            command=self.extract,
+        )
+        button.grid(
+            sticky="we",
+            column=col, row=row,
+            padx=(self._pad[0], 0), pady=(self._pad[1], 0),
+        )
+        Tooltip(
+            button,
+            text=(
+                "Integrate windows of channels (e.g. of elements) into maps in a "
+                "single pass over the RAW, and save each as "
+                "<raw_filename>_<window name>.png."
+            )
+        )
+
+        row += 1
+        self.stretch_var = tk.IntVar(master=self, value=0)
+        checkbutton = ttk.Checkbutton(
+            frame,
+            text=(
+                f"Stretch contrast ({STRETCH_PERCENTILES[0]}–"
+                f"{STRETCH_PERCENTILES[1]}%)"
+            ),
+            variable=self.stretch_var,
+            onvalue=1,
+            offvalue=0,
+            command=lambda v=self.stretch_var: [
+                setattr(
+                    self.model,
+                    "stretch",
+                    STRETCH_PERCENTILES if v.get() else None,
+                ),
+            ],
+        )
+        checkbutton.grid(
+            sticky="e",
+            row=row,
+            column=0,
+            columnspan=2,
+            padx=0, pady=0,
+        )
+        Tooltip(
+            checkbutton,
+            text=(
+                "Scale the previews and maps from their low to their high percentile "
+                "instead of from their minimum to their maximum, so that a few hot "
+                "pixels do not darken the whole image."
+            )
+        )
         return
 
     def draw_transform_buttons(self, row: int) -> None:
-        """Draw the transform frame and rotate subframe."""
+        """Draw the transform frame with flip and rotate subframes."""
         transform_frame = ttk.Frame(master=self)
         transform_frame.grid(
             sticky="ew",
@@ -180,6 +342,39 @@ class RawRplView(ttk.Frame):
             padx=0, pady=(0, self._pad[1]),
         )
 
+        transform_row += 1
+        frame = ttk.LabelFrame(master=transform_frame, text="Flip")
+        frame.grid(
+            sticky="ew",
+            column=0, row=transform_row,
+            padx=0,
+            pady=(0, self._pad[1]),
+        )
+        frame.grid_rowconfigure(0, weight=1)
+        frame.grid_columnconfigure(0, weight=1)
+        row = -1
+
+        for key, value in self.flips.items():
+            row += 1
+            radiobutton = ttk.Radiobutton(
+                frame,
+                text=key,
+                variable=self.flips_key,
+                value=key,
+                command=lambda v=value: [
+                    setattr(
+                        self.model,
+                        "flip",
+                        v["transform"],
+                    ),
+                ],
+            )
+            radiobutton.grid(sticky="w", column=0, row=row)
+            Tooltip(
+                radiobutton,
+                text=value["description"]
+            )
+
         transform_row += 1
         frame = ttk.LabelFrame(master=transform_frame, text="Rotate counterclockwise")
         frame.grid(
@@ -199,11 +394,11 @@ class RawRplView(ttk.Frame):
                 text=key,
                 variable=self.rotations_key,
                 value=key,
-                command=lambda k=self.rotations_key: [
+                command=lambda v=value: [
                     setattr(
                         self.model,
                         "rotate_turns",
-                        value["turns"],
+                        v["turns"],
                     ),
                 ],
             )
@@ -224,6 +419,40 @@ class RawRplView(ttk.Frame):
         frame.grid_columnconfigure(0, weight=1)
         row = -1
 
+        row += 1
+        self.transform_in_place_var = tk.IntVar(master=self, value=0)
+        checkbutton = ttk.Checkbutton(
+            frame,
+            text="Transform in place (180° and flips only)",
+            variable=self.transform_in_place_var,
+            onvalue=1,
+            offvalue=0,
+            command=lambda v=self.transform_in_place_var: [
+                setattr(
+                    self.model,
+                    "in_place",
+                    bool(v.get()),
+                ),
+            ],
+        )
+        checkbutton.grid(
+            sticky="w",
+            row=row,
+            column=0,
+            columnspan=2,
+            padx=0, pady=0,
+        )
+        Tooltip(
+            checkbutton,
+            text=(
+                "Overwrite the RAW itself instead of saving a copy, which saves "
+                "disk space. Only for transforms which keep the shape: 180° and flips. "
+                "A journal is kept next to the RAW so that an interrupted "
+                "transform can be resumed or rolled back. No preview is generated when "
+                "in place."
+            )
+        )
+
         row += 1
         self.generate_transform_preview = tk.IntVar(master=self, value=1)
         col = 0
@@ -266,9 +495,11 @@ class RawRplView(ttk.Frame):
             frame,
             text=text,
             command=lambda p=self.generate_transform_preview: [
-                self.transform_and_save_copy(preview=bool(p.get())),
+                self.transform_in_place() if self.model.in_place
+                else self.transform_and_save_copy(preview=bool(p.get())),
             ]
         )
+        self.transform_button = button
         button.grid(
             sticky="e",
             column=1, row=row,
@@ -391,6 +622,55 @@ class RawRplView(ttk.Frame):
 
     def rotate_turns_listener(self, turns: int) -> None:
         """Listener for RawRplModel.rotate_turns."""
+        self.enable_transform_button()
+        return
+
+    def flip_listener(self, flip: Transform) -> None:
+        """Listener for RawRplModel.flip."""
+        self.enable_transform_button()
+        return
+
+    def enable_transform_button(self) -> None:
+        """Disable the transform button if there is no rotation or flip to apply."""
+        identity = self.model.transform == Transform()
+        self.transform_button.configure(state="disabled" if identity else "normal")
+        return
+
+    def in_place_listener(self, in_place: bool) -> None:
+        """Listener for RawRplModel.in_place."""
+        text = "Transform In Place" if in_place else "Transform & Save Copy"
+        self.transform_button.configure(text=text)
+        return
+
+    def workers_listener(self, workers: int) -> None:
+        """Listener for RawRplModel.workers."""
+        return
+
+    def stretch_listener(self, stretch: tuple[float, float] | None) -> None:
+        """Listener for RawRplModel.stretch."""
+        self.stretch_var.set(int(stretch is not None))
+        return
+
+    def cache_listener(self, cache: bool) -> None:
+        """Listener for RawRplModel.cache."""
+        return
+
+    def cache_dir_listener(self, path: PathOrNone) -> None:
+        """Listener for RawRplModel.cache_dir."""
+        return
+
+    def windows_listener(self, windows: Windows) -> None:
+        """Listener for RawRplModel.windows."""
+        return
+
+    def extract_listener(self, names: list[str], paths: list[Path]) -> None:
+        """Listener for RawRplModel.extract."""
+        if names:
+            n = len(names)
+            text = f"({n}) " + ", ".join(names)
+        else:
+            text = ""
+        self.extract_label.set_text(text=text)
         return
 
     def generate_preview_listener(self, path: PathOrNone) -> None:
@@ -399,27 +679,189 @@ class RawRplView(ttk.Frame):
         self.generate_preview_label.set_text(text=text)
         return
 
-    def generate_preview(self) -> PathOrNone:
-        """Generate a preview with the model."""
-        filepath = None
+    def generate_preview(self) -> None:
+        """Generate a preview with the model in the background."""
+        def done(filepath: PathOrNone) -> None:
+            self.generate_preview_listener(filepath)
+            message = f"Preview generated:\n\n{filepath}"
+            messagebox.showinfo(TITLE, message,)
 
-        dialog = set_window_icon(
-            ModalLoadingDialog(master=self, text="Generating preview from RAW-RPL...")
+        def failed(error: Exception) -> None:
+            message = f"Error while generating preview:\n\n{str(error)}"
+            messagebox.showerror(TITLE, message,)
+            self.generate_preview_listener(None)
+
+        run_with_loading_dialog(
+            self,
+            "Generating preview from RAW-RPL...",
+            self.model.generate_preview,
+            done,
+            failed,
+            on_cancelled=lambda: self.generate_preview_listener(None),
         )
-        dialog.update()  # Works, but I really should multi-thread with root.after()...
+        return
+
+    def preview_all_orientations_listener(self, path: PathOrNone) -> None:
+        """Listener for RawRplModel.preview_all_orientations."""
+        text = path.name if path else ""
+        self.preview_all_orientations_label.set_text(text=text)
+        return
+
+    def preview_all_orientations(self) -> None:
+        """Generate a preview of all four rotations with the model in the background."""
+        def done(filepath: PathOrNone) -> None:
+            self.preview_all_orientations_listener(filepath)
+            message = f"Previews of all orientations generated:\n\n{filepath}"
+            messagebox.showinfo(TITLE, message,)
+
+        def failed(error: Exception) -> None:
+            message = f"Error while generating previews:\n\n{str(error)}"
+            messagebox.showerror(TITLE, message,)
+            self.preview_all_orientations_listener(None)
+
+        run_with_loading_dialog(
+            self,
+            "Generating previews of all orientations...",
+            self.model.preview_all_orientations,
+            done,
+            failed,
+            on_cancelled=lambda: self.preview_all_orientations_listener(None),
+        )
+        return
+
+    def extract(self) -> None:
+        """Ask for windows of channels and extract their maps with the model."""
+        text = simpledialog.askstring(
+            TITLE,
+            (
+                "Windows of channels to integrate into maps, as "
+                "<name>: <start>-<stop> separated by ';'\n"
+                "(start included, stop excluded):"
+            ),
+            initialvalue=format_windows(self.model.windows),
+            parent=self,
+        )
+        if text is None:
+            return
         try:
-            filepath = self.model.generate_preview()
+            self.model.windows = parse_windows(text)
+        except ValueError as error:
+            messagebox.showerror(TITLE, f"Invalid windows:\n\n{str(error)}",)
+            return
+
+        def done(result: tuple[list[str], list[Path]]) -> None:
+            names, paths = result
+            self.extract_listener(names=names, paths=paths)
+            n = len(names)
+            message = (
+                f"{n} map{'' if n == 1 else 's'} extracted:\n\n"
+                f"{'\n'.join(str(path) for path in paths)}"
+            )
+            messagebox.showinfo(TITLE, message,)
+
+        def failed(error: Exception) -> None:
+            message = f"Error while extracting maps:\n\n{str(error)}"
+            messagebox.showerror(TITLE, message,)
+            self.extract_listener(names=[], paths=[])
+
+        run_with_loading_dialog(
+            self,
+            "Extracting maps from RAW-RPL...",
+            self.model.extract,
+            done,
+            failed,
+            on_cancelled=lambda: self.extract_listener(names=[], paths=[]),
+        )
+        return
+
+    def quick_preview(self) -> None:
+        """Show quick previews with the model in a window as they refine.
+
+        A quick preview still refining is cancelled first, and waited for, so that at
+        most one pass over a RAW runs at a time.
+        """
+        self.stop_quick_preview()
+        if self.quick_preview_thread is not None:
+            self.quick_preview_thread.join()  # Cancelled at its next band
+            self.quick_preview_thread = None
+        try:
+            previews = self.model.quick_previews()
         except Exception as error:
-            message = f"Error while generating preview:\n\n{str(error)}"
+            message = f"Error while generating quick preview:\n\n{str(error)}"
             messagebox.showerror(TITLE, message,)
-            self.generate_preview_label.set_text("")
-        else:
-            message = f"Preview generated:\n\n{filepath}"
-            messagebox.showinfo(TITLE, message,)
+            return
+
+        window = set_window_icon(ImageWindow(master=self, title="Quick Preview"))
+        window.caption.configure(text="Sampling RAW...")
+        window.protocol("WM_DELETE_WINDOW", self.stop_quick_preview)
+        self.quick_preview_window = window
+
+        stop = threading.Event()
+        self.quick_preview_stop = stop
+        self.quick_preview_queue = queue.Queue()
+        self.quick_preview_thread = threading.Thread(
+            target=self.run_quick_previews,
+            args=(previews, self.quick_preview_queue, stop),
+            daemon=True,
+        )
+        self.quick_preview_thread.start()
+        self.after(100, self.poll_quick_previews, self.quick_preview_queue)
+        return
+
+    @staticmethod
+    def run_quick_previews(
+        previews: Iterator[tuple[int, np.ndarray]],
+        results: queue.Queue,
+        stop: threading.Event,
+    ) -> None:
+        """Encode quick previews for display as they refine, outside the GUI thread.
+
+        Once `stop` is set, the pass over the RAW is cancelled at its next band (see
+        `cancellable`), not only between previews.
+        """
+        try:
+            with cancellable(stop):
+                for stride, image in previews:
+                    if stop.is_set():
+                        break
+                    results.put((stride, photo_image_data(image, QUICK_PREVIEW_EDGE)))
+        except Cancelled:
+            pass
+        except Exception as error:
+            results.put((0, error))
         finally:
-            dialog.destroy()
+            previews.close()  # type: ignore (generator)
+            results.put(None)
+
+    def poll_quick_previews(self, results: queue.Queue) -> None:
+        """Show the quick previews arrived so far and poll again until done."""
+        window = self.quick_preview_window
+        if results is not self.quick_preview_queue or window is None:
+            return  # Stopped or superseded
+        while not results.empty():
+            result = results.get()
+            if result is None:
+                return
+            stride, data = result
+            if isinstance(data, Exception):
+                window.caption.configure(text=f"Error: {data}")
+            elif stride == 1:
+                window.set_image(data, text="Exact preview")
+            else:
+                window.set_image(
+                    data,
+                    text=f"1 in {stride}x{stride} pixels sampled, refining...",
+                )
+        self.after(100, self.poll_quick_previews, results)
+        return
 
-        return filepath
+    def stop_quick_preview(self) -> None:
+        """Stop refining the quick preview and close its window."""
+        self.quick_preview_stop.set()
+        if self.quick_preview_window is not None:
+            self.quick_preview_window.destroy()
+            self.quick_preview_window = None
+        return
 
     def transform_and_save_copy_listener(
         self,
@@ -437,59 +879,117 @@ class RawRplView(ttk.Frame):
         self.transform_label.set_text(text)
         return
 
-    def transform_and_save_copy(
-        self,
-        preview: bool = True,
-    ) -> tuple[PathOrNone, PathOrNone, PathOrNone]:
-        """Transform and save a RAW-RPL copy with an optional preview with the model."""
-        raw_tr: PathOrNone = None
-        rpl_tr: PathOrNone = None
-        preview_tr: PathOrNone = None
+    def transform_and_save_copy(self, preview: bool = True) -> None:
+        """Transform and save a RAW-RPL copy with an optional preview with the model.
 
-        dialog = set_window_icon(
-            ModalLoadingDialog(master=self, text="Transforming and saving RAW-RPL...")
-        )
-        dialog.update()
-        try:
-            raw_tr, rpl_tr = self.model.transform_and_save_copy()
-        except Exception as error:
-            message = f"Error while transforming and saving RAW-RPL:\n\n{str(error)}"
-            messagebox.showerror(TITLE, message,)
+        Runs in the background. If cancelled, the partial copy is removed.
+        """
+        def done(paths: tuple[PathOrNone, PathOrNone, PathOrNone]) -> None:
+            raw_tr, rpl_tr, preview_tr = paths
             self.transform_and_save_copy_listener(raw_tr, rpl_tr, preview_tr)
-            return raw_tr, rpl_tr, preview_tr
-        else:
             message = f"Transformed RAW-RPL saved:\n\n{raw_tr}\n{rpl_tr}"
+            if preview_tr:
+                message += f"\n\nPreview of transformed RAW-RPL:\n\n{preview_tr}"
             messagebox.showinfo(TITLE, message,)
-        finally:
-            dialog.destroy()
 
-        if preview:
-            dialog = set_window_icon(
-                ModalLoadingDialog(
-                    master=self,
-                    text="Generating preview of transformed RAW-RPL..."
-                )
+        def failed(error: Exception) -> None:
+            message = f"Error while transforming and saving RAW-RPL:\n\n{str(error)}"
+            messagebox.showerror(TITLE, message,)
+            self.transform_and_save_copy_listener(None, None, None)
+
+        def cancelled() -> None:
+            self.transform_and_save_copy_listener(None, None, None)
+            message = "Cancelled. A partial copy, if any, was removed."
+            messagebox.showinfo(TITLE, message,)
+
+        def transform() -> tuple[PathOrNone, PathOrNone, PathOrNone]:
+            if preview:
+                # Fused: the preview is of statistics accumulated while writing
+                return self.model.transform_and_save_copy_with_preview()
+            return *self.model.transform_and_save_copy(), None
+
+        text = "Transforming and saving RAW-RPL"
+        run_with_loading_dialog(
+            self,
+            f"{text} with preview..." if preview else f"{text}...",
+            transform,
+            done,
+            failed,
+            cancelled,
+        )
+        return
+
+    def transform_in_place(self) -> None:
+        """Transform the RAW in place with the model, first offering to recover.
+
+        Runs in the background. If cancelled, it stops between steps as if
+        interrupted, so it can be resumed or rolled back the next time.
+        """
+        def cancelled() -> None:
+            message = (
+                "Transform in place cancelled. Transform in place again to resume or "
+                "roll it back."
             )
-            dialog.update()
-            try:
-                model = RawRplModel()
-                model.raw_filepath = raw_tr
-                model.rpl_filepath = rpl_tr
-                preview_tr = model.generate_preview()
-            except Exception as error:
-                message = (
-                    "Error while generating preview of transformed RAW-RPL:\n\n"
-                    f"{str(error)}"
-                )
-                messagebox.showerror(TITLE, message,)
-                self.transform_and_save_copy_listener(raw_tr, rpl_tr, preview_tr)
-                return raw_tr, rpl_tr, preview_tr
-            else:
-                message = f"Preview of transformed RAW-RPL generated:\n\n{preview_tr}"
+            messagebox.showinfo(TITLE, message,)
+
+        if journal := self.model.in_place_journal:
+            answer = messagebox.askyesnocancel(
+                TITLE,
+                (
+                    "A previous transform in place was interrupted:\n\n"
+                    f"{journal}\n\n"
+                    "Yes: resume it.\n"
+                    "No: roll it back to the original.\n"
+                    "Cancel: do nothing."
+                ),
+            )
+            if answer is None:
+                return
+            text = "Resuming" if answer else "Rolling back"
+
+            def recovered(filepath: PathOrNone) -> None:
+                done = "resumed" if answer else "rolled back"
+                message = f"Transform in place {done}:\n\n{filepath}"
                 messagebox.showinfo(TITLE, message,)
-            finally:
-                dialog.destroy()
 
-        self.transform_and_save_copy_listener(raw_tr, rpl_tr, preview_tr)
+            def recovery_failed(error: Exception) -> None:
+                message = f"Error while recovering transform in place:\n\n{str(error)}"
+                messagebox.showerror(TITLE, message,)
+
+            # A roll back is not cancellable, to always end in the original
+            run_with_loading_dialog(
+                self,
+                f"{text} transform in place...",
+                lambda: self.model.recover_in_place(resume=bool(answer)),
+                recovered,
+                recovery_failed,
+                cancelled if answer else None,
+            )
+            return
+
+        def done(filepath: PathOrNone) -> None:
+            message = f"RAW transformed in place:\n\n{filepath}"
+            messagebox.showinfo(TITLE, message,)
+
+        def failed(error: Exception) -> None:
+            message = f"Error while transforming RAW in place:\n\n{str(error)}"
+            messagebox.showerror(TITLE, message,)
+
+        run_with_loading_dialog(
+            self,
+            "Transforming RAW in place...",
+            self.model.transform_in_place,
+            done,
+            failed,
+            cancelled,
+        )
+        return
+
 
-        return raw_tr, rpl_tr, preview_tr
+def photo_image_data(image: np.ndarray, max_edge: int) -> bytes:
+    """Encode an 8-bit image as PNG for `tk.PhotoImage`, subsampled to a max edge."""
+    step = max(1, -(-max(image.shape) // max_edge))
+    image = np.ascontiguousarray(image[::step, ::step])
+    buffer = io.BytesIO()
+    png.from_array(image, mode='L;8').write(buffer)
+    return base64.b64encode(buffer.getvalue())
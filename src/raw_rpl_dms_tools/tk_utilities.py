@@ -1,6 +1,6 @@
 """Utilities for tkinter, including a Tooltip."""
 
-from typing import Literal
+from typing import Callable, Literal
 
 import tkinter as tk
 from tkinter import ttk, font
@@ -236,12 +236,18 @@ class ModalDialog(tk.Toplevel):
 
 
 class ModalLoadingDialog(ModalDialog):
-    """Convenience ModalDialog with an indeterminate ttk.Progressbar and text."""
+    """Convenience ModalDialog with an indeterminate ttk.Progressbar and text.
+
+    With `cancel`, a Cancel button (and closing the dialog) calls it once, e.g. to set
+    the cancel event of a `BackgroundTask`, and the dialog then waits to be destroyed
+    by its owner. Without, closing the dialog does nothing while it is shown.
+    """
     def __init__(
         self,
         *args,
         text: str = "Loading...",
         auto_start: bool = True,
+        cancel: Callable[[], None] | None = None,
         **kwargs
     ) -> None:
         super().__init__(*args, **kwargs)
@@ -253,9 +259,50 @@ class ModalLoadingDialog(ModalDialog):
         self.label.grid(row=0, column=0, sticky="e", padx=pad, pady=pad)
         self.progressbar = ttk.Progressbar(master=self, mode="indeterminate")
         self.progressbar.grid(row=0, column=1, sticky="w", padx=pad, pady=pad)
+        self.cancel_command = cancel
+        self.cancel_button: ttk.Button | None = None
+        if cancel is not None:
+            self.cancel_button = ttk.Button(
+                master=self, text="Cancel", command=self.cancel
+            )
+            self.cancel_button.grid(
+                row=1, column=0, columnspan=2, padx=pad, pady=(0, pad[1])
+            )
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
         if auto_start:
             self.start()
 
     def start(self, interval: int = 10) -> None:
         """Start the progressbar."""
         self.progressbar.start(interval=interval)
+
+    def cancel(self) -> None:
+        """Request to cancel once, if cancellable."""
+        if self.cancel_command is None or self.cancel_button is None:
+            return
+        if str(self.cancel_button.cget("state")) == "disabled":
+            return
+        self.cancel_button.configure(state="disabled")
+        self.label.configure(text="Cancelling...")
+        self.cancel_command()
+
+
+class ImageWindow(tk.Toplevel):
+    """Non-modal window showing a replaceable image with a caption."""
+    def __init__(self, *args, title: str = "Image", **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        pad: tuple[int, int] = (5, 5)
+        self.title(title)
+        self.grid_rowconfigure(index=0, weight=1)
+        self.grid_columnconfigure(index=0, weight=1)
+        self.image_label = ttk.Label(master=self)
+        self.image_label.grid(row=0, column=0, padx=pad, pady=pad)
+        self.caption = ttk.Label(master=self, text="")
+        self.caption.grid(row=1, column=0, sticky="w", padx=pad, pady=(0, pad[1]))
+        self.image: tk.PhotoImage | None = None
+
+    def set_image(self, data: str | bytes, text: str = "") -> None:
+        """Show an image from its data (e.g. base64-encoded PNG) and caption it."""
+        self.image = tk.PhotoImage(master=self, data=data)
+        self.image_label.configure(image=self.image)
+        self.caption.configure(text=text)
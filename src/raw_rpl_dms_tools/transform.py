@@ -1,5 +1,7 @@
 """Transform constants."""
 
+from maxrf4u_lite.storage import Transform
+
 ROTATIONS = {
     "90°": {
         "turns": 1,
@@ -11,3 +13,18 @@ ROTATIONS = {
         "turns": 3,
     },
 }
+
+FLIPS = {
+    "None": {
+        "transform": Transform(),
+        "description": "Do not flip.",
+    },
+    "Horizontal": {
+        "transform": Transform.flip_horizontal(),
+        "description": "Flip horizontally (mirror left-right) before rotating.",
+    },
+    "Vertical": {
+        "transform": Transform.flip_vertical(),
+        "description": "Flip vertically (mirror top-bottom) before rotating.",
+    },
+}
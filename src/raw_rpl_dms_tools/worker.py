@@ -0,0 +1,142 @@
+"""Background worker running model operations outside of the GUI thread."""
+
+import queue
+import threading
+from typing import Callable, Generic, TypeVar
+
+import tkinter as tk
+
+from raw_rpl_dms_tools.tk_utilities import ModalLoadingDialog
+from raw_rpl_dms_tools.icon import set_window_icon
+from maxrf4u_lite.storage import Cancelled, cancellable
+
+POLL_MS: int = 100
+"""Interval in milliseconds at which the GUI thread polls for the outcome of a task."""
+
+R = TypeVar("R")
+
+
+class BackgroundTask(Generic[R]):
+    """Run a function on a background thread and handle its outcome in the GUI thread.
+
+    The function runs within `cancellable` (see `maxrf4u_lite.storage`), so once
+    `cancel` is called, it raises `Cancelled` at its next check. Its result, error or
+    cancellation is put on a queue, which the GUI thread polls with `after()`, so the
+    window stays responsive and `on_done`, `on_error` or `on_cancelled` are called in
+    the GUI thread, where they may update widgets.
+
+    The function itself must not update widgets, e.g. by signaling a model's observers
+    (see `Signaler`), since tkinter is not thread-safe. This is why the model operations
+    run this way (e.g. `RawRplModel.extract` and `DmsModel.extract`) return their
+    results instead of signaling them, and the view shows them in `on_done`.
+
+    ```
+    task = BackgroundTask(
+        root, model.extract, on_done=show_paths, on_error=show_error,
+    ).start()
+    cancel_button.configure(command=task.cancel)
+    ```
+
+    Args:
+        widget: Widget whose `after()` polls for the outcome.
+        function: Function to run, without arguments.
+        on_done: Called with the result of the function.
+        on_error: Called with the exception raised by the function.
+        on_cancelled: Called if the function was cancelled, else nothing is.
+        poll_ms: Interval in milliseconds at which to poll for the outcome.
+    """
+    def __init__(
+        self,
+        widget: tk.Misc,
+        function: Callable[[], R],
+        on_done: Callable[[R], None],
+        on_error: Callable[[Exception], None],
+        on_cancelled: Callable[[], None] | None = None,
+        poll_ms: int = POLL_MS,
+    ) -> None:
+        self.widget = widget
+        self.function = function
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancelled = on_cancelled
+        self.poll_ms = poll_ms
+        self.cancel_event = threading.Event()
+        self.outcomes: queue.Queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self) -> "BackgroundTask[R]":
+        """Start the function on its thread and poll for its outcome."""
+        self.thread.start()
+        self.widget.after(self.poll_ms, self.poll)
+        return self
+
+    def cancel(self) -> None:
+        """Request the function to stop at its next check, from any thread."""
+        self.cancel_event.set()
+        return
+
+    def run(self) -> None:
+        """Run the function and put its outcome on the queue, outside the GUI thread."""
+        try:
+            with cancellable(self.cancel_event):
+                result = self.function()
+        except Cancelled:
+            self.outcomes.put(("cancelled", None))
+        except Exception as error:
+            self.outcomes.put(("error", error))
+        else:
+            self.outcomes.put(("done", result))
+        return
+
+    def poll(self) -> None:
+        """Handle the outcome if arrived, else poll again later."""
+        try:
+            outcome, value = self.outcomes.get_nowait()
+        except queue.Empty:
+            self.widget.after(self.poll_ms, self.poll)
+            return
+        if outcome == "done":
+            self.on_done(value)
+        elif outcome == "error":
+            self.on_error(value)
+        elif self.on_cancelled is not None:
+            self.on_cancelled()
+        return
+
+
+def run_with_loading_dialog(
+    master: tk.Misc,
+    text: str,
+    function: Callable[[], R],
+    on_done: Callable[[R], None],
+    on_error: Callable[[Exception], None],
+    on_cancelled: Callable[[], None] | None = None,
+) -> BackgroundTask[R]:
+    """Run a function as a `BackgroundTask` while showing a `ModalLoadingDialog`.
+
+    The dialog is destroyed before the outcome is handled. With `on_cancelled`, the
+    dialog has a Cancel button which cancels the task, else it cannot be cancelled.
+    """
+    dialog: ModalLoadingDialog
+
+    def closing(callback: Callable) -> Callable:
+        def close_and_call(*args) -> None:
+            dialog.destroy()
+            callback(*args)
+        return close_and_call
+
+    task = BackgroundTask(
+        master,
+        function,
+        on_done=closing(on_done),
+        on_error=closing(on_error),
+        on_cancelled=None if on_cancelled is None else closing(on_cancelled),
+    )
+    dialog = set_window_icon(  # type: ignore
+        ModalLoadingDialog(
+            master=master,
+            text=text,
+            cancel=None if on_cancelled is None else task.cancel,
+        )
+    )
+    return task.start()
@@ -0,0 +1,76 @@
+"""Fixtures of small synthetic RAW-RPL pairs and DMS files."""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+RPL = """\
+key\t value
+width\t {width}
+height\t {height}
+depth\t {depth}
+offset\t 0
+data-length\t 2
+data-type\t unsigned
+byte-order\t little-endian
+record-by\t vector
+"""
+
+NAMES = ["Fe K", "Cu K", "Pb L", "Pb M", "Hg L"]
+
+
+def write_raw_rpl(
+    folder: Path,
+    cube: np.ndarray,
+    stem: str = "scan",
+) -> tuple[Path, Path]:
+    """Write a cube of shape (height, width, depth) as a RAW-RPL pair of uint16."""
+    height, width, depth = cube.shape
+    raw_filepath = folder / f"{stem}.raw"
+    rpl_filepath = folder / f"{stem}.rpl"
+    rpl_filepath.write_text(RPL.format(width=width, height=height, depth=depth))
+    raw_filepath.write_bytes(cube.astype('<u2').tobytes())
+    return raw_filepath, rpl_filepath
+
+
+def write_dms(folder: Path, images: np.ndarray, names: list[str]) -> Path:
+    """Write images of shape (images, height, width) as a DMS of float32."""
+    amount, height, width = images.shape
+    dms_filepath = folder / "scan.dms"
+    with open(dms_filepath, 'wb') as file:
+        file.write(b"Datamuncher DMS\r\n")
+        file.write(f"  {width}  {height}  {amount}\r\n".encode('ascii'))
+        file.write(images.astype('<f4').tobytes())
+        file.writelines(f"{name}\r\n".encode('ascii') for name in names)
+    return dms_filepath
+
+
+@pytest.fixture
+def cube() -> np.ndarray:
+    """Cube of shape (height, width, depth) with a peak which varies over the pixels."""
+    height, width, depth = 23, 17, 48
+    rng = np.random.default_rng(0)
+    cube = rng.integers(0, 30, size=(height, width, depth), dtype=np.uint16)
+    rows, cols = np.mgrid[0:height, 0:width]
+    cube[:, :, depth // 2] += (50 + 7 * rows + 3 * cols).astype(np.uint16)
+    return cube
+
+
+@pytest.fixture
+def raw_rpl(tmp_path: Path, cube: np.ndarray) -> tuple[Path, Path]:
+    """RAW-RPL pair of the `cube`."""
+    return write_raw_rpl(tmp_path, cube)
+
+
+@pytest.fixture
+def images() -> np.ndarray:
+    """Stack of images of shape (images, height, width), not square."""
+    rng = np.random.default_rng(1)
+    return (rng.random((len(NAMES), 29, 41), dtype=np.float32) * 100).astype(np.float32)
+
+
+@pytest.fixture
+def dms(tmp_path: Path, images: np.ndarray) -> Path:
+    """DMS of the `images`."""
+    return write_dms(tmp_path, images, NAMES)
@@ -0,0 +1,173 @@
+"""Tests of transforms in place with a journal, and their resume and rollback."""
+
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from maxrf4u_lite import storage
+from maxrf4u_lite.storage import (
+    Cancelled,
+    Transform,
+    cancellable,
+    in_place_journal_filepath,
+    open_dms_file,
+    read_dms_images,
+    resume_in_place,
+    rollback_in_place,
+    transform_dms_in_place,
+    transform_raw_rpl_in_place,
+)
+
+IN_PLACE_TRANSFORMS = [
+    Transform.rotation(2),
+    Transform.flip_horizontal(),
+    Transform.flip_vertical(),
+]
+
+# Chunks of a few rows, so that a transform in place takes several steps
+CHUNK_BYTES = 3 * 17 * 48 * 2
+
+
+class Crash(Exception):
+    """Raised to interrupt a transform in place as if the process had died."""
+
+
+def crash_at_step(monkeypatch: pytest.MonkeyPatch, crash_step: int) -> None:
+    """Make a step of a transform in place write half of its rows, then crash."""
+    apply_in_place_step = storage.apply_in_place_step
+    steps = iter(range(1_000_000))
+
+    def crashing_step(
+        array: np.ndarray,
+        step: tuple[int, int, int, bool],
+        transform: Transform,
+    ) -> None:
+        if next(steps) < crash_step:
+            apply_in_place_step(array, step, transform)
+            return
+        for region in storage.in_place_step_regions(array, step):
+            region[:len(region) // 2] = 0xBEEF
+        array.flush()  # type: ignore
+        raise Crash
+
+    monkeypatch.setattr(storage, "apply_in_place_step", crashing_step)
+
+
+def read_raw(raw_filepath: Path, shape: tuple[int, ...]) -> np.ndarray:
+    """Read a RAW of uint16 of a shape."""
+    return np.fromfile(raw_filepath, dtype='<u2').reshape(shape)
+
+
+@pytest.mark.parametrize("transform", IN_PLACE_TRANSFORMS, ids=lambda t: t.name)
+def test_transform_raw_in_place(
+    raw_rpl: tuple[Path, Path],
+    cube: np.ndarray,
+    transform: Transform,
+) -> None:
+    """Test a RAW transformed in place equals the transform of its cube."""
+    transform_raw_rpl_in_place(*raw_rpl, transform, CHUNK_BYTES)
+    np.testing.assert_array_equal(
+        read_raw(raw_rpl[0], cube.shape), transform.apply(cube)
+    )
+    assert not in_place_journal_filepath(raw_rpl[0]).exists()
+
+
+@pytest.mark.parametrize("transform", IN_PLACE_TRANSFORMS, ids=lambda t: t.name)
+def test_transform_dms_in_place(
+    dms: Path,
+    images: np.ndarray,
+    transform: Transform,
+) -> None:
+    """Test the images of a DMS transformed in place equal their transforms."""
+    transform_dms_in_place(dms, transform, chunk_bytes=3 * 41 * 4)
+    dms_file = open_dms_file(dms)
+    np.testing.assert_array_equal(
+        read_dms_images(dms, dms_file.header_size, dms_file.dimensions),
+        transform.apply(images, axes=(1, 2)),
+    )
+
+
+def test_transform_in_place_refuses_swapping_axes(raw_rpl: tuple[Path, Path]) -> None:
+    """Test a transform which changes the shape is refused before writing anything."""
+    before = raw_rpl[0].read_bytes()
+    with pytest.raises(ValueError):
+        transform_raw_rpl_in_place(*raw_rpl, Transform.rotation(1))
+    assert raw_rpl[0].read_bytes() == before
+
+
+@pytest.mark.parametrize("crash_step", [0, 1, 3])
+@pytest.mark.parametrize("transform", IN_PLACE_TRANSFORMS, ids=lambda t: t.name)
+def test_interrupted_transform_in_place_resumes(
+    monkeypatch: pytest.MonkeyPatch,
+    raw_rpl: tuple[Path, Path],
+    cube: np.ndarray,
+    transform: Transform,
+    crash_step: int,
+) -> None:
+    """Test a transform in place which crashed mid-step resumes to the transform."""
+    crash_at_step(monkeypatch, crash_step)
+    with pytest.raises(Crash):
+        transform_raw_rpl_in_place(*raw_rpl, transform, CHUNK_BYTES)
+    assert in_place_journal_filepath(raw_rpl[0]).exists()
+    with pytest.raises(FileExistsError):
+        transform_raw_rpl_in_place(*raw_rpl, transform, CHUNK_BYTES)
+
+    monkeypatch.undo()
+    resume_in_place(raw_rpl[0])
+    np.testing.assert_array_equal(
+        read_raw(raw_rpl[0], cube.shape), transform.apply(cube)
+    )
+    assert not in_place_journal_filepath(raw_rpl[0]).exists()
+
+
+@pytest.mark.parametrize("crash_step", [0, 1, 3])
+@pytest.mark.parametrize("transform", IN_PLACE_TRANSFORMS, ids=lambda t: t.name)
+def test_interrupted_transform_in_place_rolls_back(
+    monkeypatch: pytest.MonkeyPatch,
+    raw_rpl: tuple[Path, Path],
+    transform: Transform,
+    crash_step: int,
+) -> None:
+    """Test a transform in place which crashed mid-step rolls back to the original."""
+    before = raw_rpl[0].read_bytes()
+    crash_at_step(monkeypatch, crash_step)
+    with pytest.raises(Crash):
+        transform_raw_rpl_in_place(*raw_rpl, transform, CHUNK_BYTES)
+
+    monkeypatch.undo()
+    rollback_in_place(raw_rpl[0])
+    assert raw_rpl[0].read_bytes() == before
+    assert not in_place_journal_filepath(raw_rpl[0]).exists()
+
+
+def test_cancelled_transform_in_place_resumes_and_rolls_back(
+    monkeypatch: pytest.MonkeyPatch,
+    raw_rpl: tuple[Path, Path],
+    cube: np.ndarray,
+) -> None:
+    """Test a transform in place cancelled after a step keeps its journal to recover."""
+    apply_in_place_step = storage.apply_in_place_step
+    cancel = threading.Event()
+
+    def cancelling_step(
+        array: np.ndarray,
+        step: tuple[int, int, int, bool],
+        transform: Transform,
+    ) -> None:
+        apply_in_place_step(array, step, transform)
+        cancel.set()
+
+    monkeypatch.setattr(storage, "apply_in_place_step", cancelling_step)
+    before = raw_rpl[0].read_bytes()
+    for recover in (rollback_in_place, resume_in_place):
+        cancel.clear()
+        with pytest.raises(Cancelled), cancellable(cancel):
+            transform_raw_rpl_in_place(*raw_rpl, Transform.rotation(2), CHUNK_BYTES)
+        assert in_place_journal_filepath(raw_rpl[0]).exists()
+        assert raw_rpl[0].read_bytes() != before
+        recover(raw_rpl[0])
+        if recover is rollback_in_place:
+            assert raw_rpl[0].read_bytes() == before
+    np.testing.assert_array_equal(read_raw(raw_rpl[0], cube.shape), np.rot90(cube, 2))
@@ -0,0 +1,74 @@
+"""Tests of the PNG encoders, which must give the same pixels whatever the backend."""
+
+from pathlib import Path
+
+import numpy as np
+import png
+import pytest
+
+from maxrf4u_lite.storage import (
+    STRETCH_PERCENTILES,
+    encode_png_blocks,
+    save_dms_image,
+    write_png,
+)
+
+
+def read_png(path: Path) -> tuple[np.ndarray, dict]:
+    """Read a grayscale PNG with pypng as an array and its info."""
+    width, height, rows, info = png.Reader(filename=str(path)).read()
+    return np.array(list(rows)).reshape(height, width), info
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16])
+@pytest.mark.parametrize("compression", [None, 0, 9])
+def test_zlib_png_has_pixels_of_pypng(
+    tmp_path: Path,
+    dtype: type,
+    compression: int | None,
+) -> None:
+    """Test the zlib backend writes the same pixels, bit-depth and size as pypng."""
+    image = np.random.default_rng(0).integers(
+        0, np.iinfo(dtype).max, (37, 53), endpoint=True, dtype=dtype
+    )
+    paths = {backend: tmp_path / f"{backend}.png" for backend in ("pypng", "zlib")}
+    for backend, path in paths.items():
+        write_png(image, path, compression, backend)  # type: ignore
+
+    for path in paths.values():
+        pixels, info = read_png(path)
+        np.testing.assert_array_equal(pixels, image)
+        assert info["bitdepth"] == 8 * np.dtype(dtype).itemsize
+        assert info["greyscale"]
+
+
+def test_encode_png_blocks_of_any_rows(tmp_path: Path) -> None:
+    """Test an image encoded from blocks of uneven rows has the pixels of the image."""
+    image = np.arange(30 * 7, dtype=np.uint16).reshape(30, 7) * 300
+    blocks = [image[:1], image[1:13], image[13:30]]
+    path = tmp_path / "blocks.png"
+    path.write_bytes(b"".join(encode_png_blocks(blocks, 7, 30, 16)))
+    np.testing.assert_array_equal(read_png(path)[0], image)
+
+
+@pytest.mark.parametrize("bitdepth", [8, 16])
+@pytest.mark.parametrize("stretch", [None, STRETCH_PERCENTILES])
+def test_save_dms_image_backends_agree(
+    tmp_path: Path,
+    images: np.ndarray,
+    bitdepth: int,
+    stretch: tuple[float, float] | None,
+) -> None:
+    """Test a DMS image saved by either backend has the same normalized pixels."""
+    image = images[0].copy()
+    image[0, :3] = [np.nan, np.inf, -np.inf]
+    pixels = []
+    for backend in ("pypng", "zlib"):
+        path = tmp_path / f"{backend}.png"
+        save_dms_image(
+            image, path, bitdepth, stretch, backend=backend  # type: ignore
+        )
+        pixels.append(read_png(path)[0])
+    np.testing.assert_array_equal(pixels[0], pixels[1])
+    assert pixels[0].max() == 2 ** (bitdepth - 1)
+    assert pixels[0][0, 0] == 0  # NaN
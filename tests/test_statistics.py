@@ -0,0 +1,130 @@
+"""Tests of the histograms and the cached statistics of a RAW for its previews."""
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from maxrf4u_lite import storage
+from maxrf4u_lite.storage import (
+    Histogram,
+    load_statistics,
+    raw_statistics,
+    statistics_cache_filepath,
+)
+
+
+def test_histogram_grows_by_doubling() -> None:
+    """Test values beyond the bins double their width, keeping all counts."""
+    histogram = Histogram(bins=8)
+    histogram.add(np.array([0, 1, 7]))
+    assert histogram.width == 1
+    histogram.add(np.array([30, np.nan, -1]))
+    assert histogram.width == 4
+    assert histogram.counts.tolist() == [2, 1, 0, 0, 0, 0, 0, 1]
+
+
+def test_histogram_merge_of_other_width() -> None:
+    """Test merging histograms of widths a power of two apart adds all counts."""
+    values = np.random.default_rng(0).integers(0, 1000, 500)
+    narrow, wide, whole = Histogram(bins=64), Histogram(bins=64), Histogram(bins=64)
+    narrow.add(values[values < 50])
+    wide.add(values[values >= 50])
+    whole.add(values)
+    narrow.merge(wide)
+    assert narrow.width == whole.width
+    np.testing.assert_array_equal(narrow.counts, whole.counts)
+
+
+def test_histogram_locate() -> None:
+    """Test locating the bin of a percentile and the counts before and in it."""
+    histogram = Histogram(bins=4)
+    histogram.add(np.array([0, 1, 1, 2, 2, 2, 3, 3, 3, 3]))
+    assert histogram.locate(0) == (0, 0, 1)
+    assert histogram.locate(50) == (2, 3, 3)
+    assert histogram.locate(100) == (3, 6, 4)
+
+
+def assert_statistics_equal(
+    a: storage.PreviewStatistics,
+    b: storage.PreviewStatistics,
+) -> None:
+    """Assert the spectra, maps and window maps of statistics are equal."""
+    np.testing.assert_array_equal(a.max_spectrum, b.max_spectrum)
+    np.testing.assert_array_equal(a.sum_spectrum, b.sum_spectrum)
+    np.testing.assert_array_equal(a.total_counts, b.total_counts)
+    assert a.window_sums.keys() == b.window_sums.keys()
+    for window, window_sum in a.window_sums.items():
+        np.testing.assert_array_equal(window_sum, b.window_sums[window])
+
+
+@pytest.mark.parametrize("central", [False, True])
+def test_statistics_of_cube(
+    tmp_path: Path,
+    raw_rpl: tuple[Path, Path],
+    cube: np.ndarray,
+    central: bool,
+) -> None:
+    """Test statistics of a RAW, and that those of its cache file are the same."""
+    cache_dir = tmp_path / "cache" if central else None
+    statistics = raw_statistics(*raw_rpl, workers=2, cache=True, cache_dir=cache_dir)
+    np.testing.assert_array_equal(statistics.max_spectrum, cube.max(axis=(0, 1)))
+    np.testing.assert_array_equal(statistics.sum_spectrum, cube.sum(axis=(0, 1)))
+    np.testing.assert_array_equal(statistics.total_counts, cube.sum(axis=2))
+    assert statistics_cache_filepath(raw_rpl[0], cache_dir).is_file()
+
+    cached = load_statistics(*raw_rpl, cache_dir)
+    assert cached is not None
+    assert_statistics_equal(cached, statistics)
+
+
+def test_cache_of_changed_raw_is_invalid(raw_rpl: tuple[Path, Path]) -> None:
+    """Test the cache file is not used once the RAW is overwritten."""
+    raw_statistics(*raw_rpl, cache=True)
+    assert load_statistics(*raw_rpl) is not None
+
+    data = bytearray(raw_rpl[0].read_bytes())
+    data[0] ^= 1
+    raw_rpl[0].write_bytes(data)
+    stat = raw_rpl[0].stat()
+    os.utime(raw_rpl[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert load_statistics(*raw_rpl) is None
+
+
+def test_cache_of_changed_rpl_is_invalid(raw_rpl: tuple[Path, Path]) -> None:
+    """Test the cache file is not used once the RPL is changed."""
+    raw_statistics(*raw_rpl, cache=True)
+    raw_rpl[1].write_text(raw_rpl[1].read_text().replace("unsigned", "unsigned "))
+    assert load_statistics(*raw_rpl) is None
+
+
+def test_statistics_of_raw_changed_while_read_are_not_cached(
+    monkeypatch: pytest.MonkeyPatch,
+    raw_rpl: tuple[Path, Path],
+) -> None:
+    """Test statistics are not cached if the RAW changed during their pass."""
+    reduce = storage.PreviewStatistics.reduce
+
+    def reduce_while_changing(
+        self: storage.PreviewStatistics,
+        rows: slice,
+        band: np.ndarray,
+    ) -> object:
+        os.utime(raw_rpl[0], ns=(1, 1))
+        return reduce(self, rows, band)
+
+    monkeypatch.setattr(storage.PreviewStatistics, "reduce", reduce_while_changing)
+    raw_statistics(*raw_rpl, cache=True)
+    assert not statistics_cache_filepath(raw_rpl[0]).exists()
+
+
+def test_unwritable_cache_is_not_an_error(
+    tmp_path: Path,
+    raw_rpl: tuple[Path, Path],
+) -> None:
+    """Test statistics are still returned if the cache file cannot be written."""
+    cache_dir = tmp_path / "file"
+    cache_dir.write_text("not a folder")
+    statistics = raw_statistics(*raw_rpl, cache=True, cache_dir=cache_dir)
+    assert statistics.total_counts.sum() > 0
@@ -0,0 +1,78 @@
+"""Tests of the percentiles of an image by its histogram, as used to stretch it."""
+
+import numpy as np
+import pytest
+
+from maxrf4u_lite.storage import (
+    STRETCH_PERCENTILES,
+    Histogram,
+    image_histogram,
+    stretch_limits,
+)
+
+
+def assert_limits_close(image: np.ndarray, limits: tuple[float, float]) -> None:
+    """Assert limits within 0.1% of the percentile range of an image of numpy."""
+    expected = np.percentile(image, STRETCH_PERCENTILES)
+    tolerance = 1e-3 * (expected[1] - expected[0]) or 1e-6
+    np.testing.assert_allclose(limits, expected, rtol=0, atol=tolerance)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_stretch_limits_of_float_image(dtype: type) -> None:
+    """Test limits of a float image against the percentiles of numpy."""
+    image = np.random.default_rng(0).gamma(2, 3, (301, 257)).astype(dtype)
+    assert_limits_close(image, stretch_limits(image))
+
+
+def test_stretch_limits_of_integer_image_are_exact() -> None:
+    """Test limits of an integer map are its exact percentiles."""
+    image = np.random.default_rng(1).poisson(50, (300, 300)).astype(np.uint32)
+    limits = stretch_limits(image)
+    assert limits == tuple(np.percentile(image, STRETCH_PERCENTILES))
+
+
+@pytest.mark.parametrize(
+    "image, expected",
+    [
+        pytest.param(
+            np.random.default_rng(2).normal(10, 3, (300, 300)).astype(np.float32),
+            None,
+            id="float",
+        ),
+        pytest.param(
+            np.random.default_rng(3).poisson(50, (300, 300)).astype(np.uint32),
+            (33.0, 69.0),
+            id="uint",
+        ),
+        pytest.param(np.full((300, 300), 5, dtype=np.float32), (5.0, 5.0), id="flat"),
+    ],
+)
+def test_stretch_limits_ignore_hot_pixel(
+    image: np.ndarray,
+    expected: tuple[float, float] | None,
+) -> None:
+    """Test a single hot pixel orders of magnitude out does not widen the limits."""
+    image[5, 5] = 10 ** 9 if image.dtype.kind == 'u' else 1e10
+    limits = stretch_limits(image)
+    if expected is None:
+        assert_limits_close(image, limits)
+    else:
+        assert limits == expected
+
+
+def test_stretch_limits_of_given_histogram() -> None:
+    """Test limits from a histogram built elsewhere, e.g. while making a map."""
+    image = np.random.default_rng(4).poisson(200, (128, 96)).astype(np.uint32)
+    image[0, 0] = 10 ** 8
+    histogram = Histogram()
+    for rows in (slice(0, 50), slice(50, 128)):
+        histogram.add(image[rows])
+    assert stretch_limits(image, histogram=histogram) == stretch_limits(image)
+
+
+def test_stretch_limits_without_finite_values() -> None:
+    """Test an image without finite values gets empty limits."""
+    image = np.full((20, 30), np.nan, dtype=np.float32)
+    assert not image_histogram(image).counts.any()
+    assert stretch_limits(image) == (0.0, 0.0)
@@ -0,0 +1,150 @@
+"""Tests of the D4 transforms and the copies of RAWs and DMSs transformed by them."""
+
+import itertools
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from maxrf4u_lite.storage import (
+    Transform,
+    copy_tiled,
+    open_dms_file,
+    parse_rpl_keys,
+    read_dms_elemental_names,
+    read_dms_images,
+    read_rpl,
+    rot90_raw_rpl,
+    transform_dms,
+    transform_raw_rpl,
+)
+
+TRANSFORMS = [
+    Transform(turns, mirror) for mirror in (False, True) for turns in range(4)
+]
+
+NUMPY_TRANSFORMS = {
+    Transform(): lambda a: a,
+    Transform.rotation(1): lambda a: np.rot90(a, 1),
+    Transform.rotation(2): lambda a: np.rot90(a, 2),
+    Transform.rotation(3): lambda a: np.rot90(a, 3),
+    Transform.flip_horizontal(): np.fliplr,
+    Transform.flip_vertical(): np.flipud,
+    Transform.transpose(): lambda a: np.swapaxes(a, 0, 1),
+    Transform.rotation(2) @ Transform.transpose(): (
+        lambda a: np.rot90(np.swapaxes(a, 0, 1), 2)
+    ),
+}
+
+
+def test_transforms_are_the_eight_of_d4() -> None:
+    """Test the transforms are distinct, named, and equal to their numpy operations."""
+    array = np.arange(12).reshape(3, 4)
+    assert len({transform.name for transform in TRANSFORMS}) == 8
+    assert set(NUMPY_TRANSFORMS) == set(TRANSFORMS)
+    for transform, numpy_transform in NUMPY_TRANSFORMS.items():
+        np.testing.assert_array_equal(transform.apply(array), numpy_transform(array))
+        assert Transform.from_name(transform.name) == transform
+
+
+@pytest.mark.parametrize("a, b", list(itertools.product(TRANSFORMS, TRANSFORMS)))
+def test_composition_applies_right_then_left(a: Transform, b: Transform) -> None:
+    """Test `b @ a` and `chain(a, b)` are `a` applied, then `b`."""
+    array = np.arange(12).reshape(3, 4)
+    expected = b.apply(a.apply(array))
+    np.testing.assert_array_equal((b @ a).apply(array), expected)
+    np.testing.assert_array_equal(Transform.chain(a, b).apply(array), expected)
+
+
+@pytest.mark.parametrize("transform", TRANSFORMS, ids=lambda t: t.name)
+def test_inverse_undoes(transform: Transform) -> None:
+    """Test a transform composed with its inverse either way is the identity."""
+    array = np.arange(12).reshape(3, 4)
+    assert transform.inverse @ transform == Transform()
+    assert transform @ transform.inverse == Transform()
+    np.testing.assert_array_equal(
+        transform.inverse.apply(transform.apply(array)), array
+    )
+    assert transform.swaps_axes == (transform.apply(array).shape != array.shape)
+
+
+@pytest.mark.parametrize("edge", [None, 1, 4, 100])
+@pytest.mark.parametrize("workers", [1, 3])
+def test_copy_tiled(cube: np.ndarray, edge: int | None, workers: int) -> None:
+    """Test a tiled copy of a transformed view equals the view, whatever the tiles."""
+    source = Transform.transpose().apply(cube)
+    out = np.zeros_like(source)
+    copy_tiled(source, out, edge, workers)
+    np.testing.assert_array_equal(out, source)
+
+
+def test_copy_tiled_reduces_each_band_once(cube: np.ndarray) -> None:
+    """Test the reduction of the bands of a tiled copy covers every row once."""
+    out = np.zeros_like(cube)
+    sums: list[tuple[int, int]] = []
+    copy_tiled(
+        cube, out, edge=4, workers=3,
+        reduce=lambda rows, band: (rows.start, int(band.sum(dtype=np.int64))),
+        combine=sums.append,
+    )
+    assert [start for start, _ in sums] == list(range(0, cube.shape[0], 4))
+    assert sum(total for _, total in sums) == int(cube.sum(dtype=np.int64))
+
+
+@pytest.mark.parametrize("transform", TRANSFORMS[1:], ids=lambda t: t.name)
+@pytest.mark.parametrize("workers", [1, 3])
+def test_transform_raw_rpl_is_byte_identical(
+    tmp_path: Path,
+    raw_rpl: tuple[Path, Path],
+    cube: np.ndarray,
+    transform: Transform,
+    workers: int,
+) -> None:
+    """Test a transformed RAW is byte-identical to the numpy transform of its cube."""
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    raw_filepath, rpl_filepath = transform_raw_rpl(
+        *raw_rpl, output_dir, transform, workers=workers
+    )
+    expected = np.ascontiguousarray(NUMPY_TRANSFORMS[transform](cube)).astype('<u2')
+    assert raw_filepath.read_bytes() == expected.tobytes()
+    assert parse_rpl_keys(read_rpl(rpl_filepath))[1] == expected.shape
+
+
+@pytest.mark.parametrize("n", [1, 2, 3])
+def test_rot90_raw_rpl_matches_np_rot90(
+    raw_rpl: tuple[Path, Path],
+    cube: np.ndarray,
+    n: int,
+) -> None:
+    """Test a rotated RAW is byte-identical to `np.rot90` of its cube."""
+    raw_filepath, _ = rot90_raw_rpl(*raw_rpl, n=n, workers=2)
+    assert raw_filepath.read_bytes() == np.rot90(cube, n).astype('<u2').tobytes()
+
+
+@pytest.mark.parametrize("transform", TRANSFORMS[1:], ids=lambda t: t.name)
+@pytest.mark.parametrize("workers", [1, 3])
+def test_transform_dms_is_byte_identical(
+    tmp_path: Path,
+    dms: Path,
+    images: np.ndarray,
+    transform: Transform,
+    workers: int,
+) -> None:
+    """Test a transformed DMS has the numpy transform of the images and same names."""
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    tr_dms_filepath = transform_dms(dms, output_dir, transform, workers=workers)
+
+    expected = np.ascontiguousarray(transform.apply(images, axes=(1, 2)))
+    tr_dms = open_dms_file(tr_dms_filepath)
+    assert tr_dms.dimensions == expected.shape
+    tr_images = read_dms_images(tr_dms_filepath, tr_dms.header_size, tr_dms.dimensions)
+    assert tr_images.tobytes() == expected.astype('<f4').tobytes()
+    names = read_dms_elemental_names(
+        tr_dms_filepath, tr_dms.header_size, expected.shape
+    )
+    assert names == read_dms_elemental_names(
+        dms, open_dms_file(dms).header_size, images.shape
+    )
+    assert tr_dms_filepath.stat().st_size == dms.stat().st_size